@@ -1,10 +1,29 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from scipy.stats import zscore
 import numpy as np
-from PIL import Image
+
+# Los módulos compartidos (utils) están en la raíz del proyecto
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.comparables import COLUMNAS_CANDIDATO, K_COMPARABLES, estimar_csv, normalizar_candidatos
+from utils.compartido import abrir_publicado, version_compartida
+from utils.dataset import preparar_dataset
+from utils.entorno import cargar_entorno
+from utils.espacial import encuadre, zona_seleccion
+from utils.graficos import (
+    COLORES_TIPO_DATO, UMBRAL_AGREGADO, densidad_2d, figura_densidad, figura_histograma, figura_mapa,
+    histograma_ordenado
+)
+from utils.estadisticas import COLUMNAS_CAJA
+from utils.historico import bajadas_precio, crawls, tendencia
+from utils.indice import suelo_precio
+from utils.metricas import Metricas, resumen, tamano_figura, tamano_tabla
+from utils.provincias import provincia_centroides
+from utils.snapshot import leer_snapshot, snapshot_vigente, version_fichero
 
 # Configuración general de Streamlit
 st.set_page_config(page_title="Proyecto Inmobiliario", page_icon=":house:", layout="centered")
@@ -103,84 +122,175 @@ st.markdown("""
 
 # Ruta del archivo CSV
 ruta_archivo = '../propiedades_limpio.csv'
+# Snapshot columnar generado con `python -m utils.snapshot` (si no existe se usa el CSV)
+ruta_snapshot = '../propiedades_limpio.arrow'
 
-# Función para cargar los datos con caché
-@st.cache_data
+# Función para cargar los datos (el snapshot si está al día, si no el CSV)
 def load_data(nrows=None):
+    if snapshot_vigente(ruta_snapshot, ruta_archivo):
+        df = leer_snapshot(ruta_snapshot)
+        return df if nrows is None else df.head(nrows)
     return pd.read_csv(ruta_archivo, sep=';', nrows=nrows)
 
-# Leer el archivo CSV 
-df = load_data()
-df.columns = df.columns.str.strip().str.lower()
-
-# Capitalizar nombres de provincias y tipo transacción
-df['provincia'] = df['provincia'].str.title()
-df['venta/alquiler'] = df['venta/alquiler'].str.capitalize()
-
-# Crear la columna 'precio por m²' si no existe
-if 'precio por m²' not in df.columns:
-    df['precio por m²'] = df['precio'] / df['superficie útil']
-    df['precio por m²'] = df['precio por m²'].fillna(0)
-
-# Diccionario con coordenadas aproximadas (centroides) de cada provincia en España
-provincia_centroides = {
-    'a coruña': (43.3623, -8.4115),
-    'alava araba': (42.8464, -2.6715),
-    'albacete': (38.9943, -1.8585),
-    'alicante': (38.3452, -0.4810),
-    'almeria': (36.8340, -2.4637),
-    'asturias': (43.3619, -5.8494),
-    'avila': (40.6565, -4.6818),
-    'badajoz': (38.8794, -6.9706),
-    'barcelona': (41.3851, 2.1734),
-    'burgos': (42.3439, -3.6969),
-    'caceres': (39.4753, -6.3723),
-    'cadiz': (36.5164, -6.2994),
-    'cantabria': (43.1828, -3.9878),
-    'castellon castello': (39.9864, -0.0513),
-    'ceuta': (35.8894, -5.3198),
-    'ciudad real': (38.9857, -3.9291),
-    'cordoba': (37.8882, -4.7794),
-    'cuenca': (40.0704, -2.1374),
-    'girona': (41.9794, 2.8214),
-    'granada': (37.1773, -3.5986),
-    'guadalajara': (40.6332, -3.1669),
-    'guipuzcoa gipuzkoa': (43.3120, -1.9784),
-    'huelva': (37.2614, -6.9447),
-    'huesca': (42.1401, -0.4089),
-    'islas baleares illes balears': (39.6953, 3.0176),
-    'jaen': (37.7796, -3.7849),
-    'la rioja': (42.2871, -2.5396),
-    'las palmas': (28.1235, -15.4363),
-    'leon': (42.5987, -5.5671),
-    'lleida': (41.6176, 0.6200),
-    'lugo': (43.0125, -7.5559),
-    'madrid': (40.4168, -3.7038),
-    'malaga': (36.7213, -4.4214),
-    'melilla': (35.2923, -2.9381),
-    'murcia': (37.9834, -1.1299),
-    'navarra nafarroa': (42.6954, -1.6761),
-    'ourense': (42.3358, -7.8639),
-    'pais vasco frances iparralde': (43.3569, -1.7650),
-    'palencia': (42.0095, -4.5286),
-    'pontevedra': (42.4299, -8.6444),
-    'salamanca': (40.9701, -5.6635),
-    'santa cruz de tenerife': (28.2916, -16.6291),
-    'segovia': (40.9429, -4.1088),
-    'sevilla': (37.3886, -5.9823),
-    'soria': (41.7636, -2.4649),
-    'tarragona': (41.1189, 1.2453),
-    'teruel': (40.3440, -1.1065),
-    'toledo': (39.8628, -4.0273),
-    'valencia': (39.4699, -0.3763),
-    'valladolid': (41.6523, -4.7245),
-    'vizcaya bizkaia': (43.2630, -2.9350),
-    'zamora': (41.5036, -5.7440),
-    'zaragoza': (41.6488, -0.8891)
-}
+# Fichero del que se cargan los datos y su versión (cambia cuando se regenera)
+def ruta_datos():
+    return ruta_snapshot if snapshot_vigente(ruta_snapshot, ruta_archivo) else ruta_archivo
+
+def version_datos():
+    return version_fichero(ruta_datos())
+
+# Último dataset cargado: si la versión nueva solo añade anuncios al final, su índice y su
+# cubo se amplían en lugar de construirse de nuevo
+@st.cache_resource
+def dataset_anterior():
+    return {}
+
+# Dataset preparado una sola vez por versión y compartido (sin copias) entre sesiones
+@st.cache_resource(max_entries=1)
+def obtener_dataset(version):
+    metricas.marcar(cache='fallo')
+    if DIRECTORIO_COMPARTIDO:
+        datos = abrir_publicado(DIRECTORIO_COMPARTIDO, version)
+    else:
+        datos = preparar_dataset(load_data(), version)
+    ultimo = dataset_anterior()
+    ultimo['dataset'] = datos.heredar(ultimo.get('dataset'))
+    return ultimo['dataset']
+
+# Con ORIGEN_DATOS=bd (en el entorno o en el .env) los filtros se consultan en la base de
+# datos en lugar de cargar el fichero completo en cada proceso de la app
+cargar_entorno()
+MODO_BD = os.getenv('ORIGEN_DATOS', 'fichero') == 'bd'
+# Segundos que se reutiliza el resultado de una consulta con los mismos filtros
+TTL_CONSULTAS = 600
+# Con DATASET_COMPARTIDO=<directorio> (p. ej. /dev/shm/inmuebles) todos los procesos de la
+# app en la máquina usan una sola copia del dataset preparado, publicada con utils.compartido
+DIRECTORIO_COMPARTIDO = os.getenv('DATASET_COMPARTIDO')
+
+# Con METRICAS_APP=1 se mide cada tramo de la ejecución: panel de rendimiento en la
+# barra lateral y registros JSONL en METRICAS_RUTA
+if 'sesion' not in st.session_state:
+    st.session_state['sesion'] = uuid.uuid4().hex[:12]
+metricas = Metricas(
+    activo=os.getenv('METRICAS_APP') == '1',
+    ruta=os.getenv('METRICAS_RUTA', '../metricas_app.jsonl'),
+    sesion=st.session_state['sesion'],
+)
+
+# Pool de conexiones compartido por todas las sesiones. SQLAlchemy solo se importa en modo base de datos.
+@st.cache_resource
+def obtener_consultas():
+    from utils.base_datos import motor_desde_entorno
+    from utils.consultas import ConsultasBD
+
+    return ConsultasBD(motor_desde_entorno(pool_pre_ping=True, pool_recycle=3600))
+
+# Resultado de una consulta de ConsultasBD, cacheado por nombre y valores de los filtros
+@st.cache_data(ttl=TTL_CONSULTAS)
+def _consultar(nombre, *filtros):
+    metricas.marcar(cache='fallo')
+    return getattr(obtener_consultas(), nombre)(*filtros)
+
+def consultar(nombre, *filtros):
+    with metricas.tramo(f'consulta:{nombre}', cache='acierto'):
+        return _consultar(nombre, *filtros)
+
+# Dataset preparado solo con las filas que cumplen los filtros (modo base de datos)
+@st.cache_resource(ttl=TTL_CONSULTAS, max_entries=64)
+def _dataset_filtrado(tipo, provincias, minimo=None, maximo=None, columnas=None):
+    metricas.marcar(cache='fallo')
+    return preparar_dataset(consultar('inmuebles', tipo, provincias, minimo, maximo, columnas))
+
+def dataset_filtrado(tipo, provincias, minimo=None, maximo=None, columnas=None):
+    with metricas.tramo('carga_filtrada', cache='acierto'):
+        return _dataset_filtrado(tipo, provincias, minimo, maximo, columnas)
+
+# Histórico de crawls de utils.historico: cada consulta se cachea hasta que se registra otro crawl
+RUTA_HISTORICO = os.getenv('HISTORICO_DIR', '../historico')
+CRAWLS_TENDENCIA = 12
+
+@st.cache_data(ttl=TTL_CONSULTAS)
+def consultar_historico(nombre, ultimo_crawl, *filtros):
+    metricas.marcar(cache='fallo')
+    if nombre == 'tendencia':
+        return tendencia(*filtros, ultimos=CRAWLS_TENDENCIA, directorio=RUTA_HISTORICO)
+    return bajadas_precio(*filtros, directorio=RUTA_HISTORICO)
+
+# Valores de un filtro de la barra lateral
+def valores_filtro(columna):
+    return consultar('valores', columna) if MODO_BD else dataset.valores_unicos(columna)
+
+if MODO_BD:
+    dataset = None
+else:
+    with metricas.tramo('carga_datos', cache='acierto'):
+        if DIRECTORIO_COMPARTIDO:
+            # Versión a la que apunta el directorio: al publicarse otra (o al regenerarse el
+            # fichero de datos, que se vuelve a publicar) la caché cambia de entrada
+            version = version_compartida(DIRECTORIO_COMPARTIDO,
+                                         lambda: preparar_dataset(load_data(), version_datos()),
+                                         ruta_origen=ruta_datos())
+        else:
+            version = version_datos()
+        dataset = obtener_dataset(version)
+
+# Filas por página de la tabla de inmuebles y opciones máximas de cada selector del comparador
+FILAS_POR_PAGINA = 50
+MAX_OPCIONES = 50
+
+# Buscador y selector de un inmueble del rango elegido. Las opciones son los ID de los
+# inmuebles (dos títulos iguales no se pisan) y solo se envían las primeras coincidencias.
+def selector_inmueble(etiqueta, clave, datos, provincia, tipo, minimo, maximo):
+    texto = st.text_input(f"Buscar {etiqueta} por título:", key=f'busqueda_{clave}')
+    posiciones = datos.buscador.buscar(provincia, tipo, texto, minimo, maximo, limite=MAX_OPCIONES)
+    opciones = datos.vista(posiciones).frame(['id', 'título', 'precio'])
+    etiquetas = opciones['título'].astype(str) + ' · ' + opciones['precio'].map('{:,.0f} €'.format)
+    # Streamlit recupera la opción elegida por su etiqueta: las repetidas llevan también el ID
+    repetidas = etiquetas.duplicated(keep=False)
+    etiquetas = dict(zip(opciones['id'], etiquetas.where(~repetidas, etiquetas + ' · ' + opciones['id'].astype(str))))
+    posicion_por_id = dict(zip(opciones['id'], posiciones))
+    id_elegido = st.selectbox(f"Selecciona {etiqueta}:", list(etiquetas), format_func=etiquetas.get, key=clave)
+    return posicion_por_id.get(id_elegido)
+
+# Estimación por comparables de un CSV de candidatos. En modo base de datos se traen
+# solo las provincias de los candidatos, una consulta por tipo de transacción.
+def estimar_lote(candidatos, k):
+    if not MODO_BD:
+        return estimar_csv(dataset, candidatos, k)
+    candidatos = normalizar_candidatos(candidatos)
+    estimaciones = []
+    for tipo, grupo in candidatos.groupby('venta/alquiler', sort=False):
+        datos_tipo = dataset_filtrado(tipo, tuple(sorted(grupo['provincia'].unique())), suelo_precio(tipo))
+        estimacion, _ = datos_tipo.comparables.estimar(grupo.reset_index(drop=True), k)
+        estimaciones.append(estimacion.set_axis(grupo.index))
+    return pd.concat([candidatos, pd.concat(estimaciones)], axis=1)
+
+# Envío de un gráfico o una tabla al navegador, midiendo su tiempo y su tamaño
+def mostrar_grafico(nombre, fig, **opciones):
+    with metricas.tramo(f'envio:{nombre}') as registro:
+        resultado = st.plotly_chart(fig, **opciones)
+    if registro is not None:
+        registro['bytes'] = tamano_figura(fig)
+    return resultado
+
+def mostrar_tabla(nombre, df, **opciones):
+    with metricas.tramo(f'envio:{nombre}') as registro:
+        resultado = st.dataframe(df, **opciones)
+    if registro is not None:
+        registro['bytes'] = tamano_tabla(df)
+        registro['filas'] = len(df)
+    return resultado
+
+# Imagen leída (y redimensionada) una sola vez por proceso y compartida entre sesiones
+@st.cache_resource
+def cargar_imagen(ruta, tamano=None):
+    from PIL import Image
+
+    imagen = Image.open(ruta)
+    return imagen.resize(tamano) if tamano else imagen.copy()
 
 # Menú de navegación
-menu = ["Inicio", "Vista Usuarios", "Vista Clientes", "Acerca de"]
+menu = ["Inicio", "Vista Usuarios", "Vista Clientes", "Estimador de Precios", "Acerca de"]
 choice = st.sidebar.selectbox("Navegación", menu)
 
 # Control de flujo para cada sección
@@ -199,22 +309,26 @@ if choice == "Inicio":
     """)
 
 elif choice == "Vista Usuarios":
+    # Plotly se importa solo en las páginas con gráficos (una vez por proceso)
+    import plotly.express as px
+
     st.header("  Visualización de Datos y Comparador de Inmuebles")
 
     # Filtros de datos
-    provincia = st.sidebar.selectbox("Selecciona una provincia:", df['provincia'].unique())
-    tipo_transaccion = st.sidebar.selectbox("Selecciona una transacción:", df['venta/alquiler'].unique())
-    
-    # Filtrar el DataFrame según la provincia y el tipo de transacción
-    df_filtrado = df[(df['provincia'] == provincia) & (df['venta/alquiler'] == tipo_transaccion)]
+    provincia = st.sidebar.selectbox("Selecciona una provincia:", valores_filtro('provincia'))
+    tipo_transaccion = st.sidebar.selectbox("Selecciona una transacción:", valores_filtro('venta/alquiler'))
 
     # Excluir alquileres menores a 300 €
-    if tipo_transaccion == 'Alquiler':
-        df_filtrado = df_filtrado[df_filtrado['precio'] >= 300]
+    suelo = suelo_precio(tipo_transaccion)
 
     # Obtener el mínimo y máximo de precio después del filtrado
-    precio_min = int(df_filtrado['precio'].min()) if not df_filtrado.empty else 0
-    precio_max = int(df_filtrado['precio'].max()) if not df_filtrado.empty else 1
+    with metricas.tramo('filtro:limites'):
+        if MODO_BD:
+            limites = consultar('limites', provincia, tipo_transaccion, suelo)
+        else:
+            limites = dataset.indice.particion(provincia, tipo_transaccion).limites(suelo)
+    precio_min = int(limites[0]) if limites else 0
+    precio_max = int(limites[1]) if limites else 1
 
     # Slider de rango de precio dinámico
     precio_min_slider, precio_max_slider = st.sidebar.slider(
@@ -225,61 +339,85 @@ elif choice == "Vista Usuarios":
         key='slider_precio' 
     )
 
-    # Aplicar el rango de precio seleccionado al DataFrame filtrado
-    df_filtrado = df_filtrado[(df_filtrado['precio'] >= precio_min_slider) & (df_filtrado['precio'] <= precio_max_slider)]
-
-    # Mapa de propiedades por provincia con Plotly
-    st.write("### Mapa de propiedades por provincia")
-
-    # Crear el mapa con Plotly
-    df_map = df_filtrado[['provincia', 'precio']].groupby('provincia').agg({'precio': ['count', 'mean']}).reset_index()
-    df_map.columns = ['provincia', 'propiedades', 'precio_medio']
-    df_map['lat'] = df_map['provincia'].apply(lambda x: provincia_centroides[x.lower()][0] if x.lower() in provincia_centroides else None)
-    df_map['lon'] = df_map['provincia'].apply(lambda x: provincia_centroides[x.lower()][1] if x.lower() in provincia_centroides else None)
-
-    fig_map = px.scatter_geo(
-        df_map,
-        lat='lat',
-        lon='lon',
-        text='provincia',
-        size='propiedades',
-        hover_name='provincia',
-        hover_data={'precio_medio': ':.2f', 'lat': False, 'lon': False},
-        title="Mapa de Propiedades por Provincia en España",
-        projection='mercator'
-    )
-
-    # Configuración del mapa para ajustar el zoom dinámicamente
-    fig_map.update_layout(
-        title_font_size=20,
-        geo=dict(
-            center={'lat': 40, 'lon': -3},  
-            projection_scale=12, 
-            showland=True,
-            landcolor='rgb(243, 243, 243)',
-        ),
-        margin={'r': 0, 't': 50, 'l': 0, 'b': 0}
-    )
-
-    if provincia in ['Las Palmas', 'Santa Cruz De Tenerife']:
-        fig_map.update_layout(
-            geo=dict(
-                center={'lat': 35, 'lon': -10},  
-                projection_scale=12, 
-            )
-        )
-
-    fig_map.update_layout(mapbox_style="carto-positron")  # Estilo del mapa Carto Positron
-    st.plotly_chart(fig_map, use_container_width=True)
-
-    # Breve explicación del mapa
-    st.write("""
-    **Descripción del Mapa:** Este mapa muestra las propiedades disponibles en la provincia seleccionada. Cada marcador representa la ubicación aproximada de una provincia con propiedades disponibles, mostrando el número total de propiedades y el precio medio.
-    """)
+    with metricas.tramo('filtro:rango'):
+        # En modo base de datos solo se traen las filas de la provincia, el tipo y el rango elegidos
+        if MODO_BD:
+            datos = dataset_filtrado(tipo_transaccion, (provincia,), precio_min_slider, precio_max_slider)
+        else:
+            datos = dataset
+
+        # Partición de la provincia y el tipo de transacción (filas ordenadas por precio)
+        particion = datos.indice.particion(provincia, tipo_transaccion)
+
+        # Aplicar el rango de precio seleccionado (el mínimo del slider ya respeta el suelo)
+        vista = datos.vista(particion.rango(precio_min_slider, precio_max_slider))
+
+    # Mapa de inmuebles con Plotly
+    st.write("### Mapa de inmuebles")
+
+    # Resumen de la provincia: recuento y precio medio del cubo de estadísticas
+    # o de un COUNT/AVG en la base de datos
+    with metricas.tramo('mapa:resumen'):
+        if MODO_BD:
+            df_resumen = consultar('mapa', provincia, tipo_transaccion, precio_min_slider, precio_max_slider)
+        else:
+            df_resumen = datos.cubo.mapa(provincia, tipo_transaccion, precio_min_slider, precio_max_slider)
+    if not df_resumen.empty:
+        st.write(f"{df_resumen['propiedades'].iloc[0]} inmuebles en {provincia}, "
+                 f"con un precio medio de {df_resumen['precio_medio'].iloc[0]:,.0f} €")
+
+    # Zona visible: al cambiar los filtros, el recuadro de los inmuebles filtrados.
+    # Al seleccionar marcadores (caja o lazo) el mapa se amplía a esa zona.
+    filtros_mapa = (provincia, tipo_transaccion, precio_min_slider, precio_max_slider)
+    zona_datos = datos.espacial.limites(vista.posiciones)
+    if st.session_state.get('zona_mapa', (None, None))[0] != filtros_mapa:
+        st.session_state['zona_mapa'] = (filtros_mapa, zona_datos)
+    zona = st.session_state['zona_mapa'][1]
+
+    if zona is not None:
+        # Grupos por celda de la rejilla si hay muchos inmuebles en la zona, puntos si hay pocos
+        with metricas.tramo('mapa'):
+            agrupado, marcadores = datos.espacial.consultar(vista.posiciones, zona)
+            metricas.marcar(agrupado=agrupado, marcadores=len(marcadores))
+            if not agrupado:
+                marcadores['título'] = datos.vista(marcadores['posicion']).valores('título')
+            fig_map = figura_mapa(marcadores, agrupado, *encuadre(zona))
+            fig_map.update_layout(title="Mapa de Propiedades", title_font_size=20)
+        evento = mostrar_grafico('mapa', fig_map, use_container_width=True, on_select='rerun',
+                                 selection_mode=('box', 'lasso'), key=f"mapa_{filtros_mapa}_{zona}")
+        if evento.selection.points:
+            seleccion = marcadores.iloc[[punto['point_index'] for punto in evento.selection.points]]
+            st.session_state['zona_mapa'] = (filtros_mapa, zona_seleccion(seleccion, agrupado, zona))
+            # st.rerun corta la ejecución: se guardan antes los tramos medidos
+            metricas.volcar(choice)
+            st.rerun()
+        if zona != zona_datos and st.button("Ver todos los inmuebles"):
+            st.session_state['zona_mapa'] = (filtros_mapa, zona_datos)
+            metricas.volcar(choice)
+            st.rerun()
+
+        # Breve explicación del mapa
+        st.write("""
+        **Descripción del Mapa:** Este mapa muestra los inmuebles de la provincia seleccionada en su ubicación real. Cuando hay muchos inmuebles en la zona visible se agrupan: el tamaño de cada círculo indica el número de inmuebles y el color su precio medio. Selecciona una zona del mapa para ampliarla y ver los inmuebles uno a uno.
+        """)
+    else:
+        st.write("No hay coordenadas disponibles para los filtros seleccionados.")
 
     # Tabla de propiedades filtradas
     st.write("### Inmuebles filtrados")
-    st.dataframe(df_filtrado[['título', 'precio', 'habitaciones', 'superficie útil', 'baños', 'enlace']])
+    columnas_tabla = ['título', 'precio', 'habitaciones', 'superficie útil', 'baños', 'enlace']
+    col_orden, col_sentido, col_pagina = st.columns(3)
+    orden = col_orden.selectbox("Ordenar por:", columnas_tabla, index=1, key='orden_tabla')
+    ascendente = col_sentido.selectbox("Orden:", ["Ascendente", "Descendente"], key='sentido_tabla') == "Ascendente"
+    total_paginas = max(1, -(-len(vista) // FILAS_POR_PAGINA))
+    pagina = col_pagina.number_input("Página:", min_value=1, max_value=total_paginas, value=1)
+
+    # Se ordena en el servidor y solo se envía la página visible (la vista ya viene ordenada por precio)
+    with metricas.tramo('tabla', orden=orden):
+        vista_tabla = vista if orden == 'precio' and ascendente else vista.ordenar(orden, ascendente)
+        df_tabla = vista_tabla.pagina(pagina - 1, FILAS_POR_PAGINA).frame(columnas_tabla)
+    mostrar_tabla('tabla', df_tabla)
+    st.caption(f"Página {pagina} de {total_paginas} ({len(vista)} inmuebles)")
     st.write("""
     **Descripción de la Tabla:** La tabla muestra los inmuebles disponibles en la provincia seleccionada, con detalles sobre el precio, número de habitaciones, superficie útil, y más.
     """)
@@ -287,36 +425,48 @@ elif choice == "Vista Usuarios":
     # Comparador de inmuebles
     st.write("### Comparador de inmuebles")
 
-    # Lista de opciones con título y id para evitar duplicados
-    opciones_inmuebles = df_filtrado.apply(lambda x: f"{x['título']}", axis=1).tolist()
-    id_map = dict(zip(opciones_inmuebles, df_filtrado['id']))
+    # Seleccionar inmuebles buscando por título (las opciones se identifican por ID)
+    with metricas.tramo('comparador'):
+        filtros_busqueda = (datos, provincia, tipo_transaccion, precio_min_slider, precio_max_slider)
+        inmueble_1 = selector_inmueble("el primer inmueble", 'inmueble_1', *filtros_busqueda)
+        inmueble_2 = selector_inmueble("el segundo inmueble", 'inmueble_2', *filtros_busqueda)
 
-    # Seleccionar inmuebles basados en título (ID: id)
-    inmueble_1 = st.selectbox("Selecciona el primer inmueble:", opciones_inmuebles, key='inmueble_1')
-    inmueble_2 = st.selectbox("Selecciona el segundo inmueble:", opciones_inmuebles, key='inmueble_2')
-    
-    # Filtrar el comparador usando los id seleccionados
-    comparador = df[df['id'].isin([id_map[inmueble_1], id_map[inmueble_2]])]
+        # Filas de los inmuebles seleccionados
+        seleccionados = list(dict.fromkeys(p for p in (inmueble_1, inmueble_2) if p is not None))
+        comparador = datos.vista(seleccionados).frame(['título', 'precio', 'habitaciones', 'superficie útil', 'baños', 'provincia'])
 
     # Mostrar comparación de características ocupando todo el ancho
     if not comparador.empty:
         st.write("### Comparativa de características")
-        st.dataframe(comparador[['título', 'precio', 'habitaciones', 'superficie útil', 'baños', 'provincia']].T, width=1500)
+        mostrar_tabla('comparador', comparador.T, width=1500)
         st.write("""
         **Descripción de la Comparativa:** Esta sección permite comparar dos propiedades seleccionadas, mostrando sus características clave como el precio, número de habitaciones, superficie útil, y más.
         """)
 
     # Visualización de la distribución de precios con outliers en rojo
-    if not df_filtrado.empty:
+    if not vista.empty:
         st.write("### Distribución de Precios en la Zona Seleccionada")
         
-        # Calcular el z-score para identificar outliers
-        df_filtrado['z_score'] = zscore(df_filtrado['precio'])
-        df_filtrado['tipo_dato'] = np.where(df_filtrado['z_score'].abs() > 3, 'Datos Atípicos', 'Datos Normales')
+        # Media y desviación del rango seleccionado, leídas de las sumas acumuladas del cubo.
+        # Un precio es atípico si su z-score supera 3 en valor absoluto.
+        with metricas.tramo('zscore'):
+            _, media_precio, desviacion_precio = datos.cubo.momentos(provincia, tipo_transaccion, precio_min_slider, precio_max_slider)
+            limite_inf = media_precio - 3 * desviacion_precio
+            limite_sup = media_precio + 3 * desviacion_precio
         
-        # Crear el gráfico
-        fig = px.histogram(df_filtrado, x="precio", nbins=40, title="Distribución de Precios",
-                           color='tipo_dato', color_discrete_map={'Datos Atípicos': 'red', 'Datos Normales': 'blue'})
+        # Crear el gráfico (agregado en el servidor si hay muchas filas)
+        with metricas.tramo('histograma', agregado=len(vista) > UMBRAL_AGREGADO):
+            if len(vista) > UMBRAL_AGREGADO:
+                precios_vista = particion.precios_rango(precio_min_slider, precio_max_slider)
+                fig = figura_histograma(*histograma_ordenado(precios_vista, limite_inf, limite_sup, nbins=40))
+                fig.update_layout(title="Distribución de Precios")
+            else:
+                precios_vista = vista.valores('precio')
+                vista = vista.con_columnas({
+                    'tipo_dato': np.where((precios_vista < limite_inf) | (precios_vista > limite_sup), 'Datos Atípicos', 'Datos Normales')
+                })
+                fig = px.histogram(vista.frame(['precio', 'tipo_dato']), x="precio", nbins=40, title="Distribución de Precios",
+                                   color='tipo_dato', color_discrete_map=COLORES_TIPO_DATO)
         fig.update_layout(
             bargap=0.1,
             xaxis_title="Precio (€)",
@@ -327,14 +477,44 @@ elif choice == "Vista Usuarios":
         )
         fig.update_xaxes(color='#00264d')  
         fig.update_yaxes(color='#00264d')  
-        st.plotly_chart(fig, use_container_width=True)
+        mostrar_grafico('histograma', fig, use_container_width=True)
         st.write("""
         **Descripción del Gráfico:** Este histograma muestra la distribución de los precios de las propiedades disponibles en la zona seleccionada. Los datos atípicos (outliers) se resaltan en rojo para identificar valores fuera del rango típico.
         """)
     else:
         st.write("No hay datos disponibles para los filtros seleccionados.")
 
+    # Evolución de la provincia en los últimos crawls, leída de las estadísticas por crawl del histórico
+    fechas_historico = crawls(RUTA_HISTORICO)
+    if len(fechas_historico) > 1:
+        st.write("### Evolución del precio")
+        with metricas.tramo('historico:tendencia', cache='acierto'):
+            df_tendencia = consultar_historico('tendencia', fechas_historico[-1], provincia, tipo_transaccion)
+            fig_tendencia = px.line(
+                df_tendencia, x='fecha', y='precio_m2_medio', markers=True,
+                title=f"Precio medio por m² en los últimos {CRAWLS_TENDENCIA} crawls",
+                labels={'fecha': "Crawl", 'precio_m2_medio': "Precio por m² (€)"},
+                hover_data=['anuncios', 'precio_m2_mediana', 'bajadas', 'subidas'],
+            )
+        mostrar_grafico('tendencia', fig_tendencia, use_container_width=True)
+
+        # Anuncios de la provincia que han bajado de precio en el periodo de la gráfica
+        with metricas.tramo('historico:bajadas', cache='acierto'):
+            desde = fechas_historico[-CRAWLS_TENDENCIA:][0]
+            df_bajadas = consultar_historico('bajadas', fechas_historico[-1], desde, None, provincia,
+                                             tipo_transaccion, 0.0, FILAS_POR_PAGINA)
+        if not df_bajadas.empty:
+            st.write("#### Mayores bajadas de precio")
+            mostrar_tabla('bajadas', df_bajadas[['título', 'precio_inicial', 'precio_final', 'bajada_pct',
+                                                  'ultimo_cambio', 'enlace']])
+        st.write("""
+        **Descripción del Gráfico:** La línea muestra cómo ha evolucionado el precio medio por metro cuadrado de la provincia y el tipo de transacción seleccionados en cada crawl. La tabla recoge los anuncios cuyo precio ha bajado en ese periodo, ordenados por la bajada en porcentaje.
+        """)
+
 elif choice == "Vista Clientes":
+    import plotly.express as px
+    import plotly.graph_objects as go
+
     st.title("  Análisis y Esquema de Base de Datos para Clientes")
     st.subheader("Representación de la base de datos y dashboard interactivo de Power BI")
 
@@ -344,80 +524,105 @@ elif choice == "Vista Clientes":
     """, unsafe_allow_html=True)
 
     # Filtros de datos
-    tipo_transaccion = st.sidebar.selectbox("Selecciona una transacción:", df['venta/alquiler'].unique(), key='selectbox_transaccion_clientes')
+    tipo_transaccion = st.sidebar.selectbox("Selecciona una transacción:", valores_filtro('venta/alquiler'), key='selectbox_transaccion_clientes')
 
-    # Filtrar DataFrame según los filtros seleccionados
-    df_filtrado = df[df['venta/alquiler'] == tipo_transaccion]
-    
     # Filtrar valores de alquiler por encima de 300 €
-    if tipo_transaccion == 'Alquiler':
-        df_filtrado = df_filtrado[df_filtrado['precio'] >= 300]
+    suelo = suelo_precio(tipo_transaccion)
+
+    # Provincias con datos para los filtros seleccionados (consultando el índice)
+    with metricas.tramo('filtro:provincias'):
+        if MODO_BD:
+            provincias_vista = consultar('provincias', tipo_transaccion, suelo)
+        else:
+            provincias_vista = dataset.indice.provincias(tipo_transaccion, minimo=suelo)
 
     # Encabezado de Análisis de Precio
     st.header("Análisis de Precio por Metro Cuadrado")
     # Multiselect para seleccionar provincias
     provincias_seleccionadas = st.multiselect(
         "Selecciona las provincias para visualizar",
-        options=df_filtrado['provincia'].unique(),
-        default=df_filtrado['provincia'].unique(),
+        options=provincias_vista,
+        default=provincias_vista,
         key='multiselect_provincias_clientes'
     )
 
-    # Filtrar las provincias seleccionadas en el gráfico de cajas
-    df_provincias_filtrado = df_filtrado[df_filtrado['provincia'].isin(provincias_seleccionadas)]
-    # Excluir valores de "precio por m²" iguales a 0
-    df_provincias_filtrado = df_provincias_filtrado[df_provincias_filtrado['precio por m²'] > 0]
-    
-    # Calcular la media del "precio por m²" y establecer el valor mínimo
-    if not df_provincias_filtrado.empty:
-        media_precio_m2 = df_provincias_filtrado['precio por m²'].mean()
-        min_precio_m2 = media_precio_m2 / 2
-        df_provincias_filtrado = df_provincias_filtrado[df_provincias_filtrado['precio por m²'] >= min_precio_m2]
+    # Cajas precalculadas de las provincias seleccionadas: el cubo excluye los "precio por m²"
+    # iguales a 0 y aplica como mínimo la mitad de la media de la selección
+    with metricas.tramo('cajas', provincias=len(provincias_seleccionadas)):
+        if not MODO_BD:
+            df_cajas = dataset.cubo.cajas(tipo_transaccion, provincias_seleccionadas)
+        elif provincias_seleccionadas:
+            datos_cajas = dataset_filtrado(tipo_transaccion, tuple(provincias_seleccionadas), suelo,
+                                           columnas=('superficie útil',))
+            df_cajas = datos_cajas.cubo.cajas(tipo_transaccion, provincias_seleccionadas)
+        else:
+            df_cajas = pd.DataFrame(columns=COLUMNAS_CAJA)
 
     # Configurar el rango del eje Y basado en el tipo de transacción
     y_axis_range = [0, 200] if tipo_transaccion == 'Alquiler' else [3000, 10000]
 
     # Crear el gráfico de cajas si hay datos disponibles
-    if not df_provincias_filtrado.empty:
-        fig_box = px.box(
-            df_provincias_filtrado,
-            x="provincia",
-            y="precio por m²",
-            title="",
-            labels={"precio por m²": "Precio por m² (€)"},
-            width=1000,
-            height=500
-        )
+    if not df_cajas.empty:
+        # Solo se envían los cuartiles y bigotes de cada provincia, no los valores originales
+        fig_box = go.Figure(go.Box(
+            x=df_cajas['provincia'],
+            q1=df_cajas['q1'],
+            median=df_cajas['mediana'],
+            q3=df_cajas['q3'],
+            lowerfence=df_cajas['bigote_inf'],
+            upperfence=df_cajas['bigote_sup'],
+            mean=df_cajas['media'],
+            name="Precio por m² (€)"
+        ))
+        fig_box.update_layout(width=1000, height=500)
         fig_box.update_yaxes(range=y_axis_range, title_text="Precio por m² (€)")
-        fig_box.update_xaxes(tickangle=45)
-        fig_box.update_traces(
-            hovertemplate="<b>%{x}</b><br>Mediana: %{y:.2f}"
-        )
-        st.plotly_chart(fig_box, use_container_width=True)
+        fig_box.update_xaxes(tickangle=45, title_text="provincia")
+        mostrar_grafico('cajas', fig_box, use_container_width=True)
         st.write("""
         **Descripción del Gráfico:** Este gráfico de cajas muestra la distribución de los precios por metro cuadrado en cada provincia seleccionada, permitiendo identificar rangos de precios comunes y valores atípicos.
         """)
     else:
         st.write("No hay datos disponibles para los filtros seleccionados.")
         # Análisis de correlación entre precio y otras variables
-    if not df_filtrado.empty:
+    if provincias_vista:
         st.header("Análisis de Correlación entre Variables")
-        provincia_corr = st.sidebar.selectbox("Selecciona una provincia para el análisis de correlación:", df_filtrado['provincia'].unique(), key='provincia_corr_clientes')
-        df_corr_filtrado = df_filtrado[df_filtrado['provincia'] == provincia_corr]
-
-        fig_corr_superficie = px.scatter(
-            df_corr_filtrado, x="superficie útil", y="precio",
-            title="Correlación entre Precio y Superficie Útil",
-            labels={"superficie útil": "Superficie Útil (m²)", "precio": "Precio (€)"}
-        )
-        fig_corr_superficie.update_xaxes(range=[0, 1000])  
-        st.plotly_chart(fig_corr_superficie, use_container_width=True)
+        provincia_corr = st.sidebar.selectbox("Selecciona una provincia para el análisis de correlación:", provincias_vista, key='provincia_corr_clientes')
+        with metricas.tramo('correlacion'):
+            if MODO_BD:
+                datos_corr = dataset_filtrado(tipo_transaccion, (provincia_corr,), suelo,
+                                              columnas=('superficie útil', 'habitaciones'))
+            else:
+                datos_corr = dataset
+            vista_corr = datos_corr.vista(datos_corr.indice.particion(provincia_corr, tipo_transaccion).rango(suelo))
+
+            # Con muchas filas se envía una rejilla de densidad en lugar de un punto por inmueble
+            if len(vista_corr) > UMBRAL_AGREGADO:
+                fig_corr_superficie = figura_densidad(*densidad_2d(
+                    vista_corr.valores('superficie útil'), vista_corr.valores('precio'), rango_x=(0, 1000)
+                ))
+                fig_corr_superficie.update_layout(
+                    title="Correlación entre Precio y Superficie Útil",
+                    xaxis_title="Superficie Útil (m²)",
+                    yaxis_title="Precio (€)"
+                )
+            else:
+                fig_corr_superficie = px.scatter(
+                    vista_corr.frame(['superficie útil', 'precio']), x="superficie útil", y="precio",
+                    title="Correlación entre Precio y Superficie Útil",
+                    labels={"superficie útil": "Superficie Útil (m²)", "precio": "Precio (€)"}
+                )
+            fig_corr_superficie.update_xaxes(range=[0, 1000])  
+        mostrar_grafico('correlacion', fig_corr_superficie, use_container_width=True)
         st.write("""
         **Descripción del Gráfico:** Este gráfico de dispersión muestra la correlación entre el precio y la superficie útil de las propiedades en la provincia seleccionada. Se pueden observar tendencias y patrones que indican cómo el precio cambia con respecto al tamaño de la propiedad.
         """)
 
         # Agrupar por número de habitaciones y calcular el precio promedio
-        df_grouped = df_corr_filtrado.groupby('habitaciones')['precio'].mean().reset_index()
+        with metricas.tramo('habitaciones'):
+            if MODO_BD:
+                df_grouped = consultar('precio_medio_por_habitaciones', provincia_corr, tipo_transaccion, suelo)
+            else:
+                df_grouped = vista_corr.frame(['habitaciones', 'precio']).groupby('habitaciones')['precio'].mean().reset_index()
 
         # Crear el gráfico de barras
         fig_bar = px.bar(
@@ -425,13 +630,85 @@ elif choice == "Vista Clientes":
             title="Precio Promedio por Número de Habitaciones",
             labels={"habitaciones": "Número de Habitaciones", "precio": "Precio Promedio (€)"},
         )
-        st.plotly_chart(fig_bar, use_container_width=True)
+        mostrar_grafico('habitaciones', fig_bar, use_container_width=True)
         st.write("""
         **Descripción del Gráfico:** Este gráfico de barras muestra el precio promedio de las propiedades en función del número de habitaciones, lo que permite identificar cómo varía el precio según la cantidad de habitaciones en la provincia seleccionada.
         """)
     else:
         st.write("No hay datos disponibles para el análisis de correlación.")
     
+elif choice == "Estimador de Precios":
+    st.header("  Estimador de Precios por Comparables")
+    st.write("""
+    Introduce las características de un inmueble y el estimador buscará los inmuebles más parecidos de la misma provincia y tipo de transacción, teniendo en cuenta su ubicación, superficie útil, habitaciones y baños.
+    """)
+
+    # Filtros de datos
+    tipo_transaccion = st.sidebar.selectbox("Selecciona una transacción:", valores_filtro('venta/alquiler'), key='transaccion_comparables')
+    provincia = st.sidebar.selectbox("Selecciona una provincia:", valores_filtro('provincia'), key='provincia_comparables')
+    k = st.sidebar.slider("Número de comparables:", min_value=3, max_value=50, value=K_COMPARABLES, key='k_comparables')
+
+    with metricas.tramo('filtro:provincia'):
+        if MODO_BD:
+            datos = dataset_filtrado(tipo_transaccion, (provincia,), suelo_precio(tipo_transaccion))
+        else:
+            datos = dataset
+
+    # Características del inmueble (la ubicación por defecto es el centro de la provincia)
+    lat_centro, lon_centro = provincia_centroides.get(provincia.lower(), (40.4168, -3.7038))
+    col1, col2 = st.columns(2)
+    latitud = col1.number_input("Latitud:", value=float(lat_centro), format="%.5f")
+    longitud = col2.number_input("Longitud:", value=float(lon_centro), format="%.5f")
+    col3, col4, col5 = st.columns(3)
+    superficie = col3.number_input("Superficie útil (m²):", min_value=10, max_value=2000, value=80)
+    habitaciones = col4.number_input("Habitaciones:", min_value=0, max_value=20, value=2)
+    banos = col5.number_input("Baños:", min_value=0, max_value=10, value=1)
+
+    candidato = normalizar_candidatos(pd.DataFrame([{
+        'provincia': provincia, 'venta/alquiler': tipo_transaccion, 'latitud': latitud, 'longitud': longitud,
+        'superficie útil': superficie, 'habitaciones': habitaciones, 'baños': banos,
+    }]))
+    with metricas.tramo('comparables', k=k):
+        estimaciones, vecinos = datos.comparables.estimar(candidato, k)
+    estimacion = estimaciones.iloc[0]
+
+    if estimacion['comparables'] > 0:
+        met1, met2, met3 = st.columns(3)
+        met1.metric("Precio estimado", f"{estimacion['precio_estimado']:,.0f} €")
+        met2.metric("Rango habitual (p25 - p75)", f"{estimacion['precio_p25']:,.0f} - {estimacion['precio_p75']:,.0f} €")
+        if np.isfinite(estimacion['precio_m2_estimado']):
+            met3.metric("Precio por m²", f"{estimacion['precio_m2_estimado']:,.0f} €")
+
+        # Inmuebles comparables, del más parecido al menos parecido
+        posiciones = vecinos[0][vecinos[0] >= 0]
+        st.write("### Inmuebles comparables")
+        mostrar_tabla('comparables', datos.vista(posiciones).frame(['título', 'precio', 'superficie útil', 'habitaciones', 'baños', 'enlace']))
+
+        _, marcadores = datos.espacial.consultar(posiciones, zona=None)
+        marcadores['título'] = datos.vista(marcadores['posicion']).valores('título')
+        fig_comparables = figura_mapa(marcadores, False, *encuadre(datos.espacial.limites(posiciones)))
+        mostrar_grafico('mapa_comparables', fig_comparables, use_container_width=True)
+        st.write("""
+        **Descripción de la Estimación:** El precio estimado es la mediana del precio de los inmuebles comparables y el rango habitual va del percentil 25 al 75 de esos precios. Cuanto más estrecho es el rango, más fiable es la estimación.
+        """)
+    else:
+        st.write("No hay inmuebles comparables para los datos introducidos.")
+
+    # Estimación de muchos inmuebles a la vez desde un CSV
+    st.write("### Estimación de un lote de inmuebles")
+    archivo = st.file_uploader(f"Sube un CSV con las columnas: {', '.join(COLUMNAS_CANDIDATO)}", type='csv')
+    if archivo is not None:
+        try:
+            with metricas.tramo('comparables:lote', k=k):
+                resultado = estimar_lote(pd.read_csv(archivo, sep=None, engine='python'), k)
+                metricas.marcar(filas=len(resultado))
+        except ValueError as error:
+            st.error(str(error))
+        else:
+            mostrar_tabla('comparables:lote', resultado)
+            st.download_button("Descargar estimaciones", resultado.to_csv(index=False).encode('utf-8'),
+                               file_name='estimaciones.csv', mime='text/csv')
+
 elif choice == "Acerca de":
     st.header("  Sobre el Proyecto")
 
@@ -453,19 +730,28 @@ elif choice == "Acerca de":
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        img_rodrigo = Image.open("Rodrigo.png").resize((150, 200))
+        img_rodrigo = cargar_imagen("Rodrigo.png", (150, 200))
         st.image(img_rodrigo, caption="Rodrigo González", use_column_width=False)
     with col2:
-        img_david = Image.open("David.jpeg").resize((150, 200))
+        img_david = cargar_imagen("David.jpeg", (150, 200))
         st.image(img_david, caption="David López Patiño", use_column_width=False)
     with col3:
-        img_raquel = Image.open("Raquel.jpeg").resize((150, 200))
+        img_raquel = cargar_imagen("Raquel.jpeg", (150, 200))
         st.image(img_raquel, caption="Raquel Bastida", use_column_width=False)
 
 # Cargar la imagen desde la ruta y mostrarla en la parte inferior de la barra lateral
 ruta_imagen = 'imagen_proyecto.png'
-imagen = Image.open(ruta_imagen)
+imagen = cargar_imagen(ruta_imagen)
 
 with st.sidebar:
     st.markdown("<div style='flex-grow: 1;'></div>", unsafe_allow_html=True) 
-    st.image(imagen, use_column_width=True)
\ No newline at end of file
+    st.image(imagen, use_column_width=True)
+
+# Registros de esta ejecución al historial y al JSONL, y panel con los percentiles del proceso
+metricas.volcar(choice)
+if metricas.activo:
+    with st.sidebar.expander("Rendimiento"):
+        st.write("Esta ejecución")
+        st.dataframe(pd.DataFrame(metricas.registros).drop(columns=['ts', 'sesion'], errors='ignore'))
+        st.write("p50 / p95 por página y tramo")
+        st.dataframe(resumen().round(1))
@@ -0,0 +1,53 @@
+"""Arranque de la app con las cachés ya calientes.
+
+Antes de abrir el servidor ejecuta `app.py` en este mismo proceso (con el
+AppTest de Streamlit) una vez por página: se importan Plotly y los módulos de
+`utils`, se carga el dataset y se construyen el índice, el cubo de estadísticas,
+la rejilla espacial y las imágenes. `st.cache_resource` es común a todo el
+proceso, así que la primera sesión de un usuario ya no paga nada de eso.
+Después arranca el servidor como `streamlit run app.py`.
+
+Uso (desde la carpeta Streamlit; los argumentos restantes van a `streamlit run`):
+    python arranque.py --server.port 8501 --server.headless true
+    python arranque.py --paginas Inicio "Vista Usuarios"
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+from streamlit.web import cli
+
+APP = Path(__file__).with_name('app.py')
+
+PAGINAS = ["Inicio", "Vista Usuarios", "Vista Clientes", "Estimador de Precios", "Acerca de"]
+
+# Segundos máximos de cada ejecución de calentamiento (la primera carga el dataset)
+TIEMPO_MAXIMO = 600
+
+
+# Ejecuta la app en cada página con los filtros por defecto
+def calentar(paginas=PAGINAS):
+    prueba = AppTest.from_file(str(APP), default_timeout=TIEMPO_MAXIMO)
+    prueba.run()
+    for pagina in paginas:
+        inicio = time.perf_counter()
+        prueba.sidebar.selectbox[0].select(pagina).run()
+        errores = [error.value for error in prueba.exception]
+        estado = f"error: {errores[0]}" if errores else "ok"
+        print(f"{pagina:<22} {time.perf_counter() - inicio:7.2f} s  {estado}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Calienta las cachés de la app y arranca el servidor.")
+    parser.add_argument('--paginas', nargs='+', choices=PAGINAS, default=PAGINAS, help="Páginas a calentar")
+    args, opciones_streamlit = parser.parse_known_args()
+
+    # La app usa rutas relativas a su carpeta (../propiedades_limpio.csv, imágenes)
+    os.chdir(APP.parent)
+    calentar(args.paginas)
+
+    sys.argv = ['streamlit', 'run', str(APP), *opciones_streamlit]
+    sys.exit(cli.main())
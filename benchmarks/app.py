@@ -0,0 +1,228 @@
+"""Benchmark de los cálculos de la app de Streamlit sobre datos sintéticos.
+
+Mide, sin la capa de interfaz, cada paso que ejecuta `Streamlit/app.py`: carga
+(CSV y snapshot), normalización, índice por provincia y tipo, rango del slider,
+mapa, outliers por z-score, cajas, precio medio por habitaciones, comparador,
+tabla paginada y comparables. Para cada tamaño de dataset se anota el tiempo
+(mediana de varias repeticiones) y el pico de memoria, y ambos se comparan con
+una línea base guardada en JSON. El pico es el mayor entre el de tracemalloc y
+el aumento de memoria residente del proceso (en Linux), que incluye lo que
+tracemalloc no ve: buffers de Arrow y páginas de los ficheros con memory-map.
+
+Uso:
+    python -m benchmarks.app --filas 10000 100000 1000000
+    python -m benchmarks.app --filas 100000 --guardar          # guarda la línea base
+    python -m benchmarks.app --filas 100000 --tolerancia 0.25  # falla si algo empeora más de un 25 %
+                                                               # en tiempo o en memoria
+"""
+import argparse
+import gc
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.datos_sinteticos import generar_dataset
+from utils.buscador import BuscadorTitulos
+from utils.comparables import EstimadorComparables, normalizar_candidatos
+from utils.dataset import preparar_dataset
+from utils.espacial import IndiceEspacial
+from utils.estadisticas import CuboProvincias
+from utils.graficos import histograma_ordenado
+from utils.indice import IndiceParticiones, suelo_precio
+from utils.snapshot import escribir_snapshot, leer_snapshot
+
+LINEA_BASE = Path(__file__).with_name('linea_base.json')
+
+# Diferencia mínima de cada medida para considerar una regresión: evita avisos por ruido
+MARGEN_ABSOLUTO = {'segundos': 0.002, 'pico_mib': 1.0}
+
+
+class Contexto:
+    """Ficheros y dataset preparado de un tamaño, compartidos por todos los pasos."""
+
+    def __init__(self, directorio, filas):
+        datos = generar_dataset(filas)
+        self.ruta_csv = Path(directorio, f'propiedades_{filas}.csv')
+        self.ruta_snapshot = Path(directorio, f'propiedades_{filas}.arrow')
+        datos.to_csv(self.ruta_csv, sep=';', index=False)
+        escribir_snapshot(datos, self.ruta_snapshot)
+
+        self.crudo = leer_snapshot(self.ruta_snapshot)
+        self.dataset = preparar_dataset(self.crudo)
+        # La partición más grande es el peor caso de cada página
+        (self.provincia, self.tipo), self.particion = max(
+            self.dataset.indice.particiones(), key=lambda item: len(item[1])
+        )
+        self.suelo = suelo_precio(self.tipo)
+        limites = self.particion.limites(self.suelo)
+        self.minimo, self.maximo = (limites[0], limites[1]) if limites else (None, None)
+        self.vista = self.dataset.vista(self.particion.rango(self.minimo, self.maximo))
+
+        # Candidatos del estimador: inmuebles existentes de la partición
+        muestra = self.vista.frame(['latitud', 'longitud', 'superficie útil', 'habitaciones', 'baños']).head(1000)
+        self.candidatos = normalizar_candidatos(muestra.assign(**{
+            'provincia': self.provincia, 'venta/alquiler': self.tipo,
+            'superficie útil': muestra['superficie útil'].fillna(80),
+        }))
+
+
+def _rango_slider(ctx):
+    for _, particion in ctx.dataset.indice.particiones():
+        limites = particion.limites(ctx.suelo)
+        if limites:
+            particion.rango(*limites)
+
+
+def _mapa(ctx):
+    zona = ctx.dataset.espacial.limites(ctx.vista.posiciones)
+    ctx.dataset.espacial.consultar(ctx.vista.posiciones, zona)
+
+
+def _zscore(ctx):
+    _, media, desviacion = ctx.dataset.cubo.momentos(ctx.provincia, ctx.tipo, ctx.minimo, ctx.maximo)
+    precios = ctx.particion.precios_rango(ctx.minimo, ctx.maximo)
+    histograma_ordenado(precios, media - 3 * desviacion, media + 3 * desviacion)
+
+
+def _cajas(ctx):
+    for tipo in ctx.dataset.cubo.tipos():
+        ctx.dataset.cubo.cajas(tipo, ctx.dataset.indice.provincias(tipo, suelo_precio(tipo)))
+
+
+def _habitaciones(ctx):
+    ctx.vista.frame(['habitaciones', 'precio']).groupby('habitaciones')['precio'].mean()
+
+
+def _comparador(ctx):
+    # Incluye construir el índice de títulos de la partición (primer uso en la app)
+    BuscadorTitulos(ctx.dataset).buscar(ctx.provincia, ctx.tipo, 'calle may', ctx.minimo, ctx.maximo)
+
+
+def _tabla(ctx):
+    ctx.vista.ordenar('título').pagina(0, 50).frame(['título', 'precio', 'habitaciones', 'enlace'])
+
+
+def _comparables(ctx):
+    # Incluye construir el árbol k-d de la partición
+    EstimadorComparables(ctx.dataset).estimar(ctx.candidatos)
+
+
+# Pasos de la app en el orden en que se ejecutan
+PASOS = {
+    'carga_csv': lambda ctx: pd.read_csv(ctx.ruta_csv, sep=';'),
+    'carga_snapshot': lambda ctx: leer_snapshot(ctx.ruta_snapshot),
+    'normalizacion': lambda ctx: preparar_dataset(ctx.crudo),
+    'indice_provincia_tipo': lambda ctx: IndiceParticiones(ctx.dataset),
+    'rango_slider': _rango_slider,
+    'cubo_estadisticas': lambda ctx: CuboProvincias.desde_dataset(ctx.dataset),
+    'indice_espacial': lambda ctx: IndiceEspacial(ctx.dataset),
+    'mapa': _mapa,
+    'zscore_outliers': _zscore,
+    'cajas': _cajas,
+    'habitaciones': _habitaciones,
+    'comparador': _comparador,
+    'tabla_paginada': _tabla,
+    'comparables': _comparables,
+}
+
+
+# Memoria residente actual y pico (KiB) del proceso
+def _memoria_residente():
+    with open('/proc/self/status') as estado:
+        campos = dict(linea.split(':', 1) for linea in estado if ':' in linea)
+    return int(campos['VmRSS'].split()[0]), int(campos['VmHWM'].split()[0])
+
+
+# Aumento del pico de memoria residente (MiB) durante una ejecución. Solo en Linux:
+# escribir 5 en clear_refs reinicia el pico (VmHWM) a la memoria actual. None si no se puede.
+def pico_residente(paso, ctx):
+    try:
+        with open('/proc/self/clear_refs', 'w') as fichero:
+            fichero.write('5')
+        inicial, _ = _memoria_residente()
+    except OSError:
+        return None
+    paso(ctx)
+    _, pico = _memoria_residente()
+    return (pico - inicial) / 2 ** 10
+
+
+# Mediana del tiempo de `repeticiones` ejecuciones y pico de memoria (MiB) de dos más:
+# una con tracemalloc y otra midiendo la memoria residente
+def medir(paso, ctx, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        paso(ctx)
+        tiempos.append(time.perf_counter() - inicio)
+    tracemalloc.start()
+    paso(ctx)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    residente = pico_residente(paso, ctx)
+    return {'segundos': statistics.median(tiempos), 'pico_mib': max(pico / 2 ** 20, residente or 0)}
+
+
+# Medidas (tiempo o memoria) de cada paso que han empeorado más de la tolerancia respecto a la línea base
+def regresiones(resultados, linea_base, tolerancia):
+    encontradas = []
+    for filas, pasos in resultados.items():
+        for nombre, medida in pasos.items():
+            base = linea_base.get(filas, {}).get(nombre)
+            if base is None:
+                continue
+            for magnitud, margen in MARGEN_ABSOLUTO.items():
+                if magnitud not in base:
+                    continue
+                limite = max(base[magnitud] * (1 + tolerancia), base[magnitud] + margen)
+                if medida[magnitud] > limite:
+                    encontradas.append((filas, nombre, magnitud, base[magnitud], medida[magnitud]))
+    return encontradas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de los cálculos de la app.")
+    parser.add_argument('--filas', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--pasos', nargs='+', choices=list(PASOS), help="Solo estos pasos")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--linea-base', type=Path, default=LINEA_BASE)
+    parser.add_argument('--tolerancia', type=float, default=0.2, help="Empeoramiento admitido (0.2 = 20 %%)")
+    parser.add_argument('--guardar', action='store_true', help="Guarda los resultados como línea base")
+    args = parser.parse_args()
+
+    linea_base = json.loads(args.linea_base.read_text()) if args.linea_base.exists() else {}
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        for filas in args.filas:
+            ctx = Contexto(directorio, filas)
+            resultados[str(filas)] = {}
+            for nombre in args.pasos or PASOS:
+                medida = medir(PASOS[nombre], ctx, args.repeticiones)
+                resultados[str(filas)][nombre] = medida
+                base = linea_base.get(str(filas), {}).get(nombre)
+                comparacion = f"{medida['segundos'] / base['segundos']:6.2f}x base" if base else ""
+                print(f"{filas:>10} {nombre:<22} {medida['segundos'] * 1000:10.1f} ms "
+                      f"{medida['pico_mib']:9.1f} MiB  {comparacion}")
+            del ctx
+
+    if args.guardar:
+        for filas, pasos in resultados.items():
+            linea_base.setdefault(filas, {}).update(pasos)
+        args.linea_base.write_text(json.dumps(linea_base, indent=2, sort_keys=True))
+        print(f"Línea base guardada en {args.linea_base}")
+        sys.exit(0)
+
+    encontradas = regresiones(resultados, linea_base, args.tolerancia)
+    for filas, nombre, magnitud, antes, ahora in encontradas:
+        if magnitud == 'segundos':
+            print(f"REGRESIÓN {nombre} ({filas} filas): {antes * 1000:.1f} ms -> {ahora * 1000:.1f} ms")
+        else:
+            print(f"REGRESIÓN {nombre} ({filas} filas): {antes:.1f} MiB -> {ahora:.1f} MiB")
+    sys.exit(1 if encontradas else 0)
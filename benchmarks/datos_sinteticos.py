@@ -0,0 +1,110 @@
+"""Dataset sintético con el esquema y formato de propiedades_limpio.csv.
+
+Las 53 provincias de pisos.com con más anuncios en las grandes (Madrid, Barcelona,
+Valencia...), alrededor de un 35 % de alquileres, precios log-normales según el
+tipo de transacción y la provincia, superficie, habitaciones y baños relacionados
+entre sí y coordenadas repartidas alrededor del centroide de cada provincia.
+
+Uso:
+    python -m benchmarks.datos_sinteticos --filas 1000000 --salida propiedades_sinteticas.csv
+    python -m benchmarks.datos_sinteticos --filas 1000000 --salida propiedades_sinteticas.arrow
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.provincias import provincia_centroides
+from utils.snapshot import escribir_snapshot
+
+PROVINCIAS = list(provincia_centroides)
+
+# Peso relativo de anuncios por provincia (el resto pesa 1)
+PESOS = {
+    'madrid': 14, 'barcelona': 12, 'valencia': 7, 'alicante': 7, 'malaga': 6, 'sevilla': 4,
+    'murcia': 3, 'islas baleares illes balears': 3, 'las palmas': 3, 'santa cruz de tenerife': 3,
+    'cadiz': 2.5, 'vizcaya bizkaia': 2.5, 'a coruña': 2, 'asturias': 2, 'granada': 2, 'girona': 2,
+    'tarragona': 2, 'zaragoza': 2, 'pontevedra': 2, 'castellon castello': 2, 'almeria': 2,
+}
+
+# Factor de precio por provincia respecto a la media (el resto vale 1)
+FACTOR_PRECIO = {
+    'madrid': 1.8, 'barcelona': 1.8, 'islas baleares illes balears': 1.9, 'guipuzcoa gipuzkoa': 1.6,
+    'vizcaya bizkaia': 1.4, 'malaga': 1.4, 'las palmas': 1.2, 'santa cruz de tenerife': 1.2,
+    'jaen': 0.6, 'ciudad real': 0.6, 'cuenca': 0.6, 'zamora': 0.6, 'teruel': 0.6, 'soria': 0.7,
+}
+
+PROPORCION_ALQUILER = 0.35
+
+CERTIFICADOS = ['sin especificar', 'En trámite', 'A', 'B', 'C', 'D', 'E', 'F', 'G']
+
+
+# DataFrame sintético de `filas` filas con las columnas de propiedades_limpio.csv
+def generar_dataset(filas, semilla=0):
+    rng = np.random.default_rng(semilla)
+    pesos = np.array([PESOS.get(provincia, 1.0) for provincia in PROVINCIAS])
+    codigo = rng.choice(len(PROVINCIAS), filas, p=pesos / pesos.sum())
+    provincia = np.array(PROVINCIAS, dtype=object)[codigo]
+    alquiler = rng.random(filas) < PROPORCION_ALQUILER
+
+    centroides = np.array([provincia_centroides[p] for p in PROVINCIAS])
+    factor = np.array([FACTOR_PRECIO.get(p, 1.0) for p in PROVINCIAS])[codigo]
+
+    superficie = np.clip(rng.lognormal(np.log(85), 0.4, filas), 20, 1500).round()
+    habitaciones = np.clip(np.round(superficie / 30 + rng.normal(0, 0.7, filas)), 0, 10)
+    banos = np.clip(np.round(superficie / 70 + rng.normal(0.4, 0.5, filas)), 1, 6)
+
+    # Precio por m² log-normal: ~12 €/m² de alquiler y ~2.500 €/m² de venta
+    precio_m2 = np.where(alquiler, rng.lognormal(np.log(12), 0.35, filas), rng.lognormal(np.log(2500), 0.45, filas))
+    precio = np.round(precio_m2 * factor * superficie)
+
+    # Un 30 % de anuncios no indica la superficie útil (sí la construida)
+    superficie_util = np.where(rng.random(filas) < 0.3, np.nan, superficie)
+    planta = np.where(rng.random(filas) < 0.2, np.nan, rng.integers(0, 12, filas))
+    ids = rng.integers(0, 2 ** 63, filas)
+
+    return pd.DataFrame({
+        'ID': [f"{i:016x}" for i in ids],
+        'Timestamp': pd.Timestamp('2024-10-18') + pd.to_timedelta(rng.integers(0, 86_400 * 7, filas), unit='s'),
+        'Provincia': provincia,
+        'Título': np.where(alquiler, 'Piso en alquiler en ', 'Piso en venta en ').astype(object)
+                  + np.array(['Calle Mayor', 'Avenida de la Constitución', 'Plaza de España', 'Centro', 'Barrio Nuevo'],
+                             dtype=object)[rng.integers(0, 5, filas)]
+                  + ', ' + provincia,
+        'Precio': precio,
+        'Latitud': centroides[codigo, 0] + rng.normal(0, 0.25, filas),
+        'Longitud': centroides[codigo, 1] + rng.normal(0, 0.3, filas),
+        'Superficie Construida': np.round(superficie * 1.15),
+        'Superficie Útil': superficie_util,
+        'Habitaciones': habitaciones,
+        'Baños': banos,
+        'Planta': planta,
+        'Certificado Energético': np.array(CERTIFICADOS, dtype=object)[rng.integers(0, len(CERTIFICADOS), filas)],
+        'Número de Fotos': rng.integers(1, 60, filas),
+        'Enlace': [f"https://www.pisos.com/inmueble/{i:016x}/" for i in ids],
+        'venta/alquiler': np.where(alquiler, 'alquiler', 'venta'),
+    })
+
+
+# Escribe el dataset como CSV (';', como propiedades_limpio.csv) o snapshot Arrow, por bloques
+def escribir_dataset(ruta, filas, semilla=0, filas_por_bloque=1_000_000):
+    if str(ruta).endswith('.arrow'):
+        # El snapshot se escribe de una vez: las categorías tienen que ser las mismas en todo el fichero
+        escribir_snapshot(generar_dataset(filas, semilla), ruta)
+        return
+    for numero, inicio in enumerate(range(0, filas, filas_por_bloque)):
+        bloque = generar_dataset(min(filas_por_bloque, filas - inicio), semilla + numero)
+        bloque.to_csv(ruta, sep=';', index=False, mode='w' if numero == 0 else 'a', header=numero == 0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Genera un dataset sintético de pisos.com.")
+    parser.add_argument('--filas', type=int, default=100_000, help="p. ej. 10000, 100000, 1000000, 10000000")
+    parser.add_argument('--salida', required=True, help="CSV (separado por ';') o snapshot .arrow")
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    escribir_dataset(args.salida, args.filas, args.semilla)
+    print(f"{args.filas} filas sintéticas en {args.salida} ({time.perf_counter() - inicio:.1f} s)")
@@ -0,0 +1,92 @@
+"""Benchmark del pipeline de limpieza (filas por segundo y pico de memoria).
+
+Genera un CSV en bruto con el formato del scraper ('1.600 €', '140 m²', '5ª',
+'Clasificación: ...') y mide cuánto tarda utils.limpieza en procesarlo.
+
+Uso:
+    python -m benchmarks.limpieza --filas 1000000 --filas-por-bloque 100000
+"""
+import argparse
+import multiprocessing
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.limpieza import limpiar
+from utils.provincias import provincia_centroides, provincias
+
+
+# CSV en bruto con valores como los que escribe el scraper
+def generar_csv_bruto(ruta, filas, semilla=0, filas_por_bloque=200_000):
+    rng = np.random.default_rng(semilla)
+    primera = True
+    for inicio in range(0, filas, filas_por_bloque):
+        n = min(filas_por_bloque, filas - inicio)
+        provincia = rng.choice(provincias, n)
+        centro = np.array([provincia_centroides[p.replace('_', ' ').replace('coruna', 'coruña')] for p in provincia])
+        precio = rng.lognormal(6.9, 0.4, n).round().astype(int)
+        superficie = rng.integers(30, 250, n)
+        bloque = pd.DataFrame({
+            "ID": [f"id-{inicio + i}" for i in range(n)],
+            "Timestamp": "2024-10-18 13:44:00",
+            "Provincia": provincia,
+            "Título": "Piso en alquiler en Calle Mayor",
+            "Precio": [f"{p:,} €".replace(',', '.') for p in precio],
+            "Latitud": (centro[:, 0] + rng.normal(0, 0.2, n)).round(7).astype(str),
+            "Longitud": (centro[:, 1] + rng.normal(0, 0.2, n)).round(7).astype(str),
+            "Superficie Construida": [f"{s + 10} m²" for s in superficie],
+            "Superficie Útil": np.where(rng.random(n) < 0.4, "N/A", [f"{s} m²" for s in superficie]),
+            "Habitaciones": rng.integers(1, 6, n).astype(str),
+            "Baños": rng.integers(1, 4, n).astype(str),
+            "Planta": np.where(rng.random(n) < 0.3, "Bajo", [f"{p}ª" for p in rng.integers(1, 10, n)]),
+            "Certificado Energético": "Clasificación: En trámite",
+            "Número de Fotos": rng.integers(1, 60, n).astype(str),
+            "Enlace": [f"https://www.pisos.com/alquilar/piso-{inicio + i}/" for i in range(n)],
+        })
+        bloque.to_csv(ruta, index=False, mode='w' if primera else 'a', header=primera)
+        primera = False
+
+
+# Pico de memoria residente del proceso en KiB. En Linux se lee VmHWM, que empieza de
+# cero en cada proceso nuevo; ru_maxrss se hereda a través de fork y exec.
+def pico_memoria():
+    try:
+        with open('/proc/self/status') as estado:
+            return next(int(linea.split()[1]) for linea in estado if linea.startswith('VmHWM:'))
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# Limpieza en un proceso nuevo: el pico del proceso del benchmark ya incluye la generación
+# del CSV. Devuelve filas, segundos y el pico (KiB) antes y después de limpiar.
+def medir_limpieza(entrada, salida, filas_por_bloque):
+    memoria_inicial = pico_memoria()
+    inicio = time.perf_counter()
+    filas = limpiar([(entrada, 'alquiler')], salida_parquet=salida, filas_por_bloque=filas_por_bloque)
+    duracion = time.perf_counter() - inicio
+    return filas, duracion, memoria_inicial, pico_memoria()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de utils.limpieza.")
+    parser.add_argument('--filas', type=int, default=1_000_000)
+    parser.add_argument('--filas-por-bloque', type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        entrada = Path(directorio, 'pisos_alquiler_data.csv')
+        generar_csv_bruto(entrada, args.filas)
+
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as proceso:
+            filas, duracion, memoria_inicial, memoria_pico = proceso.submit(
+                medir_limpieza, entrada, Path(directorio, 'limpio.parquet'), args.filas_por_bloque
+            ).result()
+
+    print(f"{filas} filas en {duracion:.2f} s: {filas / duracion:,.0f} filas/s "
+          f"(bloques de {args.filas_por_bloque}, pico de memoria {memoria_pico / 1024:.0f} MiB, "
+          f"{max(0, memoria_pico - memoria_inicial) / 1024:.0f} MiB durante la limpieza)")
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import create_engine, inspect, select
+
+from utils.base_datos import TABLA_ANTERIOR, cargar, propiedades_limpio
+
+
+def _csv_limpio(ruta, filas):
+    base = {
+        'ID': None, 'Timestamp': None, 'Provincia': 'madrid', 'Título': 'Piso en venta', 'Precio': 200000,
+        'Latitud': 40.4, 'Longitud': -3.7, 'Superficie Construida': 90, 'Superficie Útil': 80,
+        'Habitaciones': 3, 'Baños': 1, 'Planta': 2, 'Certificado Energético': 'E', 'Número de Fotos': 10,
+        'Enlace': None, 'venta/alquiler': 'venta',
+    }
+    pd.DataFrame([{**base, **fila} for fila in filas]).to_csv(ruta, sep=';', index=False)
+
+
+def test_cargar_lee_fechas_dia_mes_de_excel(tmp_path):
+    ruta = tmp_path / 'propiedades_limpio.csv'
+    _csv_limpio(ruta, [
+        {'ID': 'a', 'Timestamp': '05/10/2024 12:00', 'Enlace': 'https://www.pisos.com/a/'},
+        {'ID': 'b', 'Timestamp': '18/10/2024 09:30', 'Enlace': 'https://www.pisos.com/b/'},
+        {'ID': 'c', 'Timestamp': '2024-10-25 08:15:00', 'Enlace': 'https://www.pisos.com/c/'},
+    ])
+    engine = create_engine(f"sqlite:///{tmp_path / 'propiedades.db'}")
+
+    assert cargar(engine, ruta) == 3
+    with engine.connect() as conexion:
+        fechas = dict(conexion.execute(
+            select(propiedades_limpio.c.id, propiedades_limpio.c.timestamp)
+        ).all())
+    assert fechas == {
+        'a': datetime(2024, 10, 5, 12, 0),
+        'b': datetime(2024, 10, 18, 9, 30),
+        'c': datetime(2024, 10, 25, 8, 15),
+    }
+
+
+def test_cargar_migra_la_tabla_creada_por_to_sql(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'propiedades.db'}")
+    # Tabla como la del notebook: to_sql(if_exists='replace'), sin clave única ni índices
+    anterior = tmp_path / 'anterior.csv'
+    _csv_limpio(anterior, [
+        {'ID': 'a', 'Timestamp': '2024-10-05 12:00:00', 'Enlace': 'https://www.pisos.com/a/', 'Precio': 100000},
+        {'ID': 'a', 'Timestamp': '2024-10-07 12:00:00', 'Enlace': 'https://www.pisos.com/a/', 'Precio': 110000},
+        {'ID': 'b', 'Timestamp': '2024-10-05 12:00:00', 'Enlace': 'https://www.pisos.com/b/', 'Precio': 150000},
+    ])
+    pd.read_csv(anterior, sep=';').to_sql('propiedades_limpio', con=engine, if_exists='replace', index=False)
+
+    nuevo = tmp_path / 'propiedades_limpio.csv'
+    _csv_limpio(nuevo, [
+        {'ID': 'b', 'Timestamp': '2024-10-25 08:15:00', 'Enlace': 'https://www.pisos.com/b/', 'Precio': 140000},
+        {'ID': 'c', 'Timestamp': '2024-10-25 08:15:00', 'Enlace': 'https://www.pisos.com/c/', 'Precio': 90000},
+    ])
+    assert cargar(engine, nuevo) == 2
+    # Una segunda carga no duplica filas
+    assert cargar(engine, nuevo) == 2
+
+    with engine.connect() as conexion:
+        precios = dict(conexion.execute(
+            select(propiedades_limpio.c.enlace, propiedades_limpio.c.precio)
+        ).all())
+    assert precios == {
+        'https://www.pisos.com/a/': 110000, 'https://www.pisos.com/b/': 140000, 'https://www.pisos.com/c/': 90000,
+    }
+    inspector = inspect(engine)
+    assert not inspector.has_table(TABLA_ANTERIOR)
+    assert {indice.name for indice in propiedades_limpio.indexes} <= {
+        indice['name'] for indice in inspector.get_indexes('propiedades_limpio')
+    }
@@ -0,0 +1,89 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from sqlalchemy import create_engine
+from streamlit.testing.v1 import AppTest
+
+from test_base_datos import _csv_limpio
+from utils.base_datos import cargar
+from utils.buscador import IndiceTitulos
+from utils.dataset import preparar_dataset
+
+APP = Path(__file__).resolve().parent.parent / 'Streamlit' / 'app.py'
+
+TITULOS = ['Ático en Logroño', 'ATICO reformado', 'Piso céntrico', 'Casa con áticos', None, 'Estudio 2 hab.']
+
+
+def test_indice_titulos_ignora_tildes_y_mayusculas():
+    indice = IndiceTitulos.crear(TITULOS)
+
+    assert indice.buscar('atico').tolist() == [0, 1, 3]
+    assert indice.buscar('ÁTICO').tolist() == [0, 1, 3]
+    assert indice.buscar('Logroño').tolist() == [0]
+    assert indice.buscar('logrono').tolist() == [0]
+    assert indice.buscar('CÉNTRICO').tolist() == [2]
+
+
+def test_indice_titulos_busca_prefijos_de_todas_las_palabras():
+    indice = IndiceTitulos.crear(TITULOS)
+
+    assert indice.buscar('at').tolist() == [0, 1, 3]
+    assert indice.buscar('áticos').tolist() == [3]
+    assert indice.buscar('ati ref').tolist() == [1]
+    assert indice.buscar('piso atico').tolist() == []
+    assert indice.buscar('2 ha').tolist() == [5]
+    assert indice.buscar('zz').tolist() == []
+    # Sin palabras no hay filtro
+    assert indice.buscar('') is None
+    assert indice.buscar(' ¿? ') is None
+
+
+def test_buscador_respeta_el_rango_y_el_orden_por_precio():
+    datos = preparar_dataset(pd.DataFrame({
+        'Provincia': ['madrid'] * 5, 'Venta/Alquiler': ['venta'] * 5,
+        'Título': ['Ático A', 'Piso B', 'Ático C', 'ático D', 'Atico E'],
+        'Precio': [300000, 100000, 150000, 250000, 500000], 'Superficie Útil': [100] * 5,
+    }))
+
+    posiciones = datos.buscador.buscar('Madrid', 'Venta', 'atico', minimo=150000, maximo=400000)
+    assert posiciones.tolist() == [2, 3, 0]
+    assert datos.buscador.buscar('Madrid', 'Venta', 'atico', limite=2).tolist() == [2, 3]
+    assert datos.buscador.buscar('Madrid', 'Venta', '', maximo=160000).tolist() == [1, 2]
+    assert np.array_equal(datos.buscador.buscar('Madrid', 'Venta', 'piso', minimo=200000), [])
+
+
+def test_comparador_selecciona_por_id_aunque_se_repita_el_titulo(tmp_path, monkeypatch):
+    ruta = tmp_path / 'propiedades_limpio.csv'
+    # Dos anuncios con el mismo título y el mismo precio: solo el ID los distingue
+    _csv_limpio(ruta, [
+        {'ID': 'a', 'Enlace': 'https://www.pisos.com/a/', 'Título': 'Piso en Chamberí', 'Habitaciones': 2},
+        {'ID': 'b', 'Enlace': 'https://www.pisos.com/b/', 'Título': 'Piso en Chamberí', 'Habitaciones': 4},
+        {'ID': 'c', 'Enlace': 'https://www.pisos.com/c/', 'Título': 'Ático en Salamanca', 'Precio': 400000},
+    ])
+    url = f"sqlite:///{tmp_path / 'propiedades.db'}"
+    cargar(create_engine(url), ruta)
+    monkeypatch.setenv('ORIGEN_DATOS', 'bd')
+    monkeypatch.setenv('DB_URL', url)
+    monkeypatch.chdir(APP.parent)
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+    prueba = AppTest.from_file(str(APP), default_timeout=60)
+    prueba.run()
+    prueba.sidebar.selectbox[0].select("Vista Usuarios").run()
+    prueba.text_input(key='busqueda_inmueble_1').input('chamberi').run()
+    selector = prueba.selectbox(key='inmueble_1')
+    assert sorted(selector.options) == ['Piso en Chamberí · 200,000 € · a', 'Piso en Chamberí · 200,000 € · b']
+
+    selector.set_value('b').run()
+    prueba.selectbox(key='inmueble_2').set_value('c').run()
+    assert not prueba.exception
+    # La tabla traspuesta mezcla tipos y llega al navegador como texto
+    comparador = prueba.dataframe[-1].value
+    assert comparador.loc['habitaciones'].tolist() == ['4', '3']
+    assert comparador.loc['título'].tolist() == ['Piso en Chamberí', 'Ático en Salamanca']
+
+    prueba.selectbox(key='inmueble_1').set_value('a').run()
+    assert prueba.dataframe[-1].value.loc['habitaciones'].tolist() == ['2', '3']
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from utils.comparables import normalizar_candidatos
+from utils.dataset import preparar_dataset
+from utils.snapshot import escribir_snapshot, leer_datos
+
+
+def _datos():
+    return pd.DataFrame({
+        'Provincia': ['madrid'] * 4 + ['sevilla'], 'Venta/Alquiler': ['venta'] * 5,
+        'Precio': [200000, 210000, 400000, 190000, 150000],
+        'Superficie Útil': [80, 85, 160, 75, 80], 'Habitaciones': [3, 3, 5, 2, 3], 'Baños': [1, 1, 3, 1, 1],
+        'Latitud': [40.41, 40.42, 40.50, 40.40, 37.38], 'Longitud': [-3.70, -3.71, -3.60, -3.70, -5.98],
+    })
+
+
+def test_estimar_devuelve_los_vecinos_de_cada_candidato():
+    dataset = preparar_dataset(_datos())
+    candidatos = normalizar_candidatos(pd.DataFrame([
+        {'provincia': 'madrid', 'venta/alquiler': 'venta', 'latitud': 40.41, 'longitud': -3.70,
+         'superficie útil': 80, 'habitaciones': 3, 'baños': 1},
+        {'provincia': 'sevilla', 'venta/alquiler': 'venta', 'latitud': 37.38, 'longitud': -5.98,
+         'superficie útil': 80, 'habitaciones': 3, 'baños': 1},
+    ]))
+
+    estimaciones, vecinos = dataset.comparables.estimar(candidatos, k=3)
+
+    assert estimaciones['comparables'].tolist() == [3, 1]
+    assert estimaciones['precio_estimado'].tolist() == [200000, 150000]
+    assert vecinos[0].tolist() == [0, 1, 3]
+    assert vecinos[1].tolist() == [4, -1, -1]
+    _, posiciones = dataset.comparables.vecinos('Madrid', 'Venta', candidatos.iloc[:1], k=3)
+    np.testing.assert_array_equal(posiciones[0], vecinos[0])
+
+
+def test_leer_datos_de_snapshot_parquet_y_csv(tmp_path):
+    datos = _datos()
+    escribir_snapshot(datos, tmp_path / 'datos.arrow')
+    datos.to_parquet(tmp_path / 'datos.parquet')
+    datos.to_csv(tmp_path / 'datos.csv', sep=';', index=False)
+    datos.to_csv(tmp_path / 'comas.csv', index=False)
+
+    for nombre in ['datos.arrow', 'datos.parquet', 'datos.csv', 'comas.csv']:
+        leidos = leer_datos(tmp_path / nombre)
+        assert leidos.columns.str.lower().tolist() == datos.columns.str.lower().tolist()
+        assert leidos.iloc[:, 2].tolist() == datos['Precio'].tolist()
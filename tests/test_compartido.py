@@ -0,0 +1,60 @@
+import os
+
+import pandas as pd
+
+from utils.compartido import abrir_publicado, leer_puntero, version_compartida
+from utils.dataset import preparar_dataset
+from utils.snapshot import version_fichero
+
+
+def _escribir_origen(ruta, precio):
+    pd.DataFrame({
+        'Provincia': ['madrid', 'sevilla'], 'Venta/Alquiler': ['venta', 'alquiler'],
+        'Precio': [precio, 900.0], 'Superficie Útil': [80.0, 60.0],
+        'Latitud': [40.4168, 37.3891], 'Longitud': [-3.7038, -5.9845],
+    }).to_csv(ruta, sep=';', index=False)
+
+
+def _cargador(ruta, llamadas):
+    def cargar():
+        llamadas.append(ruta)
+        return preparar_dataset(pd.read_csv(ruta, sep=';'), version_fichero(ruta))
+    return cargar
+
+
+def test_version_compartida_se_vuelve_a_publicar_al_regenerar_el_origen(tmp_path):
+    directorio = tmp_path / 'compartido'
+    origen = tmp_path / 'propiedades_limpio.csv'
+    _escribir_origen(origen, 1000.0)
+    llamadas = []
+
+    primera = version_compartida(directorio, _cargador(origen, llamadas), ruta_origen=origen)
+    # Sin cambios en el origen se sigue el puntero sin volver a cargar
+    assert version_compartida(directorio, _cargador(origen, llamadas), ruta_origen=origen) == primera
+    assert len(llamadas) == 1
+
+    # Origen regenerado después de la publicación
+    _escribir_origen(origen, 2000.0)
+    publicado = leer_puntero(directorio)['publicado']
+    os.utime(origen, (publicado + 10, publicado + 10))
+    segunda = version_compartida(directorio, _cargador(origen, llamadas), ruta_origen=origen)
+
+    assert segunda != primera
+    assert len(llamadas) == 2
+    assert leer_puntero(directorio)['origen'] == version_fichero(origen)
+    assert abrir_publicado(directorio, segunda).df['precio'].tolist() == [2000.0, 900.0]
+
+
+def test_version_compartida_respeta_una_publicacion_posterior_al_origen(tmp_path):
+    directorio = tmp_path / 'compartido'
+    origen = tmp_path / 'propiedades_limpio.csv'
+    _escribir_origen(origen, 1000.0)
+    # Versión publicada desde otro fichero (p. ej. tras un crawl) más nueva que el origen local
+    otro = tmp_path / 'crawl.csv'
+    _escribir_origen(otro, 1500.0)
+    os.utime(origen, (1, 1))
+    publicada = version_compartida(directorio, _cargador(otro, []))
+
+    llamadas = []
+    assert version_compartida(directorio, _cargador(origen, llamadas), ruta_origen=origen) == publicada
+    assert llamadas == []
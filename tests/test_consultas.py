@@ -0,0 +1,88 @@
+from pathlib import Path
+
+import pytest
+import streamlit as st
+from sqlalchemy import create_engine, event
+from streamlit.testing.v1 import AppTest
+
+from test_base_datos import _csv_limpio
+from utils import base_datos
+from utils.base_datos import cargar
+from utils.consultas import ConsultasBD
+
+APP = Path(__file__).resolve().parent.parent / 'Streamlit' / 'app.py'
+
+
+@pytest.fixture
+def url_bd(tmp_path):
+    ruta = tmp_path / 'propiedades_limpio.csv'
+    _csv_limpio(ruta, [
+        {'ID': 'a', 'Enlace': 'https://www.pisos.com/a/', 'Precio': 150000, 'Habitaciones': 2},
+        {'ID': 'b', 'Enlace': 'https://www.pisos.com/b/', 'Precio': 250000, 'Habitaciones': 3},
+        {'ID': 'c', 'Enlace': 'https://www.pisos.com/c/', 'Precio': 350000, 'Habitaciones': 3},
+        {'ID': 'd', 'Enlace': 'https://www.pisos.com/d/', 'Provincia': 'a coruña', 'Precio': 900,
+         'venta/alquiler': 'alquiler'},
+        {'ID': 'f', 'Enlace': 'https://www.pisos.com/f/', 'Provincia': 'a coruña', 'Precio': 1200,
+         'venta/alquiler': 'alquiler'},
+        {'ID': 'e', 'Enlace': 'https://www.pisos.com/e/', 'Provincia': 'sevilla', 'Precio': 120000},
+    ])
+    url = f"sqlite:///{tmp_path / 'propiedades.db'}"
+    cargar(create_engine(url), ruta)
+    return url
+
+
+def test_consultas_filtradas(url_bd):
+    consultas = ConsultasBD(create_engine(url_bd))
+
+    assert consultas.valores('provincia') == ['A Coruña', 'Madrid', 'Sevilla']
+    assert consultas.valores('venta/alquiler') == ['Alquiler', 'Venta']
+    assert consultas.provincias('Venta') == ['Madrid', 'Sevilla']
+    assert consultas.provincias('Venta', minimo=200000) == ['Madrid']
+    assert consultas.limites('Madrid', 'Venta') == (150000, 350000)
+    assert consultas.limites('Madrid', 'Alquiler') is None
+
+    mapa = consultas.mapa('Madrid', 'Venta', minimo=200000, maximo=300000)
+    assert mapa[['propiedades', 'precio_medio']].to_dict('records') == [{'propiedades': 1, 'precio_medio': 250000.0}]
+    assert consultas.mapa('Madrid', 'Venta', minimo=400000).empty
+
+    por_habitaciones = consultas.precio_medio_por_habitaciones('Madrid', 'Venta')
+    assert por_habitaciones.to_dict('records') == [
+        {'habitaciones': 2, 'precio': 150000.0}, {'habitaciones': 3, 'precio': 300000.0},
+    ]
+    inmuebles = consultas.inmuebles('Venta', ['Madrid', 'Sevilla'], maximo=200000, columnas=['habitaciones'])
+    assert sorted(inmuebles['Precio']) == [120000, 150000]
+    assert list(inmuebles.columns) == ['Provincia', 'venta/alquiler', 'Precio', 'Habitaciones']
+
+
+def test_app_reutiliza_el_pool_y_las_consultas_cacheadas(url_bd, monkeypatch):
+    monkeypatch.setenv('ORIGEN_DATOS', 'bd')
+    monkeypatch.setenv('DB_URL', url_bd)
+    # La app usa rutas relativas a su carpeta
+    monkeypatch.chdir(APP.parent)
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+    motores, sentencias = [], []
+
+    def motor(**opciones):
+        engine = create_engine(url_bd, **opciones)
+        event.listen(engine, 'before_cursor_execute', lambda *args: sentencias.append(args[2]))
+        motores.append(engine)
+        return engine
+
+    monkeypatch.setattr(base_datos, 'motor_desde_entorno', motor)
+
+    prueba = AppTest.from_file(str(APP), default_timeout=60)
+    prueba.run()
+    prueba.sidebar.selectbox[0].select("Vista Usuarios").run()
+    assert not prueba.exception
+    consultadas = len(sentencias)
+    assert consultadas > 0
+
+    # Otra sesión con los mismos filtros: ni conexiones nuevas ni consultas
+    otra = AppTest.from_file(str(APP), default_timeout=60)
+    otra.run()
+    otra.sidebar.selectbox[0].select("Vista Usuarios").run()
+    assert not otra.exception
+    assert len(motores) == 1
+    assert len(sentencias) == consultadas
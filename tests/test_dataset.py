@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from utils.dataset import preparar_dataset
+
+
+def test_preparar_dataset_no_copia_ni_modifica_el_original():
+    original = pd.DataFrame({
+        'Provincia': ['madrid', 'MADRID', 'a coruña'], 'Venta/Alquiler': ['venta', 'venta', 'alquiler'],
+        'Precio': [200000.0, 300000.0, 900.0], 'Superficie Útil': [80.0, 100.0, np.nan],
+        'Latitud': ['40.4168', '40,4168', 'N/A'], 'Longitud': [-3.7038, -3.7038, -8.4115],
+    })
+    copia = original.copy()
+
+    datos = preparar_dataset(original)
+
+    pd.testing.assert_frame_equal(original, copia)
+    # Las columnas que no se normalizan comparten memoria con el original
+    assert np.shares_memory(datos.array('precio'), original['Precio'].to_numpy())
+    assert datos.valores_unicos('provincia') == ['Madrid', 'A Coruña']
+    assert datos.array('precio por m²').tolist() == [2500.0, 3000.0, 0.0]
+    assert datos.array('latitud')[:2].tolist() == [40.4168, 40.4168]
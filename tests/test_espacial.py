@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.dataset import preparar_dataset
+from utils.espacial import LIMITES_ESPANA, MAX_PUNTOS, NIVELES, nivel_para
+
+# Zonas de distinto tamaño (de toda España a un barrio): cada una usa otro nivel de la rejilla
+ZONAS = [
+    (27.0, 44.5, -18.5, 5.0),
+    (39.0, 42.0, -5.0, -2.0),
+    (40.2, 40.6, -3.9, -3.5),
+    (40.40, 40.45, -3.72, -3.67),
+]
+
+
+@pytest.fixture(scope='module')
+def datos():
+    rng = np.random.default_rng(7)
+    n = 6000
+    # Inmuebles concentrados en Madrid y el resto repartidos por la península
+    lat = np.where(rng.random(n) < 0.7, rng.normal(40.42, 0.05, n), rng.uniform(36.0, 43.5, n))
+    lon = np.where(rng.random(n) < 0.7, rng.normal(-3.70, 0.05, n), rng.uniform(-9.0, 3.0, n))
+    # Sin coordenadas o fuera de España: no se dibujan
+    lat[:50], lon[50:100] = np.nan, np.nan
+    lat[100:150] = 0.0
+    superficie = rng.integers(30, 200, n).astype(float)
+    superficie[::7] = np.nan
+    return preparar_dataset(pd.DataFrame({
+        'Provincia': ['madrid'] * n, 'Venta/Alquiler': ['venta'] * n,
+        'Precio': rng.integers(50_000, 900_000, n).astype(float),
+        'Superficie Útil': superficie, 'Latitud': lat, 'Longitud': lon,
+    }))
+
+
+# Posiciones de la vista dentro de la zona, filtrando todo el DataFrame
+def _en_zona(datos, posiciones, zona):
+    lat_min, lat_max, lon_min, lon_max = zona
+    espana_lat_min, espana_lat_max, espana_lon_min, espana_lon_max = LIMITES_ESPANA
+    df = datos.df.iloc[posiciones]
+    dentro = (df['latitud'].between(max(lat_min, espana_lat_min), min(lat_max, espana_lat_max))
+              & df['longitud'].between(max(lon_min, espana_lon_min), min(lon_max, espana_lon_max)))
+    return np.asarray(posiciones)[dentro.to_numpy()]
+
+
+def test_nivel_para_cada_tamano_de_zona():
+    assert [nivel_para(zona) for zona in ZONAS] == [0, 1, 3, 4]
+
+
+@pytest.mark.parametrize('zona', ZONAS)
+def test_puntos_de_la_zona_igual_que_filtrar(datos, zona):
+    posiciones = np.flatnonzero(np.random.default_rng(1).random(len(datos)) < 0.6)
+
+    agrupado, puntos = datos.espacial.consultar(posiciones, zona, max_puntos=len(datos))
+
+    esperadas = _en_zona(datos, posiciones, zona)
+    assert not agrupado
+    assert puntos['posicion'].tolist() == esperadas.tolist()
+    assert np.array_equal(puntos['lat'], datos.df['latitud'].to_numpy()[esperadas])
+    assert np.array_equal(puntos['precio'], datos.df['precio'].to_numpy()[esperadas])
+
+
+def test_limites_igual_que_filtrar(datos):
+    posiciones = np.arange(len(datos))
+    validas = _en_zona(datos, posiciones, LIMITES_ESPANA)
+    lat, lon = datos.df['latitud'].to_numpy()[validas], datos.df['longitud'].to_numpy()[validas]
+
+    assert datos.espacial.limites(posiciones) == (lat.min(), lat.max(), lon.min(), lon.max())
+    assert datos.espacial.limites(np.arange(150)) is None
+
+
+def test_agrupa_a_partir_de_max_puntos(datos):
+    validas = _en_zona(datos, np.arange(len(datos)), LIMITES_ESPANA)
+
+    assert not datos.espacial.consultar(validas[:MAX_PUNTOS], LIMITES_ESPANA)[0]
+    assert datos.espacial.consultar(validas[:MAX_PUNTOS + 1], LIMITES_ESPANA)[0]
+
+
+@pytest.mark.parametrize('zona', ZONAS)
+def test_agrupa_por_celdas_por_encima_del_maximo(datos, zona):
+    posiciones = np.arange(len(datos))
+    esperadas = _en_zona(datos, posiciones, zona)
+
+    # Hasta el máximo, puntos; por encima, grupos
+    assert not datos.espacial.consultar(posiciones, zona, max_puntos=len(esperadas))[0]
+    agrupado, grupos = datos.espacial.consultar(posiciones, zona, max_puntos=len(esperadas) - 1)
+    assert agrupado
+
+    # Grupos calculados a mano con la celda de cada inmueble en el nivel de la zona
+    lado = NIVELES[nivel_para(zona)]
+    df = datos.df.iloc[esperadas]
+    precio_m2 = df['precio por m²'].where(df['precio por m²'] > 0)
+    celda = [np.floor((df['latitud'] - LIMITES_ESPANA[0]) / lado), np.floor((df['longitud'] - LIMITES_ESPANA[2]) / lado)]
+    a_mano = df.assign(precio_m2=precio_m2).groupby(celda).agg(
+        lat=('latitud', 'mean'), lon=('longitud', 'mean'), propiedades=('precio', 'size'),
+        precio_medio=('precio', 'mean'), precio_m2_medio=('precio_m2', 'mean'),
+    ).sort_values(['lat', 'lon']).reset_index(drop=True)
+
+    grupos = grupos.sort_values(['lat', 'lon']).reset_index(drop=True)
+    assert grupos['propiedades'].sum() == len(esperadas)
+    pd.testing.assert_frame_equal(grupos, a_mano, check_dtype=False)
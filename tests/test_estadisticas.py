@@ -0,0 +1,56 @@
+from dataclasses import fields
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.datos_sinteticos import generar_dataset
+from utils.dataset import preparar_dataset
+
+
+def _nuevas():
+    # Provincia que no estaba, precios repetidos, sin precio y por debajo del suelo del alquiler
+    filas = generar_dataset(4, semilla=1)
+    filas['Provincia'] = ['soria', 'soria', 'nueva provincia', 'madrid']
+    filas['venta/alquiler'] = ['venta', 'venta', 'alquiler', 'alquiler']
+    filas['Precio'] = [150000.0, 150000.0, np.nan, 200.0]
+    filas['Enlace'] = [f"https://www.pisos.com/nuevo-{i}/" for i in range(4)]
+    return filas
+
+
+def test_cubo_incremental_igual_que_reconstruido():
+    datos = generar_dataset(3000)
+    todas = pd.concat([datos, _nuevas()], ignore_index=True)
+    anterior = preparar_dataset(datos.iloc[:2000])
+    anterior.cubo  # noqa: B018 - construye el índice y el cubo de la versión anterior
+
+    ampliado = preparar_dataset(todas).heredar(anterior)
+    completo = preparar_dataset(todas)
+
+    assert {'indice', 'cubo'} <= set(vars(ampliado))
+    claves = dict(completo.indice.particiones())
+    assert set(dict(ampliado.indice.particiones())) == set(claves)
+    for clave, particion in ampliado.indice.particiones():
+        np.testing.assert_array_equal(particion.posiciones, claves[clave].posiciones)
+        np.testing.assert_array_equal(particion.precios, claves[clave].precios)
+        for campo in fields(ampliado.cubo._celdas[clave]):
+            np.testing.assert_allclose(getattr(ampliado.cubo._celdas[clave], campo.name),
+                                       getattr(completo.cubo._celdas[clave], campo.name))
+    for tipo in completo.cubo.tipos():
+        provincias = completo.indice.provincias(tipo)
+        pd.testing.assert_frame_equal(ampliado.cubo.cajas(tipo, provincias), completo.cubo.cajas(tipo, provincias))
+
+    # Las celdas sin filas nuevas no se recalculan
+    intactas = [clave for clave in dict(anterior.indice.particiones())
+                if anterior.indice.particion(*clave) is ampliado.indice.particion(*clave)]
+    assert intactas
+    assert all(ampliado.cubo._celdas[clave] is anterior.cubo._celdas[clave] for clave in intactas)
+
+
+def test_heredar_reconstruye_si_cambian_filas_anteriores():
+    datos = generar_dataset(500)
+    anterior = preparar_dataset(datos.iloc[:400])
+    anterior.cubo  # noqa: B018
+
+    cambiado = datos.copy()
+    cambiado.loc[0, 'Precio'] += 1
+    assert 'indice' not in vars(preparar_dataset(cambiado).heredar(anterior))
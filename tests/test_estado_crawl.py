@@ -0,0 +1,118 @@
+import asyncio
+import csv
+
+from aiohttp import web
+
+from utils.estado_crawl import EstadoCrawl
+from utils.scraper import Scraper, ruta_fixture
+from utils.servidor_fixtures import crear_app
+
+# Dos páginas de listado de La Rioja con dos anuncios cada una
+PAGINAS = {1: ['piso-0', 'piso-1'], 2: ['piso-2', 'piso-3']}
+
+
+def _listado(anuncios, precios):
+    return '<html><body>' + ''.join(
+        f'<div class="ad-preview"><a class="ad-preview__title" href="/alquilar/{anuncio}/">Piso</a>'
+        f'<span class="ad-preview__price">{precios[anuncio]} €/mes</span></div>'
+        for anuncio in anuncios
+    ) + '</body></html>'
+
+
+def _ficha(anuncio, precio):
+    return (f'<html><body><h1>Piso {anuncio}</h1>'
+            f'<span class="price__value jsPriceValue">{precio} <span>€/mes</span></span>'
+            '<img alt="mapa" src="https://maps.pisos.com/mapa_42.4627@-2.4449_600x300.png"></body></html>')
+
+
+# Graba las páginas de listado y las fichas con los precios indicados
+def _grabar(directorio, precios):
+    for numero, anuncios in PAGINAS.items():
+        listado = '/alquiler/pisos-la_rioja/' + (f'{numero}/' if numero > 1 else '')
+        paginas = {listado: _listado(anuncios, precios)}
+        paginas.update({f'/alquilar/{anuncio}/': _ficha(anuncio, precios[anuncio]) for anuncio in anuncios})
+        for ruta, contenido in paginas.items():
+            fichero = ruta_fixture(directorio, ruta)
+            fichero.parent.mkdir(parents=True, exist_ok=True)
+            fichero.write_text(contenido, encoding='utf-8')
+
+
+# Ejecuta el scraper contra el servidor de fixtures; las rutas de `fallar` responden 503.
+# Devuelve las rutas pedidas.
+async def _crawl(directorio, salida, estado, ejecucion, fallar=()):
+    peticiones = []
+
+    @web.middleware
+    async def registrar(request, handler):
+        peticiones.append(request.path)
+        if request.path in fallar:
+            raise web.HTTPServiceUnavailable()
+        return await handler(request)
+
+    app = crear_app(directorio)
+    app.middlewares.append(registrar)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    sitio = web.TCPSite(runner, '127.0.0.1', 0)
+    await sitio.start()
+    host, puerto = runner.addresses[0][:2]
+    try:
+        scraper = Scraper('alquiler', f"http://{host}:{puerto}", peticiones_por_segundo=0, reintentos=1,
+                          estado=estado, ejecucion=ejecucion)
+        await scraper.ejecutar(['la_rioja'], salida)
+    finally:
+        await runner.cleanup()
+    return peticiones
+
+
+def _filas(salida):
+    with open(salida, encoding='utf-8', newline='') as fichero:
+        return list(csv.DictReader(fichero))
+
+
+def test_crawl_interrumpido_se_reanuda_sin_repetir_fichas(tmp_path):
+    precios = {f'piso-{i}': 500 + i for i in range(4)}
+    _grabar(tmp_path / 'fixtures', precios)
+    salida = tmp_path / 'pisos_alquiler_data.csv'
+    estado = EstadoCrawl(tmp_path / 'crawl.sqlite')
+    try:
+        # La segunda página de listado falla: la primera queda guardada, la provincia no
+        peticiones = asyncio.run(_crawl(tmp_path / 'fixtures', salida, estado, 'e1',
+                                        fallar={'/alquiler/pisos-la_rioja/2/'}))
+        assert sorted(p for p in peticiones if p.startswith('/alquilar/')) == ['/alquilar/piso-0/', '/alquilar/piso-1/']
+        assert estado.progreso('e1', 'alquiler', 'la_rioja') == (1, False)
+
+        # Al reanudar la misma ejecución se sigue en la página 2 sin volver a pedir la 1 ni sus fichas
+        peticiones = asyncio.run(_crawl(tmp_path / 'fixtures', salida, estado, 'e1'))
+        assert '/alquiler/pisos-la_rioja/' not in peticiones
+        assert sorted(p for p in peticiones if p.startswith('/alquilar/')) == ['/alquilar/piso-2/', '/alquilar/piso-3/']
+        assert estado.progreso('e1', 'alquiler', 'la_rioja') == (2, True)
+        filas = _filas(salida)
+        assert sorted(fila['Enlace'] for fila in filas) == [f'https://www.pisos.com/alquilar/piso-{i}/' for i in range(4)]
+
+        # Una ejecución ya terminada no pide nada
+        assert asyncio.run(_crawl(tmp_path / 'fixtures', salida, estado, 'e1')) == []
+        assert len(_filas(salida)) == 4
+    finally:
+        estado.cerrar()
+
+
+def test_crawl_nuevo_solo_pide_las_fichas_con_otro_precio(tmp_path):
+    precios = {f'piso-{i}': 500 + i for i in range(4)}
+    _grabar(tmp_path / 'fixtures', precios)
+    salida = tmp_path / 'pisos_alquiler_data.csv'
+    estado = EstadoCrawl(tmp_path / 'crawl.sqlite')
+    try:
+        asyncio.run(_crawl(tmp_path / 'fixtures', salida, estado, 'e1'))
+
+        _grabar(tmp_path / 'fixtures', {**precios, 'piso-2': 450})
+        peticiones = asyncio.run(_crawl(tmp_path / 'fixtures', salida, estado, 'e2'))
+
+        assert [p for p in peticiones if p.startswith('/alquilar/')] == ['/alquilar/piso-2/']
+        filas = _filas(salida)
+        assert len(filas) == 5
+        assert (filas[-1]['Enlace'], filas[-1]['Precio']) == ('https://www.pisos.com/alquilar/piso-2/', '450 €')
+        # Los anuncios sin cambios también cuentan como vistos en la ejecución nueva
+        assert sorted(estado.enlaces_vistos('e2')) == [f'https://www.pisos.com/alquilar/piso-{i}/' for i in range(4)]
+    finally:
+        estado.cerrar()
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from utils.graficos import densidad_2d, histograma_ordenado
+
+
+# Precios enteros entre 0 y 400: con 40 intervalos los bordes caen justo en precios de los datos
+def _precios():
+    rng = np.random.default_rng(5)
+    return np.sort(np.concatenate([rng.integers(0, 401, 3000), np.arange(0, 401, 10), [0, 0, 400, 400]])).astype(float)
+
+
+@pytest.mark.parametrize('limite_inf, limite_sup', [(0, 400), (35.5, 250), (40, 250), (-10, 1000), (120, 120)])
+def test_histograma_ordenado_igual_que_np_histogram(limite_inf, limite_sup):
+    precios = _precios()
+
+    bordes, normales, atipicos = histograma_ordenado(precios, limite_inf, limite_sup, nbins=40)
+
+    totales, bordes_np = np.histogram(precios, bins=40)
+    assert np.array_equal(bordes, bordes_np)
+    assert np.array_equal(normales + atipicos, totales)
+    # El máximo cuenta en el último intervalo y cada borde interior abre el intervalo siguiente
+    assert totales[-1] == np.count_nonzero(precios >= 390)
+    assert totales[0] == np.count_nonzero(precios < 10)
+    entre_limites = precios[(precios >= limite_inf) & (precios <= limite_sup)]
+    assert np.array_equal(normales, np.histogram(entre_limites, bins=bordes)[0])
+
+
+def test_histograma_ordenado_con_un_solo_precio():
+    precios = np.full(7, 950.0)
+
+    bordes, normales, atipicos = histograma_ordenado(precios, 950, 950, nbins=4)
+
+    totales, bordes_np = np.histogram(precios, bins=4)
+    assert np.array_equal(bordes, bordes_np)
+    assert np.array_equal(normales, totales)
+    assert not atipicos.any()
+
+
+def test_densidad_2d_igual_que_np_histogram2d():
+    rng = np.random.default_rng(6)
+    x = np.concatenate([rng.integers(20, 301, 2000), [20, 300, 300, np.nan, np.inf, 50]]).astype(float)
+    y = np.concatenate([rng.integers(100, 10_001, 2000), [100, 10_000, np.nan, 500, 500, -np.inf]]).astype(float)
+    validos = np.isfinite(x) & np.isfinite(y)
+
+    bordes_x, bordes_y, recuentos = densidad_2d(x, y, nbins=28)
+
+    esperados, esperados_x, esperados_y = np.histogram2d(x[validos], y[validos], bins=28)
+    assert np.array_equal(bordes_x, esperados_x) and np.array_equal(bordes_y, esperados_y)
+    assert np.array_equal(recuentos, esperados)
+    assert recuentos.sum() == validos.sum()
+    # La esquina (300, 10000) cae en la última celda de los dos ejes
+    assert recuentos[-1, -1] == np.count_nonzero((x[validos] >= bordes_x[-2]) & (y[validos] >= bordes_y[-2]))
+
+
+def test_densidad_2d_con_rango_de_superficie():
+    x = np.array([10.0, 20, 55, 100, 100, 150, np.nan])
+    y = np.array([1.0, 2, 3, 4, 5, 6, 7])
+
+    bordes_x, _, recuentos = densidad_2d(x, y, rango_x=(20, 100), nbins=4)
+
+    assert bordes_x.tolist() == [20, 40, 60, 80, 100]
+    # Fuera del rango no cuenta; 20 va al primer intervalo y 100 al último
+    assert recuentos.sum(axis=1).tolist() == [1, 1, 0, 2]
+    # El rango del precio sale de todas las filas con los dos valores, también las de fuera
+    assert np.array_equal(recuentos, np.histogram2d(x[:6], y[:6], bins=4, range=[(20, 100), (1, 6)])[0])
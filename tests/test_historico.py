@@ -0,0 +1,93 @@
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from utils.historico import (
+    CAMBIOS, ESTADISTICAS, PREFIJO, bajadas_precio, crawls, historial_anuncio, registrar_crawl, tendencia
+)
+
+
+def _anuncio(enlace, precio, provincia='madrid', tipo='venta', titulo='Piso', habitaciones=3):
+    return {
+        'Enlace': enlace, 'Provincia': provincia, 'Venta/Alquiler': tipo, 'Precio': precio,
+        'Superficie Construida': 100, 'Superficie Útil': 80, 'Habitaciones': habitaciones, 'Baños': 1,
+        'Planta': 2, 'Certificado Energético': 'E', 'Título': titulo,
+        'Latitud': 40.4, 'Longitud': -3.7, 'Timestamp': '2024-10-01 08:00:00',
+    }
+
+
+def _crawl(*anuncios):
+    return pd.DataFrame(list(anuncios))
+
+
+def test_registrar_crawl_escribe_particiones_y_cambios(tmp_path):
+    registrar_crawl(_crawl(_anuncio('u0', 200000), _anuncio('u1', 150000), _anuncio('u2', 900, 'sevilla', 'alquiler')),
+                    tmp_path, '2024-10-01')
+    resumen = registrar_crawl(_crawl(_anuncio('u0', 190000), _anuncio('u1', 150000, habitaciones=4),
+                                     _anuncio('u2', 900, 'sevilla', 'alquiler'), _anuncio('u3', 300000)),
+                              tmp_path, '2024-10-08')
+
+    assert crawls(tmp_path) == ['2024-10-01', '2024-10-08']
+    assert resumen == {'fecha': '2024-10-08', 'anuncios': 4, 'altas': 1, 'bajas': 0, 'cambios': 2}
+    particion = Path(tmp_path, f'{PREFIJO}2024-10-08')
+    assert (particion / ESTADISTICAS).exists()
+
+    # Solo se guardan los anuncios que cambian y, en los cambios, solo los campos que cambian
+    cambios = pq.read_table(particion / CAMBIOS).to_pandas().set_index('enlace')
+    assert sorted(cambios.index) == ['u0', 'u1', 'u3']
+    assert cambios.loc['u3', 'evento'] == 'alta'
+    assert (cambios.loc['u0', ['precio', 'precio_anterior']].tolist(), pd.isna(cambios.loc['u0', 'habitaciones'])) \
+        == ([190000.0, 200000.0], True)
+    assert pd.isna(cambios.loc['u1', 'precio']) and cambios.loc['u1', 'habitaciones'] == 4.0
+
+    # El historial completa cada cambio con los campos del registro anterior
+    historial = historial_anuncio('u1', tmp_path)
+    assert historial['fecha'].tolist() == ['2024-10-01', '2024-10-08']
+    assert historial['evento'].tolist() == ['alta', 'cambio']
+    assert historial['precio'].tolist() == [150000.0, 150000.0]
+    assert historial['habitaciones'].tolist() == [3.0, 4.0]
+
+
+def test_bajadas_y_tendencia(tmp_path):
+    registrar_crawl(_crawl(_anuncio('u0', 200000, titulo='Ático'), _anuncio('u1', 100000)), tmp_path, '2024-10-01')
+    registrar_crawl(_crawl(_anuncio('u0', 180000, titulo='Ático'), _anuncio('u1', 110000)), tmp_path, '2024-10-08')
+    registrar_crawl(_crawl(_anuncio('u0', 150000, titulo='Ático reformado'), _anuncio('u1', 90000)),
+                    tmp_path, '2024-10-15')
+
+    bajadas = bajadas_precio(directorio=tmp_path).set_index('enlace')
+    # Del precio anterior al primer cambio al precio tras el último
+    assert bajadas.index.tolist() == ['u0', 'u1']
+    assert bajadas.loc['u0', ['precio_inicial', 'precio_final', 'cambios_precio']].tolist() == [200000.0, 150000.0, 2]
+    assert bajadas.loc['u0', 'bajada_pct'] == 25.0
+    assert bajadas.loc['u0', 'título'] == 'Ático reformado'
+    assert bajadas.loc['u1', 'precio_inicial'] == 100000.0
+    # Solo el último crawl: u1 baja un 18 % (110000 -> 90000) y u0 un 17 %
+    assert bajadas_precio(desde='2024-10-15', directorio=tmp_path)['enlace'].tolist() == ['u1', 'u0']
+    assert bajadas_precio(hasta='2024-10-08', directorio=tmp_path)['enlace'].tolist() == ['u0']
+
+    serie = tendencia('madrid', 'venta', ultimos=2, directorio=tmp_path)
+    assert serie['fecha'].tolist() == ['2024-10-08', '2024-10-15']
+    assert serie['precio_medio'].tolist() == [145000.0, 120000.0]
+    assert serie[['bajadas', 'subidas']].values.tolist() == [[1, 1], [2, 0]]
+    assert tendencia('sevilla', 'venta', directorio=tmp_path).empty
+
+
+def test_bajas_solo_con_los_enlaces_vistos_en_el_crawl(tmp_path):
+    registrar_crawl(_crawl(_anuncio('u0', 200000), _anuncio('u1', 150000), _anuncio('u2', 120000)),
+                    tmp_path, '2024-10-01')
+
+    # Un crawl parcial no da de baja lo que no ha leído
+    resumen = registrar_crawl(_crawl(_anuncio('u0', 200000)), tmp_path, '2024-10-08')
+    assert (resumen['anuncios'], resumen['bajas']) == (3, 0)
+    assert tendencia('madrid', 'venta', directorio=tmp_path)['anuncios'].tolist() == [3, 3]
+
+    # En un crawl completo, u1 se vio en los listados (sin descargar su ficha) y u2 ya no
+    # aparece, aunque su última fila siga en los datos limpios
+    resumen = registrar_crawl(_crawl(_anuncio('u0', 200000), _anuncio('u2', 120000)), tmp_path, '2024-10-15',
+                              vistos=['u0', 'u1'])
+    assert (resumen['anuncios'], resumen['bajas']) == (2, 1)
+    assert tendencia('madrid', 'venta', directorio=tmp_path)[['anuncios', 'bajas']].values.tolist()[-1] == [2, 1]
+    historial = historial_anuncio('u2', tmp_path)
+    assert historial['evento'].tolist() == ['alta', 'baja']
+    assert historial['fecha'].tolist()[-1] == '2024-10-15'
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.datos_sinteticos import generar_dataset
+from utils.dataset import preparar_dataset
+from utils.indice import SUELO_ALQUILER
+
+
+@pytest.fixture(scope='module')
+def datos():
+    df = generar_dataset(5000, semilla=3)
+    # Precios repetidos (redondeados a miles o a decenas) y filas sin precio
+    df['Precio'] = np.where(df['venta/alquiler'] == 'venta', df['Precio'].round(-4), df['Precio'].round(-2))
+    df.loc[df.sample(frac=0.03, random_state=0).index, 'Precio'] = np.nan
+    return preparar_dataset(df)
+
+
+# Posiciones que deja pasar un filtro de pandas, ordenadas por precio (y por posición si empatan)
+def _filtrar(datos, provincia, tipo, minimo=None, maximo=None):
+    df = datos.df
+    mascara = (df['provincia'] == provincia) & (df['venta/alquiler'] == tipo) & df['precio'].notna()
+    if minimo is not None:
+        mascara &= df['precio'] >= minimo
+    if maximo is not None:
+        mascara &= df['precio'] <= maximo
+    filas = df.loc[mascara, 'precio'].reset_index(drop=True).set_axis(np.flatnonzero(mascara))
+    return filas.sort_values(kind='stable').index.to_numpy()
+
+
+def test_particiones_igual_que_filtrar(datos):
+    claves = {clave for clave, _ in datos.indice.particiones()}
+    pares = datos.df[['provincia', 'venta/alquiler']][datos.df['precio'].notna()].drop_duplicates()
+    assert claves == set(map(tuple, pares.to_numpy()))
+
+    for (provincia, tipo), particion in datos.indice.particiones():
+        esperadas = _filtrar(datos, provincia, tipo)
+        assert particion.posiciones.tolist() == esperadas.tolist()
+        assert np.array_equal(particion.precios, datos.df['precio'].to_numpy()[esperadas])
+
+    assert len(datos.indice.particion('Madrid', 'Otro')) == 0
+
+
+def test_rangos_de_precio_igual_que_filtrar(datos):
+    for (provincia, tipo), particion in datos.indice.particiones():
+        precios = particion.precios
+        # Límites que coinciden con precios repetidos, que caen entre dos y que no dejan nada
+        limites = [(None, None), (precios[0], precios[-1]), (precios[len(precios) // 2], None),
+                   (None, precios[len(precios) // 3]), (precios[len(precios) // 4] + 1, precios[-1] - 1),
+                   (precios[-1] + 1, None), (None, precios[0] - 1), (precios[-1], precios[0])]
+        for minimo, maximo in limites:
+            esperadas = _filtrar(datos, provincia, tipo, minimo, maximo)
+            assert particion.rango(minimo, maximo).tolist() == esperadas.tolist()
+            assert np.array_equal(particion.precios_rango(minimo, maximo), datos.df['precio'].to_numpy()[esperadas])
+
+
+def test_limites_y_provincias_igual_que_filtrar(datos):
+    df = datos.df
+    for tipo, suelo in [('Venta', None), ('Alquiler', SUELO_ALQUILER)]:
+        filas = df[(df['venta/alquiler'] == tipo) & df['precio'].notna()]
+        if suelo is not None:
+            filas = filas[filas['precio'] >= suelo]
+        # En el orden en que aparecen las provincias en los datos
+        esperadas = [provincia for provincia in pd.unique(df['provincia']) if provincia in set(filas['provincia'])]
+        assert datos.indice.provincias(tipo, suelo) == esperadas
+
+        rangos = filas.groupby('provincia', observed=True)['precio'].agg(['min', 'max'])
+        for provincia, (minimo, maximo) in rangos.iterrows():
+            assert datos.indice.particion(provincia, tipo).limites(suelo) == (minimo, maximo)
@@ -0,0 +1,52 @@
+import pandas as pd
+
+from utils.limpieza import limpiar
+
+
+def _fila(enlace, timestamp, precio):
+    return {
+        'ID': enlace[-2:], 'Timestamp': timestamp, 'Provincia': 'madrid', 'Título': 'Piso en alquiler',
+        'Precio': precio, 'Latitud': '40.4168', 'Longitud': '-3.7038', 'Superficie Construida': '90 m²',
+        'Superficie Útil': '80 m²', 'Habitaciones': '3', 'Baños': '1', 'Planta': '2ª',
+        'Certificado Energético': 'Clasificación: E', 'Número de Fotos': '10', 'Enlace': enlace,
+    }
+
+
+def test_limpiar_conserva_la_fila_mas_reciente_de_cada_enlace(tmp_path):
+    entrada = tmp_path / 'pisos_alquiler_data.csv'
+    pd.DataFrame([
+        _fila('https://www.pisos.com/a1', '2024-10-18 10:00:00', '1.000 €'),
+        _fila('https://www.pisos.com/b2', '2024-10-18 10:00:00', '900 €'),
+        # Cambio de precio añadido por el crawl incremental
+        _fila('https://www.pisos.com/a1', '2024-10-20 10:00:00', '950 €'),
+        # Fila más antigua escrita después: no sustituye a la vigente
+        _fila('https://www.pisos.com/b2', '17/10/2024 09:00', '1.100 €'),
+    ]).to_csv(entrada, index=False)
+    salida = tmp_path / 'limpio.parquet'
+
+    # Bloques de una fila: los duplicados caen en bloques distintos
+    assert limpiar([(entrada, 'alquiler')], salida_parquet=salida, filas_por_bloque=1) == 2
+    limpio = pd.read_parquet(salida).set_index('Enlace')
+    assert limpio['Precio'].to_dict() == {'https://www.pisos.com/a1': 950, 'https://www.pisos.com/b2': 900}
+
+
+def test_limpiar_con_lineas_mal_formadas(tmp_path):
+    entrada = tmp_path / 'pisos_alquiler_data.csv'
+    pd.DataFrame([
+        _fila('https://www.pisos.com/u0', '2024-10-18 10:00:00', '700 €'),
+        _fila('https://www.pisos.com/u1', '2024-10-18 10:00:00', '1.000 €'),
+        _fila('https://www.pisos.com/u2', '2024-10-18 10:00:00', '800 €'),
+        _fila('https://www.pisos.com/u1', '2024-10-20 10:00:00', '2.000 €'),
+    ]).to_csv(entrada, index=False)
+    # Línea con campos de más (comas sin comillas) antes de las filas de u1: el lector la descarta
+    lineas = entrada.read_text(encoding='utf-8').splitlines()
+    lineas.insert(2, ','.join(['x'] * 20))
+    entrada.write_text('\n'.join(lineas) + '\n', encoding='utf-8')
+    salida = tmp_path / 'limpio.parquet'
+
+    for filas_por_bloque in (2, 100):
+        assert limpiar([(entrada, 'alquiler')], salida_parquet=salida, filas_por_bloque=filas_por_bloque) == 3
+        limpio = pd.read_parquet(salida).set_index('Enlace')
+        assert limpio['Precio'].to_dict() == {
+            'https://www.pisos.com/u0': 700, 'https://www.pisos.com/u1': 2000, 'https://www.pisos.com/u2': 800,
+        }
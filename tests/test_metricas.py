@@ -0,0 +1,39 @@
+import threading
+
+from utils import metricas
+from utils.metricas import Metricas, leer_jsonl, resumen
+
+
+def test_volcar_y_resumen_desde_varias_sesiones(tmp_path):
+    ruta = tmp_path / 'metricas.jsonl'
+    errores = []
+
+    def sesion(numero):
+        try:
+            for _ in range(100):
+                registro = Metricas(activo=True, ruta=ruta, sesion=str(numero))
+                with registro.tramo('filtro'):
+                    pass
+                registro.volcar('Vista Usuarios')
+                resumen()
+        except Exception as error:
+            errores.append(error)
+
+    hilos = [threading.Thread(target=sesion, args=(numero,)) for numero in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert errores == []
+    assert len(leer_jsonl(ruta)) == 8 * 100
+    fila = resumen(metricas.historial()).set_index('tramo').loc['filtro']
+    assert fila['n'] >= 8 * 100
+
+
+def test_tramo_desactivado_no_registra():
+    registro = Metricas(activo=False)
+    with registro.tramo('filtro') as abierto:
+        registro.marcar(cache='fallo')
+    assert abierto is None
+    assert registro.registros == []
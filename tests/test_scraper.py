@@ -0,0 +1,71 @@
+import asyncio
+import csv
+import threading
+
+import pytest
+from aiohttp import web
+
+from utils.scraper import Scraper
+
+LISTADO = """<html><body>
+<div class="ad-preview"><a class="ad-preview__title" href="/alquilar/atico-logrono-1/">Ático</a>
+<span class="ad-preview__price">950 €/mes</span></div>
+</body></html>"""
+
+FICHA = """<html><body><h1>Ático en Logroño</h1>
+<span class="price__value jsPriceValue">950 <span>€/mes</span></span>
+<img alt="mapa" src="https://maps.pisos.com/mapa_42.4627@-2.4449_600x300.png">
+<ul><li><span>Superficie útil: </span><span>80 m²</span></li>
+<li><span>Baños: </span><span>1</span></li></ul>
+</body></html>"""
+
+PAGINAS = {'/alquiler/pisos-la_rioja/': LISTADO, '/alquilar/atico-logrono-1/': FICHA}
+
+
+# Servidor que indica la codificación solo en la cabecera Content-Type (sin <meta charset>)
+async def _scrapear(salida, charset):
+    async def servir(request):
+        if request.path not in PAGINAS:
+            raise web.HTTPNotFound()
+        return web.Response(body=PAGINAS[request.path].encode(charset),
+                            content_type='text/html', charset=charset)
+
+    app = web.Application()
+    app.router.add_get('/{ruta:.*}', servir)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    sitio = web.TCPSite(runner, '127.0.0.1', 0)
+    await sitio.start()
+    host, puerto = runner.addresses[0][:2]
+    try:
+        scraper = Scraper('alquiler', f"http://{host}:{puerto}", peticiones_por_segundo=0)
+        return await scraper.ejecutar(['la_rioja'], salida)
+    finally:
+        await runner.cleanup()
+
+
+@pytest.mark.parametrize('charset', ['utf-8', 'iso-8859-15'])
+def test_scraper_decodifica_con_el_charset_de_la_respuesta(tmp_path, charset):
+    salida = tmp_path / 'pisos_alquiler_data.csv'
+
+    assert asyncio.run(_scrapear(salida, charset)) == 1
+    with open(salida, encoding='utf-8', newline='') as fichero:
+        fila, = csv.DictReader(fichero)
+    assert fila['Título'] == 'Ático en Logroño'
+    assert fila['Precio'] == '950 €'
+    assert fila['Superficie Útil'] == '80 m²'
+    assert fila['Baños'] == '1'
+    assert (fila['Latitud'], fila['Longitud']) == ('42.4627', '-2.4449')
+
+
+def test_scraper_escribe_el_csv_fuera_del_bucle_de_eventos(tmp_path, monkeypatch):
+    hilos = []
+    escribir = Scraper._escribir
+
+    def registrar(self, filas):
+        hilos.append(threading.get_ident())
+        escribir(self, filas)
+
+    monkeypatch.setattr(Scraper, '_escribir', registrar)
+    assert asyncio.run(_scrapear(tmp_path / 'pisos_alquiler_data.csv', 'utf-8')) == 1
+    assert hilos and threading.get_ident() not in hilos
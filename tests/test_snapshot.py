@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from utils.dataset import preparar_dataset
+from utils.snapshot import escribir_snapshot, leer_snapshot
+
+
+def test_snapshot_conserva_enteros_con_nulos(tmp_path):
+    ruta = tmp_path / 'propiedades_limpio.arrow'
+    original = pd.DataFrame({
+        'Provincia': ['madrid', 'madrid', 'barcelona'], 'Venta/Alquiler': ['venta', 'venta', 'alquiler'],
+        'Precio': [16_777_217, np.nan, 1_250], 'Superficie Útil': [80, np.nan, 50],
+        'Habitaciones': [3, None, 2], 'Baños': [1, 2, 1], 'Planta': [1.5, np.nan, 2],
+        'Enlace': ['u0', 'u1', 'u2'],
+    })
+
+    escribir_snapshot(original, ruta)
+    df = leer_snapshot(ruta)
+
+    assert list(df.columns) == [columna.lower() for columna in original.columns]
+    assert df['precio'].dtype == pd.Int32Dtype()
+    assert df['superficie útil'].dtype == pd.Int8Dtype()
+    assert df['habitaciones'].dtype == pd.Int8Dtype()
+    assert df['baños'].dtype == np.int8
+    # Con decimales no es una cifra entera: se conserva en float64
+    assert df['planta'].dtype == np.float64
+    # 16.777.217 no cabe exacto en un float32
+    assert df['precio'].tolist()[0] == 16_777_217
+    assert df['precio'].isna().tolist() == [False, True, False]
+
+    datos = preparar_dataset(df)
+    assert datos.array('precio').dtype == np.float64
+    assert np.isnan(datos.array('precio')[1])
+    assert datos.array('precio por m²').tolist() == [16_777_217 / 80, 0.0, 25.0]
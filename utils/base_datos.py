@@ -0,0 +1,235 @@
+"""Esquema y carga masiva de la tabla `propiedades_limpio`.
+
+Sustituye a `df.to_sql('propiedades_limpio', if_exists='replace')` del notebook,
+que borraba la tabla y obligaba a volver a aplicar a mano las claves foráneas,
+los ENUM y los tipos del script SQL. Aquí el esquema (con sus índices) se crea
+una sola vez y cada carga hace upsert por `Enlace` en bloques grandes, de modo
+que la tabla sigue disponible para el dashboard mientras se actualiza.
+
+Si la tabla ya existe tal como la dejó el notebook (sin clave única por `Enlace`
+ni índices), la primera carga la migra: la renombra, crea la tabla con el
+esquema completo, copia sus filas con el mismo upsert y borra la antigua.
+
+Funciona con MySQL (la base de datos del proyecto) y con SQLite para pruebas locales.
+
+Uso:
+    python -m utils.base_datos propiedades_limpio.parquet              # MySQL del .env
+    python -m utils.base_datos propiedades_limpio.parquet --url sqlite:///propiedades.db
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+from sqlalchemy import (
+    Column, DateTime, Enum, Float, ForeignKey, Index, Integer, MetaData, SmallInteger,
+    String, Table, Text, create_engine, inspect, select, text
+)
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.engine import URL
+
+from .entorno import cargar_entorno
+from .limpieza import convertir_fecha
+
+metadata = MetaData()
+
+provincias = Table(
+    'provincias', metadata,
+    Column('Provincia', String(100), primary_key=True),
+)
+
+tipo_transaccion = Table(
+    'tipo_transaccion', metadata,
+    Column('tipo', Enum('venta', 'alquiler', name='tipo_transaccion'), primary_key=True),
+)
+
+certificado_energetico = Table(
+    'certificado_energetico', metadata,
+    Column('Certificado', String(50), primary_key=True),
+)
+
+# Cada columna lleva una clave ASCII (key=) para los parámetros de las sentencias
+propiedades_limpio = Table(
+    'propiedades_limpio', metadata,
+    Column('ID', String(36), key='id', primary_key=True),
+    Column('Timestamp', DateTime, key='timestamp'),
+    Column('Provincia', String(100), ForeignKey('provincias.Provincia'), key='provincia'),
+    Column('Título', Text, key='titulo'),
+    Column('Precio', Integer, key='precio'),
+    Column('Latitud', Float(precision=53), key='latitud'),
+    Column('Longitud', Float(precision=53), key='longitud'),
+    Column('Superficie Construida', Integer, key='superficie_construida'),
+    Column('Superficie Útil', Integer, key='superficie_util'),
+    Column('Habitaciones', SmallInteger, key='habitaciones'),
+    Column('Baños', SmallInteger, key='banos'),
+    Column('Planta', Integer, key='planta'),
+    Column('Certificado Energético', String(50), ForeignKey('certificado_energetico.Certificado'),
+           key='certificado'),
+    Column('Número de Fotos', SmallInteger, key='fotos'),
+    Column('Enlace', String(255), key='enlace', unique=True, nullable=False),
+    Column('venta/alquiler', Enum('venta', 'alquiler', name='tipo_transaccion'),
+           ForeignKey('tipo_transaccion.tipo'), key='tipo'),
+    # Los filtros de la app: provincia + tipo + rango de precio, y tipo + rango de precio
+    Index('ix_propiedades_provincia_tipo_precio', 'provincia', 'tipo', 'precio'),
+    Index('ix_propiedades_tipo_precio', 'tipo', 'precio'),
+    Index('ix_propiedades_precio', 'precio'),
+)
+
+# Nombre de columna (como en el CSV limpio) -> clave de la columna en la tabla
+CLAVES = {columna.name: columna.key for columna in propiedades_limpio.columns}
+
+# Nombre temporal de la tabla creada por to_sql mientras se migra
+TABLA_ANTERIOR = 'propiedades_limpio_anterior'
+
+
+# Motor SQLAlchemy con los datos de conexión del .env (DB_HOST, DB_USER, ...).
+# DB_URL, si está definida, tiene prioridad (p. ej. sqlite:///propiedades.db para pruebas).
+def motor_desde_entorno(**opciones):
+    cargar_entorno()
+    if os.getenv('DB_URL'):
+        return create_engine(os.getenv('DB_URL'), **opciones)
+    url = URL.create(
+        'mysql+pymysql',
+        username=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=int(os.getenv('DB_PORT', 3306)),
+        database=os.getenv('DB_NAME'),
+        query={'charset': 'utf8mb4'},
+    )
+    return create_engine(url, **opciones)
+
+
+# ¿Tiene la tabla existente la clave única por Enlace de la que depende el upsert?
+def _enlace_unico(inspector):
+    unicas = [restriccion['column_names'] for restriccion in inspector.get_unique_constraints(propiedades_limpio.name)]
+    unicas += [indice['column_names'] for indice in inspector.get_indexes(propiedades_limpio.name) if indice['unique']]
+    return ['Enlace'] in unicas
+
+
+# Crea las tablas, índices y valores fijos que falten. Una tabla propiedades_limpio sin
+# clave única por Enlace (la de to_sql del notebook) se migra conservando sus filas.
+def crear_esquema(engine, filas_por_bloque=50_000):
+    inspector = inspect(engine)
+    if inspector.has_table(propiedades_limpio.name) and not _enlace_unico(inspector):
+        with engine.begin() as conexion:
+            conexion.execute(text(f"ALTER TABLE {propiedades_limpio.name} RENAME TO {TABLA_ANTERIOR}"))
+    metadata.create_all(engine)
+
+    # create_all no añade índices a una tabla que ya existía
+    existentes = {indice['name'] for indice in inspect(engine).get_indexes(propiedades_limpio.name)}
+    for indice in propiedades_limpio.indexes:
+        if indice.name not in existentes:
+            indice.create(engine)
+
+    with engine.begin() as conexion:
+        _insertar_ignorando(conexion, tipo_transaccion, [{'tipo': 'venta'}, {'tipo': 'alquiler'}])
+    # También retoma una migración que se interrumpió a medias
+    if inspect(engine).has_table(TABLA_ANTERIOR):
+        _migrar_tabla_anterior(engine, filas_por_bloque)
+
+
+# Copia las filas de la tabla anterior con el upsert, por orden de Timestamp (de cada Enlace
+# queda la más reciente), y la borra. Los nombres de columna se comparan sin mayúsculas:
+# el script SQL del proyecto escribe 'Número de fotos'.
+def _migrar_tabla_anterior(engine, filas_por_bloque):
+    anterior = Table(TABLA_ANTERIOR, MetaData(), autoload_with=engine)
+    nombres = {nombre.lower(): nombre for nombre in CLAVES}
+    columnas = [columna.label(nombres[columna.name.lower()]) for columna in anterior.columns
+                if columna.name.lower() in nombres]
+    orden = [columna for columna in anterior.columns if columna.name.lower() == 'timestamp']
+    upsert = _sentencia_upsert(engine.dialect.name)
+    with engine.begin() as conexion:
+        for bloque in pd.read_sql(select(*columnas).order_by(*orden), conexion, chunksize=filas_por_bloque):
+            _insertar(conexion, upsert, _registros(bloque))
+    with engine.begin() as conexion:
+        conexion.execute(text(f"DROP TABLE {TABLA_ANTERIOR}"))
+
+
+# INSERT que ignora las filas ya existentes, en el dialecto de cada motor
+def _insertar_ignorando(conexion, tabla, filas):
+    if not filas:
+        return
+    if conexion.dialect.name == 'mysql':
+        sentencia = mysql.insert(tabla).prefix_with('IGNORE')
+    else:
+        sentencia = sqlite.insert(tabla).on_conflict_do_nothing()
+    conexion.execute(sentencia, filas)
+
+
+# INSERT ... ON DUPLICATE KEY UPDATE (MySQL) u ON CONFLICT DO UPDATE (SQLite) por Enlace.
+# El ID de un anuncio ya cargado se conserva.
+def _sentencia_upsert(dialecto):
+    actualizables = [c.key for c in propiedades_limpio.columns if c.key not in ('id', 'enlace')]
+    if dialecto == 'mysql':
+        sentencia = mysql.insert(propiedades_limpio)
+        return sentencia.on_duplicate_key_update({c: sentencia.inserted[c] for c in actualizables})
+    sentencia = sqlite.insert(propiedades_limpio)
+    return sentencia.on_conflict_do_update(
+        index_elements=[propiedades_limpio.c.enlace],
+        set_={c: sentencia.excluded[c] for c in actualizables},
+    )
+
+
+# Bloques del fichero limpio (Parquet de utils.limpieza o CSV separado por ';')
+def _bloques(ruta, filas_por_bloque):
+    if str(ruta).endswith('.parquet'):
+        for lote in pq.ParquetFile(ruta).iter_batches(batch_size=filas_por_bloque):
+            yield lote.to_pandas()
+    else:
+        yield from pd.read_csv(ruta, sep=';', chunksize=filas_por_bloque)
+
+
+# Filas de un bloque como diccionarios con las claves de la tabla (nulos como None)
+def _registros(bloque):
+    bloque = bloque.rename(columns=CLAVES)
+    bloque = bloque[[c for c in CLAVES.values() if c in bloque.columns]].dropna(subset=['enlace'])
+    if 'timestamp' in bloque and not pd.api.types.is_datetime64_any_dtype(bloque['timestamp']):
+        # Formato del scraper o día/mes/año de los CSV guardados desde Excel
+        bloque['timestamp'] = convertir_fecha(bloque['timestamp'])
+    return bloque.astype(object).where(bloque.notna(), None).to_dict('records')
+
+
+# Upsert de un bloque de registros
+def _insertar(conexion, upsert, registros):
+    if not registros:
+        return
+    # Primero los valores de las tablas de referencia, para respetar las claves foráneas
+    _insertar_ignorando(conexion, provincias, [
+        {'Provincia': p} for p in {r['provincia'] for r in registros if r.get('provincia')}
+    ])
+    _insertar_ignorando(conexion, certificado_energetico, [
+        {'Certificado': c} for c in {r['certificado'] for r in registros if r.get('certificado')}
+    ])
+    # executemany: pymysql lo convierte en INSERT multi-fila y SQLite lo ejecuta de forma nativa
+    conexion.execute(upsert, registros)
+
+
+# Carga (upsert por Enlace) el fichero limpio en bloques; cada bloque es una transacción
+def cargar(engine, ruta, filas_por_bloque=50_000):
+    crear_esquema(engine, filas_por_bloque)
+    upsert = _sentencia_upsert(engine.dialect.name)
+    filas = 0
+    for bloque in _bloques(ruta, filas_por_bloque):
+        registros = _registros(bloque)
+        if not registros:
+            continue
+        with engine.begin() as conexion:
+            _insertar(conexion, upsert, registros)
+        filas += len(registros)
+    return filas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Carga (upsert) el dataset limpio en la base de datos.")
+    parser.add_argument('fichero', help="Parquet de utils.limpieza o CSV limpio separado por ';'")
+    parser.add_argument('--url', help="URL SQLAlchemy (por defecto, la MySQL del .env)")
+    parser.add_argument('--filas-por-bloque', type=int, default=50_000)
+    args = parser.parse_args()
+
+    engine = create_engine(args.url) if args.url else motor_desde_entorno()
+    inicio = time.perf_counter()
+    filas = cargar(engine, args.fichero, args.filas_por_bloque)
+    duracion = time.perf_counter() - inicio
+    print(f"{filas} filas cargadas en 'propiedades_limpio' en {duracion:.1f} s ({filas / duracion:,.0f} filas/s)")
@@ -0,0 +1,93 @@
+"""Búsqueda por palabras (y prefijos) en el título de los inmuebles.
+
+Cada partición del índice (provincia, venta/alquiler) tiene su propio índice
+invertido: un vocabulario ordenado de palabras y, para cada palabra, las filas de
+la partición que la contienen. Como las filas de la partición están ordenadas por
+precio, el rango del slider se aplica con los mismos cortes que `Particion` y los
+resultados salen ya ordenados por precio. Una búsqueda solo toca las listas de las
+palabras que encajan, sin recorrer los títulos.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Carácter mayor que cualquier letra: [prefijo, prefijo + _FIN) son las palabras con ese prefijo
+_FIN = '\uffff'
+
+
+# Palabras normalizadas de una serie de textos: minúsculas, sin tildes, solo letras y cifras
+def _palabras(textos):
+    return (textos.astype('string')
+                  .str.normalize('NFKD')
+                  .str.encode('ascii', errors='ignore')
+                  .str.decode('ascii')
+                  .str.lower()
+                  .str.findall(r'[a-z0-9]+'))
+
+
+@dataclass(frozen=True, eq=False)
+class IndiceTitulos:
+    """Índice invertido de los títulos de una partición."""
+    vocabulario: np.ndarray
+    inicios: np.ndarray
+    filas: np.ndarray
+
+    @classmethod
+    def crear(cls, titulos):
+        palabras = _palabras(pd.Series(titulos)).explode().dropna()
+        if palabras.empty:
+            return cls(np.empty(0, dtype=object), np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int64))
+        filas = palabras.index.to_numpy(dtype=np.int64)
+        codigos, vocabulario = pd.factorize(palabras.to_numpy(dtype=object), sort=True)
+        # Ordenado por (palabra, fila): las filas de palabras consecutivas quedan contiguas
+        orden = np.lexsort((filas, codigos))
+        codigos, filas = codigos[orden], filas[orden]
+        unicas = np.ones(len(filas), dtype=bool)
+        unicas[1:] = (codigos[1:] != codigos[:-1]) | (filas[1:] != filas[:-1])
+        codigos, filas = codigos[unicas], filas[unicas]
+        inicios = np.searchsorted(codigos, np.arange(len(vocabulario) + 1))
+        return cls(np.asarray(vocabulario, dtype=object), inicios, filas)
+
+    # Filas (de la partición) con alguna palabra que empieza por el prefijo
+    def _con_prefijo(self, prefijo):
+        desde = np.searchsorted(self.vocabulario, prefijo, side='left')
+        hasta = np.searchsorted(self.vocabulario, prefijo + _FIN, side='left')
+        return np.unique(self.filas[self.inicios[desde]:self.inicios[hasta]])
+
+    # Filas que contienen todas las palabras buscadas (cada una como prefijo), en orden
+    def buscar(self, texto):
+        resultado = None
+        for prefijo in _palabras(pd.Series([texto])).iloc[0]:
+            filas = self._con_prefijo(prefijo)
+            resultado = filas if resultado is None else np.intersect1d(resultado, filas, assume_unique=True)
+            if len(resultado) == 0:
+                break
+        return resultado
+
+
+class BuscadorTitulos:
+    """Índices de títulos de un DatasetPreparado, construidos por partición al usarse."""
+
+    def __init__(self, dataset):
+        self._dataset = dataset
+        self._indices = {}
+
+    def indice(self, provincia, tipo):
+        clave = (provincia, tipo)
+        if clave not in self._indices:
+            particion = self._dataset.indice.particion(provincia, tipo)
+            titulos = self._dataset.df['título'].array.take(particion.posiciones)
+            self._indices[clave] = IndiceTitulos.crear(titulos)
+        return self._indices[clave]
+
+    # Posiciones de las primeras `limite` filas (por precio) del rango cuyo título encaja con el texto
+    def buscar(self, provincia, tipo, texto, minimo=None, maximo=None, limite=50):
+        particion = self._dataset.indice.particion(provincia, tipo)
+        inicio, fin = particion.cortes(minimo, maximo)
+        filas = self.indice(provincia, tipo).buscar(texto or '')
+        if filas is None:
+            # Sin texto: las primeras filas del rango
+            return particion.posiciones[inicio:min(fin, inicio + limite)]
+        desde, hasta = np.searchsorted(filas, [inicio, fin])
+        return particion.posiciones[filas[desde:min(hasta, desde + limite)]]
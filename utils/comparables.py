@@ -0,0 +1,186 @@
+"""Estimación de precios por comparables: los inmuebles más parecidos y cercanos.
+
+Cada partición (provincia, venta/alquiler) se indexa en un árbol k-d sobre la
+posición (en km) y la superficie útil, las habitaciones y los baños escalados,
+de modo que 20 m², una habitación o un baño de diferencia pesan como 1 km de
+distancia. Un lote de candidatos se resuelve con una consulta al árbol por
+partición; la estimación es la mediana del precio de los k vecinos, con el
+intervalo intercuartílico como banda de confianza.
+
+Uso:
+    python -m utils.comparables candidatos.csv --datos propiedades_limpio.arrow --salida estimaciones.csv
+"""
+import argparse
+import time
+import warnings
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .indice import suelo_precio
+from .limpieza import detectar_separador
+from .snapshot import leer_datos
+
+KM_POR_GRADO = 111.32
+
+# Diferencia de cada característica que equivale a 1 km de distancia
+ESCALAS = {'superficie útil': 20.0, 'habitaciones': 1.0, 'baños': 1.0}
+
+# Columnas que necesita cada candidato
+COLUMNAS_CANDIDATO = ['provincia', 'venta/alquiler', 'latitud', 'longitud', *ESCALAS]
+
+COLUMNAS_ESTIMACION = [
+    'comparables', 'distancia_media_km', 'precio_estimado', 'precio_p25', 'precio_p75',
+    'precio_m2_estimado', 'precio_segun_m2'
+]
+
+# Vecinos por defecto de cada estimación
+K_COMPARABLES = 10
+
+
+def _numeros(serie):
+    return pd.to_numeric(serie, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+
+# Candidatos con los nombres y formatos del dataset preparado ('A Coruña', 'Alquiler')
+def normalizar_candidatos(df):
+    df = df.copy()
+    df.columns = df.columns.str.strip().str.lower()
+    faltan = [columna for columna in COLUMNAS_CANDIDATO if columna not in df.columns]
+    if faltan:
+        raise ValueError(f"Faltan columnas en los candidatos: {', '.join(faltan)}")
+    df['provincia'] = df['provincia'].astype(str).str.replace('_', ' ').str.title()
+    df['venta/alquiler'] = df['venta/alquiler'].astype(str).str.capitalize()
+    for columna in COLUMNAS_CANDIDATO[2:]:
+        df[columna] = _numeros(df[columna])
+    return df.reset_index(drop=True)
+
+
+# Matriz de características: posición en km (proyección local) y atributos escalados
+def _matriz(lat, lon, atributos, lat_ref):
+    return np.column_stack([
+        lat * KM_POR_GRADO,
+        lon * KM_POR_GRADO * np.cos(np.radians(lat_ref)),
+        atributos,
+    ])
+
+
+@dataclass(frozen=True, eq=False)
+class ArbolComparables:
+    """Árbol k-d de una partición y posiciones (en el dataset) de sus filas."""
+    arbol: object
+    posiciones: np.ndarray
+    lat_ref: float
+
+
+class EstimadorComparables:
+    """Árboles k-d de un DatasetPreparado, construidos por partición al usarse."""
+
+    def __init__(self, dataset):
+        self._dataset = dataset
+        self._arboles = {}
+        self._lat = dataset.espacial.lat
+        self._lon = dataset.espacial.lon
+        self._atributos = np.column_stack([
+            _numeros(dataset.df[columna]) / escala for columna, escala in ESCALAS.items()
+        ])
+        self._precios = dataset.array('precio').astype('float64', copy=False)
+        self._precios_m2 = dataset.array('precio por m²').astype('float64', copy=False)
+
+    # Árbol de una partición con las filas que tienen todas las características (None si no hay)
+    def arbol(self, provincia, tipo):
+        clave = (provincia, tipo)
+        if clave not in self._arboles:
+            from scipy.spatial import cKDTree
+
+            posiciones = self._dataset.indice.particion(provincia, tipo).rango(suelo_precio(tipo))
+            completas = (np.isfinite(self._lat[posiciones]) & np.isfinite(self._lon[posiciones])
+                         & np.isfinite(self._atributos[posiciones]).all(axis=1))
+            posiciones = posiciones[completas]
+            if len(posiciones) == 0:
+                self._arboles[clave] = None
+            else:
+                lat_ref = float(self._lat[posiciones].mean())
+                matriz = _matriz(self._lat[posiciones], self._lon[posiciones], self._atributos[posiciones], lat_ref)
+                self._arboles[clave] = ArbolComparables(cKDTree(matriz), posiciones, lat_ref)
+        return self._arboles[clave]
+
+    # Distancias y posiciones de los k vecinos de cada candidato de una partición
+    # (posición -1 y distancia infinita donde no hay vecino)
+    def vecinos(self, provincia, tipo, candidatos, k=K_COMPARABLES):
+        distancias = np.full((len(candidatos), k), np.inf)
+        posiciones = np.full((len(candidatos), k), -1, dtype=np.intp)
+        arbol = self.arbol(provincia, tipo)
+        atributos = np.column_stack([candidatos[columna].to_numpy() / escala for columna, escala in ESCALAS.items()])
+        lat, lon = candidatos['latitud'].to_numpy(), candidatos['longitud'].to_numpy()
+        validos = np.isfinite(lat) & np.isfinite(lon) & np.isfinite(atributos).all(axis=1)
+        if arbol is None or not validos.any():
+            return distancias, posiciones
+
+        k_real = min(k, len(arbol.posiciones))
+        matriz = _matriz(lat[validos], lon[validos], atributos[validos], arbol.lat_ref)
+        d, i = arbol.arbol.query(matriz, k=k_real, workers=-1)
+        distancias[validos, :k_real] = d.reshape(-1, k_real)
+        posiciones[validos, :k_real] = arbol.posiciones[i.reshape(-1, k_real)]
+        return distancias, posiciones
+
+    # Estimación para un lote de candidatos (ya normalizados), una consulta por partición.
+    # Devuelve también las posiciones de los vecinos de cada candidato (como `vecinos`).
+    def estimar(self, candidatos, k=K_COMPARABLES):
+        distancias = np.full((len(candidatos), k), np.inf)
+        posiciones = np.full((len(candidatos), k), -1, dtype=np.intp)
+        for (provincia, tipo), grupo in candidatos.groupby(['provincia', 'venta/alquiler'], sort=False):
+            filas = grupo.index.to_numpy()
+            distancias[filas], posiciones[filas] = self.vecinos(provincia, tipo, grupo, k)
+
+        hay = posiciones >= 0
+        precios = np.where(hay, self._precios[posiciones], np.nan)
+        precios_m2 = np.where(hay, self._precios_m2[posiciones], np.nan)
+        # Los "precio por m²" iguales a 0 son inmuebles sin superficie útil
+        precios_m2 = np.where(np.isfinite(precios_m2) & (precios_m2 > 0), precios_m2, np.nan)
+        with warnings.catch_warnings():
+            # Candidatos sin comparables: sus estimaciones quedan vacías
+            warnings.simplefilter('ignore', RuntimeWarning)
+            p25, mediana, p75 = np.nanpercentile(precios, [25, 50, 75], axis=1)
+            precio_m2 = np.nanmedian(precios_m2, axis=1)
+            distancia_media = np.nanmean(np.where(hay, distancias, np.nan), axis=1)
+        estimaciones = pd.DataFrame({
+            'comparables': hay.sum(axis=1),
+            'distancia_media_km': distancia_media,
+            'precio_estimado': mediana,
+            'precio_p25': p25,
+            'precio_p75': p75,
+            'precio_m2_estimado': precio_m2,
+            'precio_segun_m2': precio_m2 * candidatos['superficie útil'].to_numpy(),
+        }, index=candidatos.index, columns=COLUMNAS_ESTIMACION)
+        return estimaciones, posiciones
+
+
+# Añade a cada candidato su estimación
+def estimar_csv(dataset, candidatos, k=K_COMPARABLES):
+    candidatos = normalizar_candidatos(candidatos)
+    estimaciones, _ = dataset.comparables.estimar(candidatos, k)
+    return pd.concat([candidatos, estimaciones], axis=1)
+
+
+if __name__ == '__main__':
+    # Importación local: utils.dataset importa este módulo
+    from .dataset import preparar_dataset
+
+    parser = argparse.ArgumentParser(description="Estima el precio de un CSV de candidatos por comparables.")
+    parser.add_argument('candidatos', help="CSV con " + ", ".join(COLUMNAS_CANDIDATO))
+    parser.add_argument('--datos', required=True, help="Snapshot .arrow, Parquet o CSV limpio (';')")
+    parser.add_argument('--salida', required=True, help="CSV de salida con las estimaciones")
+    parser.add_argument('--k', type=int, default=K_COMPARABLES, help="Comparables por candidato")
+    args = parser.parse_args()
+
+    dataset = preparar_dataset(leer_datos(args.datos))
+    candidatos = pd.read_csv(args.candidatos, sep=detectar_separador(args.candidatos))
+
+    inicio = time.perf_counter()
+    resultado = estimar_csv(dataset, candidatos, args.k)
+    duracion = time.perf_counter() - inicio
+    resultado.to_csv(args.salida, index=False)
+    print(f"{len(resultado)} candidatos estimados en {duracion * 1000:.0f} ms "
+          f"(incluye construir los árboles) -> {args.salida}")
@@ -0,0 +1,158 @@
+"""Dataset preparado compartido por todos los procesos de la app en una máquina.
+
+Con varios servidores de Streamlit detrás de un balanceador, cada proceso cargaba
+y preparaba su propia copia del DataFrame. Aquí el dataset ya preparado
+(`preparar_dataset`) se publica una sola vez como fichero Arrow IPC sin comprimir
+en un directorio de memoria compartida (por defecto /dev/shm/inmuebles) y cada
+proceso lo abre con memory-map: las columnas numéricas y de texto son vistas
+sobre las mismas páginas de memoria, no copias. Los índices derivados (partición,
+cubo, rejilla...) siguen construyéndose en cada proceso, pero son mucho menores.
+
+El fichero `ACTUAL` del directorio apunta a la versión vigente. Publicar una
+versión nueva (p. ej. tras un crawl) escribe otro fichero y cambia el puntero de
+forma atómica; la app lo detecta en la siguiente ejecución y cambia de versión
+sin reiniciarse. Si el fichero de datos de la app se regenera después de la
+última publicación, el primer proceso que lo nota lo vuelve a publicar. Las
+versiones antiguas se borran del directorio, pero siguen mapeadas (y válidas)
+mientras alguna sesión las esté usando.
+
+Uso:
+    python -m utils.compartido propiedades_limpio.arrow --directorio /dev/shm/inmuebles
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from .dataset import DatasetPreparado, preparar_dataset
+from .snapshot import leer_datos, leer_snapshot, version_fichero
+
+DIRECTORIO_POR_DEFECTO = '/dev/shm/inmuebles'
+
+# Fichero con la versión vigente (JSON) y cerrojo para publicar de una en una
+PUNTERO = 'ACTUAL'
+CERROJO = '.cerrojo'
+
+# Versiones que se dejan en el directorio (la vigente y la anterior)
+VERSIONES_CONSERVADAS = 2
+
+
+# Columna como array Arrow. Las numéricas se pasan tal cual: los NaN quedan como
+# valores (no como nulos) y al leerlas pandas usa el buffer sin copiarlo.
+def _columna_arrow(serie):
+    if isinstance(serie.dtype, np.dtype) and serie.dtype.kind in 'biufM':
+        return pa.array(serie.to_numpy())
+    try:
+        return pa.array(serie, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columnas de objetos con tipos mezclados (números y textos)
+        return pa.array(serie.astype('string'), from_pandas=True)
+
+
+def _tabla(df):
+    return pa.Table.from_arrays([_columna_arrow(df[columna]) for columna in df.columns],
+                                names=list(df.columns))
+
+
+def _escribir_atomico(ruta, texto):
+    temporal = f"{ruta}.tmp"
+    Path(temporal).write_text(texto, encoding='utf-8')
+    os.replace(temporal, ruta)
+
+
+# Contenido del puntero: fichero vigente, origen, filas y momento de publicación (None si no hay)
+def leer_puntero(directorio=DIRECTORIO_POR_DEFECTO):
+    try:
+        return json.loads(Path(directorio, PUNTERO).read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def _cerrojo(directorio):
+    # Solo en sistemas POSIX, igual que /dev/shm
+    import fcntl
+
+    with open(Path(directorio, CERROJO), 'w') as fichero:
+        fcntl.flock(fichero, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fichero, fcntl.LOCK_UN)
+
+
+# Borra las versiones más antiguas (los procesos que aún las tienen mapeadas no se ven afectados)
+def _limpiar(directorio, vigente, conservar=VERSIONES_CONSERVADAS):
+    versiones = sorted(Path(directorio).glob('dataset-*.arrow'), key=lambda ruta: ruta.stat().st_mtime, reverse=True)
+    for ruta in versiones[conservar:]:
+        if ruta.name != vigente:
+            ruta.unlink(missing_ok=True)
+
+
+# Escribe el dataset preparado como versión nueva y mueve el puntero a ella.
+# El origen que se anota en el puntero es la versión del dataset (fichero y fecha de los datos).
+def publicar(dataset, directorio=DIRECTORIO_POR_DEFECTO, conservar=VERSIONES_CONSERVADAS):
+    os.makedirs(directorio, exist_ok=True)
+    # Nombre único aunque se publique dos veces en el mismo segundo: la caché de la app usa el nombre como versión
+    fichero = f"dataset-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.arrow"
+    temporal = Path(directorio, f".{fichero}.tmp")
+    # Sin compresión: es lo que permite abrirlo con memory-map sin copiar
+    feather.write_feather(_tabla(dataset.df), temporal, compression='uncompressed')
+    os.replace(temporal, Path(directorio, fichero))
+
+    puntero = {'fichero': fichero, 'origen': dataset.version, 'filas': len(dataset), 'publicado': time.time()}
+    _escribir_atomico(Path(directorio, PUNTERO), json.dumps(puntero, ensure_ascii=False))
+    _limpiar(directorio, fichero, conservar)
+    return puntero
+
+
+# Hay que publicar si no hay ninguna versión o si el fichero de origen es otro (o ha
+# cambiado) y se ha modificado después de la última publicación
+def _desfasado(puntero, ruta_origen):
+    if puntero is None:
+        return True
+    if ruta_origen is None:
+        return False
+    return (puntero['origen'] != version_fichero(ruta_origen)
+            and os.path.getmtime(ruta_origen) > puntero['publicado'])
+
+
+# Fichero vigente del directorio. Si no hay ninguno o está desfasado respecto a
+# `ruta_origen`, el primer proceso que llega llama a `cargar` (que devuelve un
+# DatasetPreparado con la versión del fichero) y lo publica; el resto espera al
+# cerrojo y usa esa misma versión.
+def version_compartida(directorio, cargar, ruta_origen=None):
+    puntero = leer_puntero(directorio)
+    if _desfasado(puntero, ruta_origen):
+        os.makedirs(directorio, exist_ok=True)
+        with _cerrojo(directorio):
+            puntero = leer_puntero(directorio)
+            if _desfasado(puntero, ruta_origen):
+                puntero = publicar(cargar(), directorio)
+    return puntero['fichero']
+
+
+# Dataset publicado con memory-map. No pasa por preparar_dataset: ya está preparado
+# y así no se copia ninguna columna.
+def abrir_publicado(directorio, fichero):
+    return DatasetPreparado(leer_snapshot(Path(directorio, fichero)), fichero)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Publica el dataset preparado en memoria compartida.")
+    parser.add_argument('origen', help="Snapshot .arrow, Parquet o CSV limpio (';')")
+    parser.add_argument('--directorio', default=DIRECTORIO_POR_DEFECTO)
+    parser.add_argument('--conservar', type=int, default=VERSIONES_CONSERVADAS, help="Versiones que se dejan en el directorio")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    puntero = publicar(preparar_dataset(leer_datos(args.origen), version_fichero(args.origen)), args.directorio, args.conservar)
+    print(f"{puntero['filas']} filas publicadas en {Path(args.directorio, puntero['fichero'])} "
+          f"({time.perf_counter() - inicio:.1f} s)")
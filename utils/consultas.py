@@ -0,0 +1,104 @@
+"""Consultas de la app contra la tabla `propiedades_limpio` de la base de datos.
+
+Alternativa al dataset en memoria: los filtros de provincia, tipo de transacción
+y rango de precio, el recuento y precio medio del mapa y el precio medio por
+habitaciones se resuelven en SQL con parámetros, de modo que cada proceso de la
+app solo recibe las filas (o los agregados) que va a mostrar.
+
+Los valores se devuelven con el mismo formato que el dataset preparado
+('A Coruña', 'Alquiler') y los filtros aceptan ese formato.
+"""
+import pandas as pd
+from sqlalchemy import and_, func, select
+
+from .base_datos import propiedades_limpio
+from .provincias import provincia_centroides
+
+_t = propiedades_limpio.c
+
+# Nombre de columna tal como lo usa la app ('superficie útil') -> columna de la tabla
+_COLUMNAS = {columna.name.lower(): columna for columna in propiedades_limpio.columns}
+
+# Columnas de filtro y cómo se muestran en la app
+_FORMATO = {
+    'provincia': (_t.provincia, str.title),
+    'venta/alquiler': (_t.tipo, str.capitalize),
+}
+
+
+class ConsultasBD:
+    """Consultas parametrizadas sobre un motor SQLAlchemy (MySQL o SQLite)."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def _leer(self, consulta):
+        with self.engine.connect() as conexion:
+            return pd.read_sql(consulta, conexion)
+
+    def _escalares(self, consulta):
+        with self.engine.connect() as conexion:
+            return conexion.execute(consulta).all()
+
+    # Condición WHERE de los filtros de la app (los valores van como parámetros)
+    @staticmethod
+    def _filtro(tipo=None, provincias=None, minimo=None, maximo=None):
+        condiciones = [_t.precio.is_not(None)]
+        if tipo is not None:
+            condiciones.append(_t.tipo == tipo.lower())
+        if provincias is not None:
+            condiciones.append(_t.provincia.in_([provincia.lower() for provincia in provincias]))
+        if minimo is not None:
+            condiciones.append(_t.precio >= minimo)
+        if maximo is not None:
+            condiciones.append(_t.precio <= maximo)
+        return and_(*condiciones)
+
+    # Valores distintos de 'provincia' o 'venta/alquiler', ya formateados
+    def valores(self, columna):
+        columna_bd, formato = _FORMATO[columna]
+        filas = self._escalares(select(columna_bd).distinct().where(columna_bd.is_not(None)).order_by(columna_bd))
+        return [formato(valor) for valor, in filas]
+
+    # Provincias con algún inmueble del tipo indicado a partir del precio mínimo
+    def provincias(self, tipo, minimo=None):
+        consulta = (select(_t.provincia).distinct()
+                    .where(self._filtro(tipo, minimo=minimo))
+                    .order_by(_t.provincia))
+        return [provincia.title() for provincia, in self._escalares(consulta)]
+
+    # Precio mínimo y máximo de una provincia y tipo (None si no hay inmuebles)
+    def limites(self, provincia, tipo, minimo=None):
+        consulta = select(func.min(_t.precio), func.max(_t.precio)).where(self._filtro(tipo, [provincia], minimo))
+        precio_min, precio_max = self._escalares(consulta)[0]
+        return None if precio_min is None else (precio_min, precio_max)
+
+    # Recuento y precio medio de la provincia en el rango, con su centroide (como CuboProvincias.mapa)
+    def mapa(self, provincia, tipo, minimo=None, maximo=None):
+        consulta = (select(func.count().label('propiedades'), func.avg(_t.precio).label('precio_medio'))
+                    .where(self._filtro(tipo, [provincia], minimo, maximo)))
+        propiedades, precio_medio = self._escalares(consulta)[0]
+        lat, lon = provincia_centroides.get(provincia.lower(), (None, None))
+        filas = [{
+            'provincia': provincia, 'propiedades': propiedades,
+            'precio_medio': float(precio_medio), 'lat': lat, 'lon': lon,
+        }] if propiedades else []
+        return pd.DataFrame(filas, columns=['provincia', 'propiedades', 'precio_medio', 'lat', 'lon'])
+
+    # Precio medio por número de habitaciones de una provincia y tipo
+    def precio_medio_por_habitaciones(self, provincia, tipo, minimo=None):
+        consulta = (select(_t.habitaciones.label('habitaciones'), func.avg(_t.precio).label('precio'))
+                    .where(self._filtro(tipo, [provincia], minimo), _t.habitaciones.is_not(None))
+                    .group_by(_t.habitaciones)
+                    .order_by(_t.habitaciones))
+        return self._leer(consulta)
+
+    # Filas filtradas con las columnas indicadas (todas si no se indican), con los nombres
+    # de columna originales para pasarlas por preparar_dataset
+    def inmuebles(self, tipo, provincias, minimo=None, maximo=None, columnas=None):
+        nombres = list(_COLUMNAS) if columnas is None else ['provincia', 'venta/alquiler', 'precio', *columnas]
+        seleccion = [_COLUMNAS[nombre] for nombre in dict.fromkeys(nombres)]
+        consulta = select(*[columna.label(columna.name) for columna in seleccion]).where(
+            self._filtro(tipo, provincias, minimo, maximo)
+        )
+        return self._leer(consulta)
@@ -0,0 +1,213 @@
+"""Dataset preparado y vistas ligeras sobre él.
+
+Toda la normalización (nombres de columnas, provincias, tipo de transacción y
+precio por m²) se hace una sola vez por versión de los datos. El DataFrame
+resultante se comparte entre sesiones y no se modifica nunca: los filtros de
+cada página trabajan con `Vista`, que solo guarda posiciones de filas y las
+columnas derivadas propias de esa vista (z-score, tipo de dato...).
+
+Si una versión nueva de los datos es la anterior con anuncios añadidos al final,
+`heredar` amplía el índice y actualiza el cubo de la anterior en lugar de
+construirlos de nuevo.
+"""
+from dataclasses import dataclass, field
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from .buscador import BuscadorTitulos
+from .comparables import EstimadorComparables
+from .espacial import IndiceEspacial
+from .estadisticas import CuboProvincias
+from .indice import IndiceParticiones
+from .limpieza import reparar_coordenada
+from .provincias import provincia_centroides
+
+
+# Función para aplicar una transformación de texto sobre las categorías (no sobre cada fila)
+def _normalizar_categorias(serie, transformar):
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype('category')
+    categorias = transformar(serie.cat.categories.to_series().astype(str))
+    # Dos categorías pueden coincidir tras normalizar ('MADRID' y 'madrid')
+    codigos_nuevos, unicas = pd.factorize(categorias)
+    codigos = serie.cat.codes.to_numpy()
+    codigos = np.where(codigos >= 0, codigos_nuevos[codigos], -1)
+    return pd.Series(pd.Categorical.from_codes(codigos, categories=unicas),
+                     index=serie.index, name=serie.name)
+
+
+# Función para normalizar el DataFrame leído del CSV o del snapshot. La copia es superficial:
+# las columnas que no cambian comparten memoria con `df` (o con el snapshot mapeado) y las
+# normalizadas se asignan como columnas nuevas, sin modificar el original.
+def preparar_dataset(df, version=''):
+    df = df.copy(deep=False)
+    df.columns = df.columns.str.strip().str.lower()
+
+    # Capitalizar nombres de provincias y tipo transacción
+    df['provincia'] = _normalizar_categorias(df['provincia'], lambda s: s.str.title())
+    df['venta/alquiler'] = _normalizar_categorias(df['venta/alquiler'], lambda s: s.str.capitalize())
+
+    # Coordenadas en texto (CSV pasado por Excel): se reparan con el centroide de la provincia
+    for columna, eje in (('latitud', 0), ('longitud', 1)):
+        if columna in df.columns and not pd.api.types.is_numeric_dtype(df[columna]):
+            centros = df['provincia'].cat.categories.str.lower().map(
+                lambda provincia: provincia_centroides.get(provincia, (np.nan, np.nan))[eje]
+            ).to_numpy(dtype='float64')
+            codigos = df['provincia'].cat.codes.to_numpy()
+            referencia = np.where(codigos >= 0, centros[codigos], np.nan)
+            df[columna] = reparar_coordenada(df[columna].astype('string'), referencia)
+
+    # Crear la columna 'precio por m²' si no existe
+    if 'precio por m²' not in df.columns:
+        precio_m2 = (df['precio'] / df['superficie útil']).to_numpy(dtype='float64', na_value=np.nan)
+        df['precio por m²'] = np.where(np.isnan(precio_m2), 0, precio_m2)
+
+    return DatasetPreparado(df, version)
+
+
+@dataclass(frozen=True, eq=False)
+class DatasetPreparado:
+    """DataFrame normalizado y compartido. No debe modificarse tras crearse."""
+    df: pd.DataFrame
+    version: str = ''
+    _arrays: dict = field(default_factory=dict, repr=False, compare=False)
+    _unicos: dict = field(default_factory=dict, repr=False, compare=False)
+
+    def __len__(self):
+        return len(self.df)
+
+    # Array numpy de una columna (sin copia para columnas numéricas). Los enteros
+    # con nulos del snapshot se devuelven como float64 con NaN en los huecos.
+    def array(self, columna):
+        if columna not in self._arrays:
+            serie = self.df[columna]
+            if isinstance(serie.dtype, pd.api.extensions.ExtensionDtype) and serie.dtype.kind in 'iuf':
+                self._arrays[columna] = serie.to_numpy(dtype='float64', na_value=np.nan)
+            else:
+                self._arrays[columna] = serie.to_numpy()
+        return self._arrays[columna]
+
+    # Valores distintos de una columna en orden de aparición
+    def valores_unicos(self, columna):
+        if columna not in self._unicos:
+            self._unicos[columna] = list(self.df[columna].unique())
+        return self._unicos[columna]
+
+    # Índice por (provincia, venta/alquiler), construido la primera vez que se usa
+    @cached_property
+    def indice(self):
+        return IndiceParticiones(self)
+
+    # Cubo de estadísticas por provincia y tipo, construido sobre el índice
+    @cached_property
+    def cubo(self):
+        return CuboProvincias.desde_dataset(self)
+
+    # Índices de búsqueda por título, construidos por partición la primera vez que se usan
+    @cached_property
+    def buscador(self):
+        return BuscadorTitulos(self)
+
+    # Rejilla espacial de las coordenadas para el mapa, construida la primera vez que se usa
+    @cached_property
+    def espacial(self):
+        return IndiceEspacial(self)
+
+    # Árboles k-d de comparables, construidos por partición la primera vez que se usan
+    @cached_property
+    def comparables(self):
+        return EstimadorComparables(self)
+
+    # Reutiliza el índice y el cubo ya construidos de `anterior` si este dataset es `anterior`
+    # con filas añadidas al final (mismos enlaces y precios en las primeras filas)
+    def heredar(self, anterior):
+        if anterior is None or 'indice' not in vars(anterior) or not self._amplia(anterior):
+            return self
+        indice = anterior.indice.ampliar(self, len(anterior))
+        # cached_property guarda el valor en el __dict__ de la instancia (también si es frozen)
+        vars(self)['indice'] = indice
+        if 'cubo' in vars(anterior):
+            vars(self)['cubo'] = anterior.cubo.actualizar(self, anterior.indice)
+        return self
+
+    # ¿Empiezan las filas de este dataset por las de `anterior`?
+    def _amplia(self, anterior):
+        n = len(anterior)
+        if n == 0 or len(self) <= n or 'enlace' not in self.df.columns or 'enlace' not in anterior.df.columns:
+            return False
+        # Series.equals compara sin crear objetos Python (enlaces en cadenas Arrow) y da por
+        # iguales los nulos en la misma posición
+        enlaces = self.df['enlace'].iloc[:n].reset_index(drop=True)
+        return (enlaces.equals(anterior.df['enlace'].reset_index(drop=True))
+                and np.array_equal(self.array('precio')[:n].astype('float64'),
+                                   anterior.array('precio').astype('float64'), equal_nan=True))
+
+    def vista(self, posiciones=None):
+        if posiciones is None:
+            posiciones = np.arange(len(self.df))
+        return Vista(self, np.asarray(posiciones, dtype=np.intp))
+
+
+@dataclass(frozen=True, eq=False)
+class Vista:
+    """Subconjunto de filas de un DatasetPreparado más sus columnas derivadas."""
+    dataset: DatasetPreparado
+    posiciones: np.ndarray
+    derivadas: dict = field(default_factory=dict)
+
+    def __len__(self):
+        return len(self.posiciones)
+
+    @property
+    def empty(self):
+        return len(self.posiciones) == 0
+
+    # Valores de una columna como array numpy, en el orden de la vista
+    def valores(self, columna):
+        if columna in self.derivadas:
+            return self.derivadas[columna]
+        return self.dataset.array(columna)[self.posiciones]
+
+    # Valores de una columna como Series (conserva el tipo categórico)
+    def serie(self, columna):
+        if columna in self.derivadas:
+            return pd.Series(self.derivadas[columna], index=self.indice(), name=columna)
+        return self.dataset.df[columna].iloc[self.posiciones]
+
+    def indice(self):
+        return self.dataset.df.index[self.posiciones]
+
+    # Nueva vista con columnas derivadas añadidas (sin tocar el dataset compartido)
+    def con_columnas(self, columnas):
+        derivadas = dict(self.derivadas)
+        derivadas.update({nombre: np.asarray(valores) for nombre, valores in columnas.items()})
+        return Vista(self.dataset, self.posiciones, derivadas)
+
+    # Nueva vista con las filas ordenadas por una columna (nulos al final, orden estable)
+    def ordenar(self, columna, ascendente=True):
+        serie = self.serie(columna).reset_index(drop=True)
+        orden = serie.sort_values(ascending=ascendente, na_position='last', kind='stable').index.to_numpy()
+        derivadas = {nombre: valores[orden] for nombre, valores in self.derivadas.items()}
+        return Vista(self.dataset, self.posiciones[orden], derivadas)
+
+    # Nueva vista con las filas de una página (la primera es la 0)
+    def pagina(self, numero, filas_por_pagina):
+        inicio = numero * filas_por_pagina
+        fin = inicio + filas_por_pagina
+        derivadas = {nombre: valores[inicio:fin] for nombre, valores in self.derivadas.items()}
+        return Vista(self.dataset, self.posiciones[inicio:fin], derivadas)
+
+    # DataFrame pequeño con solo las columnas que necesita un gráfico o una tabla
+    def frame(self, columnas):
+        datos = {}
+        for columna in columnas:
+            if columna in self.derivadas:
+                datos[columna] = self.derivadas[columna]
+                continue
+            valores = self.dataset.df[columna].array.take(self.posiciones)
+            if isinstance(valores, pd.Categorical):
+                valores = valores.remove_unused_categories()
+            datos[columna] = valores
+        return pd.DataFrame(datos, index=self.indice())
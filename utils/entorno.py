@@ -0,0 +1,18 @@
+"""Variables de entorno del proyecto (.env).
+
+Módulo sin dependencias pesadas: la app lo usa para saber de dónde leer los datos
+(ORIGEN_DATOS) sin importar SQLAlchemy cuando no trabaja con la base de datos.
+
+Uso:
+    from utils.entorno import cargar_entorno
+    cargar_entorno()
+"""
+
+
+# Variables del .env más cercano al directorio de trabajo (Streamlit/.env al lanzar la app)
+def cargar_entorno():
+    try:
+        from dotenv import find_dotenv, load_dotenv
+    except ImportError:
+        return
+    load_dotenv(find_dotenv(usecwd=True))
@@ -0,0 +1,122 @@
+"""Índice espacial de los inmuebles para el mapa de la app.
+
+Cada fila con coordenadas válidas se asigna una sola vez a una celda de una
+rejilla de latitud/longitud en varias resoluciones (de 1° a unos 400 m de lado).
+Una consulta recibe las filas de la vista y la zona visible: si en la zona caben
+pocos inmuebles se devuelven como puntos, y si no, agrupados por celda (recuento,
+precio medio, precio medio por m² y posición media) en la resolución adecuada al
+tamaño de la zona. Así el navegador nunca recibe más de unos miles de marcadores.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+# Lado de la celda (en grados) de cada nivel de la rejilla, de más grueso a más fino
+NIVELES = (1.0, 0.25, 0.0625, 0.015625, 0.00390625)
+
+# Recuadro de España (península, Baleares, Canarias, Ceuta y Melilla): fuera de él
+# la coordenada se considera errónea y el inmueble no se dibuja
+LIMITES_ESPANA = (27.0, 44.5, -18.5, 5.0)
+
+# Inmuebles a partir de los cuales el mapa muestra grupos en lugar de puntos
+MAX_PUNTOS = 2000
+
+# Celdas que se quieren a lo largo de la zona visible al elegir el nivel de la rejilla
+CELDAS_POR_ZONA = 40
+
+COLUMNAS_GRUPOS = ['lat', 'lon', 'propiedades', 'precio_medio', 'precio_m2_medio']
+
+
+# Nivel más fino cuya celda no es menor que la zona entre CELDAS_POR_ZONA
+def nivel_para(zona):
+    lat_min, lat_max, lon_min, lon_max = zona
+    lado = max(lat_max - lat_min, lon_max - lon_min) / CELDAS_POR_ZONA
+    nivel = 0
+    while nivel + 1 < len(NIVELES) and NIVELES[nivel + 1] >= lado:
+        nivel += 1
+    return nivel
+
+
+# Centro y zoom del mapa con los que la zona ocupa el mapa
+def encuadre(zona):
+    lat_min, lat_max, lon_min, lon_max = zona
+    centro = {'lat': (lat_min + lat_max) / 2, 'lon': (lon_min + lon_max) / 2}
+    amplitud = max(lon_max - lon_min, (lat_max - lat_min) * 1.5, 0.005)
+    zoom = math.log2(360 / amplitud) - 0.5
+    return centro, min(max(zoom, 3), 16)
+
+
+# Zona que cubre los marcadores seleccionados en el mapa (los grupos se amplían una celda)
+def zona_seleccion(marcadores, agrupado, zona):
+    margen = NIVELES[nivel_para(zona)] if agrupado else 0.002
+    return (float(marcadores['lat'].min()) - margen, float(marcadores['lat'].max()) + margen,
+            float(marcadores['lon'].min()) - margen, float(marcadores['lon'].max()) + margen)
+
+
+class IndiceEspacial:
+    """Celdas de cada fila de un DatasetPreparado en todos los niveles de la rejilla."""
+
+    def __init__(self, dataset):
+        lat = pd.to_numeric(dataset.df['latitud'], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        lon = pd.to_numeric(dataset.df['longitud'], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        lat_min, lat_max, lon_min, lon_max = LIMITES_ESPANA
+        self.validas = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        self.lat = np.where(self.validas, lat, np.nan)
+        self.lon = np.where(self.validas, lon, np.nan)
+        self._precios = dataset.array('precio').astype('float64', copy=False)
+        self._precios_m2 = dataset.array('precio por m²').astype('float64', copy=False)
+
+        # Código de celda por nivel: fila * columnas + columna (-1 sin coordenadas)
+        self._celdas = []
+        for lado in NIVELES:
+            columnas = math.ceil((lon_max - lon_min) / lado) + 1
+            fila = np.floor((np.nan_to_num(self.lat, nan=lat_min) - lat_min) / lado).astype(np.int64)
+            columna = np.floor((np.nan_to_num(self.lon, nan=lon_min) - lon_min) / lado).astype(np.int64)
+            self._celdas.append(np.where(self.validas, fila * columnas + columna, -1))
+
+    # Posiciones con coordenadas válidas dentro de la zona (toda la vista si no hay zona)
+    def _en_zona(self, posiciones, zona=None):
+        posiciones = posiciones[self.validas[posiciones]]
+        if zona is None:
+            return posiciones
+        lat_min, lat_max, lon_min, lon_max = zona
+        lat, lon = self.lat[posiciones], self.lon[posiciones]
+        return posiciones[(lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)]
+
+    # Recuadro (lat_min, lat_max, lon_min, lon_max) de las filas con coordenadas (None si no hay)
+    def limites(self, posiciones):
+        posiciones = self._en_zona(np.asarray(posiciones, dtype=np.intp))
+        if len(posiciones) == 0:
+            return None
+        lat, lon = self.lat[posiciones], self.lon[posiciones]
+        return float(lat.min()), float(lat.max()), float(lon.min()), float(lon.max())
+
+    # Inmuebles de la vista en la zona: (False, puntos) si son pocos o (True, grupos) por celda.
+    # Los puntos llevan la posición de la fila en el dataset para completar sus datos.
+    def consultar(self, posiciones, zona, max_puntos=MAX_PUNTOS):
+        posiciones = self._en_zona(np.asarray(posiciones, dtype=np.intp), zona)
+        if len(posiciones) <= max_puntos:
+            return False, pd.DataFrame({
+                'posicion': posiciones,
+                'lat': self.lat[posiciones],
+                'lon': self.lon[posiciones],
+                'precio': self._precios[posiciones],
+                'precio_m2': self._precios_m2[posiciones],
+            })
+
+        _, grupo = np.unique(self._celdas[nivel_para(zona)][posiciones], return_inverse=True)
+        propiedades = np.bincount(grupo)
+        precios_m2 = self._precios_m2[posiciones]
+        # Los "precio por m²" iguales a 0 son inmuebles sin superficie útil
+        con_m2 = np.isfinite(precios_m2) & (precios_m2 > 0)
+        n_m2 = np.bincount(grupo, weights=con_m2)
+        with np.errstate(invalid='ignore'):
+            precio_m2_medio = np.bincount(grupo, weights=np.where(con_m2, precios_m2, 0)) / n_m2
+        return True, pd.DataFrame({
+            'lat': np.bincount(grupo, weights=self.lat[posiciones]) / propiedades,
+            'lon': np.bincount(grupo, weights=self.lon[posiciones]) / propiedades,
+            'propiedades': propiedades,
+            'precio_medio': np.bincount(grupo, weights=self._precios[posiciones]) / propiedades,
+            'precio_m2_medio': precio_m2_medio,
+        }, columns=COLUMNAS_GRUPOS)
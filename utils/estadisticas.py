@@ -0,0 +1,164 @@
+"""Cubo de estadísticas por (provincia, venta/alquiler) para el mapa y los gráficos de cajas.
+
+Cada celda guarda los precios y los precios por m² ordenados junto con sus sumas
+acumuladas. Con eso el recuento y la media de cualquier rango de precios, la
+media de una selección de provincias y los cuartiles y bigotes de cada caja se
+obtienen con búsquedas binarias, sin volver a recorrer las filas. Los gráficos
+reciben solo estas cifras, nunca los valores originales.
+
+Al llegar filas nuevas el cubo se actualiza sobre el índice ampliado: solo se
+recalculan las celdas de las particiones que han cambiado.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .indice import suelo_precio
+from .provincias import provincia_centroides
+
+COLUMNAS_CAJA = ['provincia', 'n', 'q1', 'mediana', 'q3', 'bigote_inf', 'bigote_sup', 'media', 'corte']
+
+
+# Cuantil (interpolación lineal) de un array ya ordenado, sin volver a ordenarlo
+def _cuantil(ordenados, q):
+    posicion = q * (len(ordenados) - 1)
+    bajo = int(np.floor(posicion))
+    alto = min(bajo + 1, len(ordenados) - 1)
+    return ordenados[bajo] + (ordenados[alto] - ordenados[bajo]) * (posicion - bajo)
+
+
+def _acumuladas(valores):
+    return np.concatenate(([0.0], np.cumsum(valores, dtype='float64')))
+
+
+@dataclass(frozen=True, eq=False)
+class Celda:
+    """Precios (todos) y precios por m² (válidos y por encima del suelo) de una partición."""
+    precios: np.ndarray
+    sumas: np.ndarray
+    precios_m2: np.ndarray
+    sumas_m2: np.ndarray
+    # Sumas acumuladas de (precio - centro)²: dan la desviación típica de cualquier rango
+    # sin la cancelación numérica de acumular precio² directamente
+    centro: float
+    cuadrados: np.ndarray
+
+    @classmethod
+    def crear(cls, precios_ordenados, precios_m2):
+        precios_m2 = np.sort(precios_m2[np.isfinite(precios_m2) & (precios_m2 > 0)], kind='stable')
+        centro = float(precios_ordenados.mean()) if len(precios_ordenados) else 0.0
+        return cls(
+            precios_ordenados, _acumuladas(precios_ordenados),
+            precios_m2, _acumuladas(precios_m2),
+            centro, _acumuladas((precios_ordenados - centro) ** 2),
+        )
+
+    def _cortes(self, minimo=None, maximo=None):
+        inicio = 0 if minimo is None else np.searchsorted(self.precios, minimo, side='left')
+        fin = len(self.precios) if maximo is None else np.searchsorted(self.precios, maximo, side='right')
+        return inicio, max(inicio, fin)
+
+    # Número de propiedades y precio medio con minimo <= precio <= maximo
+    def resumen_precio(self, minimo=None, maximo=None):
+        inicio, fin = self._cortes(minimo, maximo)
+        n = fin - inicio
+        return n, ((self.sumas[fin] - self.sumas[inicio]) / n if n else np.nan)
+
+    # Número de propiedades, media y desviación típica (poblacional, como zscore) del precio
+    def momentos(self, minimo=None, maximo=None):
+        inicio, fin = self._cortes(minimo, maximo)
+        n = fin - inicio
+        if n == 0:
+            return 0, np.nan, np.nan
+        desviacion_media = (self.sumas[fin] - self.sumas[inicio]) / n - self.centro
+        varianza = (self.cuadrados[fin] - self.cuadrados[inicio]) / n - desviacion_media ** 2
+        return n, self.centro + desviacion_media, float(np.sqrt(max(varianza, 0.0)))
+
+    # Estadísticos de la caja con los precios por m² iguales o superiores al corte
+    def caja(self, corte):
+        inicio = np.searchsorted(self.precios_m2, corte, side='left')
+        valores = self.precios_m2[inicio:]
+        if len(valores) == 0:
+            return None
+        q1, mediana, q3 = (_cuantil(valores, q) for q in (0.25, 0.5, 0.75))
+        rango = q3 - q1
+        # Bigotes como los de Plotly: dato más extremo a menos de 1,5 veces el rango intercuartílico
+        bigote_inf = valores[np.searchsorted(valores, q1 - 1.5 * rango, side='left')]
+        bigote_sup = valores[np.searchsorted(valores, q3 + 1.5 * rango, side='right') - 1]
+        media = (self.sumas_m2[-1] - self.sumas_m2[inicio]) / len(valores)
+        return {
+            'n': len(valores), 'q1': q1, 'mediana': mediana, 'q3': q3,
+            'bigote_inf': bigote_inf, 'bigote_sup': bigote_sup, 'media': media,
+        }
+
+
+# Celda de una partición: todos sus precios y los precios por m² a partir del suelo
+def _celda(particion, tipo, precios_m2):
+    return Celda.crear(particion.precios, precios_m2[particion.rango(suelo_precio(tipo))])
+
+
+class CuboProvincias:
+    """Estadísticas precalculadas por (provincia, venta/alquiler)."""
+
+    def __init__(self, celdas):
+        self._celdas = celdas
+
+    # Cubo a partir del índice de particiones de un DatasetPreparado
+    @classmethod
+    def desde_dataset(cls, dataset):
+        precios_m2 = dataset.array('precio por m²').astype('float64', copy=False)
+        celdas = {}
+        for (provincia, tipo), particion in dataset.indice.particiones():
+            celdas[(provincia, tipo)] = _celda(particion, tipo, precios_m2)
+        return cls(celdas)
+
+    # Cubo de `dataset` (este con filas añadidas) sin recalcular las celdas cuya partición
+    # es la misma que en `indice_anterior` (IndiceParticiones.ampliar las conserva)
+    def actualizar(self, dataset, indice_anterior):
+        precios_m2 = dataset.array('precio por m²').astype('float64', copy=False)
+        celdas = dict(self._celdas)
+        for (provincia, tipo), particion in dataset.indice.particiones():
+            if indice_anterior.particion(provincia, tipo) is not particion:
+                celdas[(provincia, tipo)] = _celda(particion, tipo, precios_m2)
+        return CuboProvincias(celdas)
+
+    def tipos(self):
+        return sorted({tipo for _, tipo in self._celdas})
+
+    # Número de propiedades, media y desviación típica del precio en un rango de la celda
+    def momentos(self, provincia, tipo, minimo=None, maximo=None):
+        celda = self._celdas.get((provincia, tipo))
+        if celda is None:
+            return 0, np.nan, np.nan
+        return celda.momentos(minimo, maximo)
+
+    # Datos del mapa (una fila por provincia con propiedades) para un rango de precios
+    def mapa(self, provincia, tipo, minimo=None, maximo=None):
+        celda = self._celdas.get((provincia, tipo))
+        if celda is None:
+            return pd.DataFrame(columns=['provincia', 'propiedades', 'precio_medio', 'lat', 'lon'])
+        propiedades, precio_medio = celda.resumen_precio(minimo, maximo)
+        lat, lon = provincia_centroides.get(provincia.lower(), (None, None))
+        filas = [{
+            'provincia': provincia, 'propiedades': propiedades,
+            'precio_medio': precio_medio, 'lat': lat, 'lon': lon,
+        }] if propiedades else []
+        return pd.DataFrame(filas, columns=['provincia', 'propiedades', 'precio_medio', 'lat', 'lon'])
+
+    # Cajas de precio por m² de las provincias indicadas. El corte es la mitad de la
+    # media conjunta de la selección, obtenida de las sumas de cada celda.
+    def cajas(self, tipo, provincias):
+        celdas = [(p, self._celdas[(p, tipo)]) for p in provincias if (p, tipo) in self._celdas]
+        n_total = sum(len(celda.precios_m2) for _, celda in celdas)
+        if n_total == 0:
+            return pd.DataFrame(columns=COLUMNAS_CAJA)
+        media = sum(celda.sumas_m2[-1] for _, celda in celdas) / n_total
+        corte = media / 2
+
+        filas = []
+        for provincia, celda in celdas:
+            caja = celda.caja(corte)
+            if caja is not None:
+                filas.append({'provincia': provincia, **caja, 'corte': corte})
+        return pd.DataFrame(filas, columns=COLUMNAS_CAJA)
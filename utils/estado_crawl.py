@@ -0,0 +1,111 @@
+"""Estado persistente del crawl: progreso por provincia y anuncios ya vistos.
+
+Se guarda en un SQLite local. Por cada ejecución (por defecto, una por día y tipo
+de transacción) se anota la última página terminada de cada provincia, de modo
+que un crawl interrumpido continúa donde se quedó. Por cada `Enlace` se guarda
+su ID estable y el último precio, y así un nuevo crawl solo descarga las fichas
+de anuncios nuevos o con cambio de precio.
+
+Los enlaces vistos en los listados de una ejecución completa son los anuncios
+publicados ese día, hayan descargado ficha o no: utils.historico los usa para
+dar de baja los que ya no aparecen.
+"""
+import re
+import sqlite3
+import uuid
+from datetime import date
+
+
+# ID estable de un anuncio: el mismo enlace da siempre el mismo ID
+def id_estable(enlace):
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, enlace))
+
+
+# Precio reducido a sus dígitos ('1.600 €' -> '1600'), para comparar listado y ficha
+def normalizar_precio(texto):
+    if texto is None:
+        return None
+    digitos = re.sub(r'\D', '', str(texto))
+    return digitos or None
+
+
+# Identificador por defecto de una ejecución: el día y el tipo de transacción
+def ejecucion_del_dia(tipo):
+    return f"{date.today().isoformat()}-{tipo}"
+
+
+class EstadoCrawl:
+    """Checkpoints por (ejecución, tipo, provincia) y registro de anuncios vistos."""
+
+    def __init__(self, ruta):
+        self._conexion = sqlite3.connect(ruta)
+        self._conexion.executescript("""
+            CREATE TABLE IF NOT EXISTS progreso (
+                ejecucion TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                provincia TEXT NOT NULL,
+                pagina INTEGER NOT NULL,
+                terminada INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (ejecucion, tipo, provincia)
+            );
+            CREATE TABLE IF NOT EXISTS anuncios (
+                enlace TEXT PRIMARY KEY,
+                id TEXT NOT NULL,
+                precio TEXT,
+                visto_en TEXT NOT NULL
+            );
+        """)
+
+    # Última página terminada y si la provincia ya se completó en esta ejecución
+    def progreso(self, ejecucion, tipo, provincia):
+        fila = self._conexion.execute(
+            "SELECT pagina, terminada FROM progreso WHERE ejecucion = ? AND tipo = ? AND provincia = ?",
+            (ejecucion, tipo, provincia)
+        ).fetchone()
+        return (fila[0], bool(fila[1])) if fila else (0, False)
+
+    # ¿Hay que descargar la ficha? Sí si el anuncio es nuevo o su precio ha cambiado
+    def necesita_ficha(self, enlace, precio_listado):
+        fila = self._conexion.execute("SELECT precio FROM anuncios WHERE enlace = ?", (enlace,)).fetchone()
+        if fila is None:
+            return True
+        precio = normalizar_precio(precio_listado)
+        return precio is not None and precio != fila[0]
+
+    # Registra una página terminada en una sola transacción: fichas descargadas,
+    # anuncios vistos sin cambios y checkpoint de la provincia
+    def guardar_pagina(self, ejecucion, tipo, provincia, pagina, filas, enlaces_vistos):
+        with self._conexion:
+            self._conexion.executemany(
+                """INSERT INTO anuncios (enlace, id, precio, visto_en) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(enlace) DO UPDATE SET precio = excluded.precio, visto_en = excluded.visto_en""",
+                [(fila['Enlace'], fila['ID'], normalizar_precio(fila['Precio']), ejecucion) for fila in filas]
+            )
+            self._conexion.executemany(
+                "UPDATE anuncios SET visto_en = ? WHERE enlace = ?",
+                [(ejecucion, enlace) for enlace in enlaces_vistos]
+            )
+            self._guardar_progreso(ejecucion, tipo, provincia, pagina, terminada=False)
+
+    # Enlaces vistos en los listados de las ejecuciones indicadas
+    def enlaces_vistos(self, *ejecuciones):
+        marcas = ', '.join('?' * len(ejecuciones))
+        return [fila[0] for fila in self._conexion.execute(
+            f"SELECT enlace FROM anuncios WHERE visto_en IN ({marcas})", ejecuciones
+        )]
+
+    def terminar_provincia(self, ejecucion, tipo, provincia):
+        with self._conexion:
+            pagina, _ = self.progreso(ejecucion, tipo, provincia)
+            self._guardar_progreso(ejecucion, tipo, provincia, pagina, terminada=True)
+
+    def _guardar_progreso(self, ejecucion, tipo, provincia, pagina, terminada):
+        self._conexion.execute(
+            """INSERT INTO progreso (ejecucion, tipo, provincia, pagina, terminada) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(ejecucion, tipo, provincia)
+               DO UPDATE SET pagina = excluded.pagina, terminada = excluded.terminada""",
+            (ejecucion, tipo, provincia, pagina, int(terminada))
+        )
+
+    def cerrar(self):
+        self._conexion.close()
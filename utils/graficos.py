@@ -0,0 +1,108 @@
+"""Gráficos agregados en el servidor para vistas con muchas filas.
+
+Por encima de `UMBRAL_AGREGADO` filas, el histograma de precios y la dispersión
+precio/superficie se calculan aquí con NumPy y a Plotly solo le llegan los
+recuentos por intervalo o por celda, no una entrada por inmueble. El mapa recibe
+igualmente los grupos de la rejilla de `utils.espacial`.
+
+Plotly se importa dentro de las funciones que crean figuras: los cálculos con
+NumPy (y las páginas de la app sin gráficos) no pagan su importación.
+"""
+import numpy as np
+
+# Filas a partir de las cuales los gráficos se agregan en el servidor
+UMBRAL_AGREGADO = 5000
+
+COLORES_TIPO_DATO = {'Datos Atípicos': 'red', 'Datos Normales': 'blue'}
+
+
+# Histograma de precios ya ordenados, separando los atípicos (fuera de [limite_inf, limite_sup]).
+# Al estar ordenados, cada recuento es una búsqueda binaria de los bordes.
+def histograma_ordenado(precios_ordenados, limite_inf, limite_sup, nbins=40):
+    minimo, maximo = precios_ordenados[0], precios_ordenados[-1]
+    if minimo == maximo:
+        minimo, maximo = minimo - 0.5, maximo + 0.5
+    bordes = np.linspace(minimo, maximo, nbins + 1)
+    acumulados = np.searchsorted(precios_ordenados, bordes, side='left')
+    acumulados[-1] = len(precios_ordenados)  # el último intervalo incluye el máximo
+    totales = np.diff(acumulados)
+
+    # Filas normales: el tramo contiguo entre los dos límites del z-score
+    inicio = np.searchsorted(precios_ordenados, limite_inf, side='left')
+    fin = np.searchsorted(precios_ordenados, limite_sup, side='right')
+    normales = np.diff(np.clip(acumulados, inicio, fin))
+    return bordes, normales, totales - normales
+
+
+def figura_histograma(bordes, normales, atipicos):
+    import plotly.graph_objects as go
+
+    centros = (bordes[:-1] + bordes[1:]) / 2
+    anchura = bordes[1] - bordes[0] if len(bordes) > 1 else None
+    fig = go.Figure()
+    for nombre, recuentos in (('Datos Normales', normales), ('Datos Atípicos', atipicos)):
+        if recuentos.any():
+            fig.add_trace(go.Bar(x=centros, y=recuentos, width=anchura, name=nombre,
+                                 marker_color=COLORES_TIPO_DATO[nombre]))
+    fig.update_layout(barmode='stack')
+    return fig
+
+
+# Rejilla de densidad 2-D (recuento de inmuebles por celda) para una dispersión
+def densidad_2d(x, y, rango_x=None, nbins=100):
+    validos = np.isfinite(x) & np.isfinite(y)
+    x, y = x[validos], y[validos]
+    if rango_x is None:
+        rango_x = (x.min(), x.max())
+    rango_y = (y.min(), y.max()) if len(y) else (0, 1)
+    recuentos, bordes_x, bordes_y = np.histogram2d(x, y, bins=nbins, range=[rango_x, rango_y])
+    return bordes_x, bordes_y, recuentos
+
+
+def figura_densidad(bordes_x, bordes_y, recuentos):
+    import plotly.graph_objects as go
+
+    # Las celdas vacías quedan transparentes
+    z = np.where(recuentos > 0, recuentos, np.nan).T
+    fig = go.Figure(go.Heatmap(
+        x=(bordes_x[:-1] + bordes_x[1:]) / 2,
+        y=(bordes_y[:-1] + bordes_y[1:]) / 2,
+        z=z,
+        colorscale='Blues',
+        colorbar={'title': 'Propiedades'},
+        hovertemplate="Superficie: %{x:.0f} m²<br>Precio: %{y:,.0f} €<br>Propiedades: %{z}<extra></extra>"
+    ))
+    return fig
+
+
+# Mapa de inmuebles: un marcador por grupo de la rejilla (tamaño según el recuento) o por inmueble
+def figura_mapa(marcadores, agrupado, centro, zoom):
+    import plotly.graph_objects as go
+
+    if agrupado:
+        traza = go.Scattermap(
+            lat=marcadores['lat'], lon=marcadores['lon'], mode='markers',
+            marker={
+                'size': 8 + 30 * np.sqrt(marcadores['propiedades'] / marcadores['propiedades'].max()),
+                'color': marcadores['precio_medio'], 'colorscale': 'Blues',
+                'colorbar': {'title': 'Precio medio (€)'}, 'opacity': 0.8,
+            },
+            customdata=marcadores[['propiedades', 'precio_medio', 'precio_m2_medio']],
+            hovertemplate=("Propiedades: %{customdata[0]}<br>Precio medio: %{customdata[1]:,.0f} €"
+                           "<br>Precio medio por m²: %{customdata[2]:,.0f} €<extra></extra>"),
+        )
+    else:
+        traza = go.Scattermap(
+            lat=marcadores['lat'], lon=marcadores['lon'], mode='markers',
+            marker={'size': 9, 'color': marcadores['precio'], 'colorscale': 'Blues',
+                    'colorbar': {'title': 'Precio (€)'}},
+            customdata=marcadores[['título', 'precio', 'precio_m2']],
+            hovertemplate=("%{customdata[0]}<br>Precio: %{customdata[1]:,.0f} €"
+                           "<br>Precio por m²: %{customdata[2]:,.0f} €<extra></extra>"),
+        )
+    fig = go.Figure(traza)
+    fig.update_layout(
+        map={'style': 'carto-positron', 'center': centro, 'zoom': zoom},
+        margin={'r': 0, 't': 50, 'l': 0, 'b': 0},
+    )
+    return fig
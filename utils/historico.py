@@ -0,0 +1,361 @@
+"""Histórico de crawls: cambios por anuncio y estadísticas por provincia y fecha.
+
+Cada carga de propiedades_limpio sustituye a la anterior, así que el precio que
+tenía un anuncio en crawls pasados se perdía. Aquí cada crawl añade una
+partición `fecha=AAAA-MM-DD/` que ya no se modifica:
+
+- `cambios.parquet`: solo los anuncios que cambian, identificados por su enlace.
+  Las altas llevan todos los campos, las bajas solo el enlace, la provincia y el
+  tipo, y los cambios solo los campos que cambian (y el precio anterior si cambia
+  el precio). Un crawl en el que casi nada cambia ocupa muy poco, no una copia
+  entera del dataset.
+- `estadisticas.parquet`: agregados de ese crawl por provincia y venta/alquiler
+  (anuncios, precio medio, precio por m² medio y mediano, altas, bajas, bajadas
+  y subidas de precio).
+
+El dataset limpio acumula la última fila de cada enlace y nunca pierde
+anuncios, así que no haber leído un anuncio no significa que se haya retirado:
+los anuncios que faltan en los datos siguen en el estado tal cual estaban. Las
+bajas solo se detectan si se pasan los enlaces vistos en los listados de un
+crawl completo (`EstadoCrawl.enlaces_vistos`): los anuncios que no están entre
+ellos se dan de baja aunque su última fila siga en los datos.
+
+Lo único que se guarda completo es el último estado de cada anuncio
+(`estado.arrow`), con el que se calculan los cambios del crawl siguiente. La
+tendencia de una provincia en los últimos N crawls lee N ficheros de
+estadísticas de unas decenas de filas, y las bajadas de precio solo las
+particiones de cambios del periodo, filtradas al leer.
+
+Uso:
+    python -m utils.historico registrar propiedades_limpio.parquet --directorio historico
+    python -m utils.historico registrar propiedades_limpio.parquet --estado-crawl crawl.sqlite \
+        --ejecuciones 2024-10-25-venta 2024-10-25-alquiler
+    python -m utils.historico tendencia Madrid Venta --ultimos 12
+    python -m utils.historico bajadas --desde 2024-10-01 --provincia Madrid
+    python -m utils.historico anuncio https://www.pisos.com/comprar/piso-...
+"""
+import argparse
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from .dataset import preparar_dataset
+from .estado_crawl import EstadoCrawl
+from .limpieza import convertir_fecha
+from .snapshot import leer_datos
+
+DIRECTORIO_POR_DEFECTO = 'historico'
+
+PREFIJO = 'fecha='
+ESTADO = 'estado.arrow'
+CAMBIOS = 'cambios.parquet'
+ESTADISTICAS = 'estadisticas.parquet'
+
+# Claves de cada registro: el enlace identifica el anuncio y la provincia y el tipo
+# van en todas las filas para poder filtrar al leer
+CLAVES = ['enlace', 'provincia', 'venta/alquiler']
+
+# Campos que se siguen: un cambio en cualquiera de ellos genera un registro
+CAMPOS = [
+    'precio', 'superficie construida', 'superficie útil', 'habitaciones', 'baños', 'planta',
+    'certificado energético', 'título'
+]
+
+# Campos que no cambian en un anuncio: se guardan solo en el alta
+FIJOS = ['latitud', 'longitud']
+
+COLUMNAS_CAMBIOS = [*CLAVES, 'evento', *FIJOS, *CAMPOS, 'precio_anterior']
+
+COLUMNAS_ESTADISTICAS = [
+    'fecha', 'provincia', 'venta/alquiler', 'anuncios', 'precio_medio', 'precio_m2_medio',
+    'precio_m2_mediana', 'altas', 'bajas', 'bajadas', 'subidas'
+]
+
+COLUMNAS_BAJADAS = [
+    'enlace', 'título', 'provincia', 'venta/alquiler', 'precio_inicial', 'precio_final', 'bajada',
+    'bajada_pct', 'primer_cambio', 'ultimo_cambio', 'cambios_precio'
+]
+
+
+# Textos como cadenas y cifras como float64, para comparar el crawl con el estado
+def _tipar(df):
+    df = df.copy()
+    for columna in df.columns:
+        if pd.api.types.is_numeric_dtype(df[columna]) and not pd.api.types.is_bool_dtype(df[columna]):
+            df[columna] = df[columna].astype('float64')
+        else:
+            df[columna] = df[columna].astype('string')
+    return df
+
+
+# Filas del crawl con los nombres y formatos del dataset preparado, una por enlace
+def _preparar_crawl(df):
+    crawl = preparar_dataset(df).df
+    crawl = crawl[[*CLAVES, *FIJOS, *CAMPOS, 'precio por m²']].drop_duplicates('enlace', keep='last')
+    return _tipar(crawl).set_index('enlace')
+
+
+# Fecha del crawl: la del último Timestamp de sus filas
+def fecha_crawl(df):
+    columna = next(c for c in df.columns if c.strip().lower() == 'timestamp')
+    fechas = df[columna]
+    if not pd.api.types.is_datetime64_any_dtype(fechas):
+        fechas = convertir_fecha(fechas.astype(str))
+    ultima = fechas.max()
+    if pd.isna(ultima):
+        raise ValueError("El crawl no tiene ningún Timestamp válido: indica la fecha")
+    return ultima.date().isoformat()
+
+
+# Fechas de los crawls registrados, de la más antigua a la más reciente
+def crawls(directorio=DIRECTORIO_POR_DEFECTO):
+    return sorted(ruta.name[len(PREFIJO):] for ruta in Path(directorio).glob(f'{PREFIJO}*') if ruta.is_dir())
+
+
+# Último estado conocido de cada anuncio (vacío antes del primer crawl)
+def _leer_estado(directorio, columnas=None):
+    ruta = Path(directorio, ESTADO)
+    if not ruta.exists():
+        return None
+    return feather.read_table(ruta, columns=columnas, memory_map=True).to_pandas()
+
+
+def _escribir_parquet(df, ruta):
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), ruta, compression='zstd')
+
+
+# Registros de cambios del crawl respecto al estado anterior. Solo hay bajas si se
+# conocen los enlaces vistos en el crawl (`vistos`): los demás anuncios que faltan se conservan.
+def _cambios(actual, previo, vistos=None):
+    altas = actual.index.difference(previo.index)
+    ausentes = previo.index.difference(actual.index)
+    bajas = ausentes[:0] if vistos is None else ausentes.difference(pd.Index(vistos))
+    comunes = actual.index.intersection(previo.index)
+
+    nuevos, viejos = actual.loc[comunes, CAMPOS], previo.loc[comunes, CAMPOS]
+    # Distinto si cambia el valor o si solo uno de los dos es nulo
+    distinto = (nuevos != viejos).fillna(True).astype(bool) & ~(nuevos.isna() & viejos.isna())
+    cambiados = distinto.any(axis=1).to_numpy()
+    distinto = distinto[cambiados]
+
+    registros_cambios = nuevos[cambiados].where(distinto)
+    registros_cambios['precio_anterior'] = viejos.loc[cambiados, 'precio'].where(distinto['precio'])
+    registros_cambios[CLAVES[1:]] = actual.loc[registros_cambios.index, CLAVES[1:]]
+
+    registros = pd.concat([
+        actual.loc[altas, [*CLAVES[1:], *FIJOS, *CAMPOS]].assign(evento='alta'),
+        registros_cambios.assign(evento='cambio'),
+        previo.loc[bajas, CLAVES[1:]].assign(evento='baja'),
+    ])
+    registros = registros.rename_axis('enlace').reset_index().reindex(columns=COLUMNAS_CAMBIOS)
+    return _tipar(registros), altas, bajas, distinto
+
+
+# Estadísticas del crawl por provincia y venta/alquiler
+def _estadisticas(fecha, actual, previo, altas, bajas, distinto):
+    grupo = CLAVES[1:]
+    precio_m2 = actual['precio por m²'].where(np.isfinite(actual['precio por m²']) & (actual['precio por m²'] > 0))
+    estadisticas = actual.assign(precio_m2=precio_m2).groupby(grupo).agg(
+        anuncios=('precio', 'size'),
+        precio_medio=('precio', 'mean'),
+        precio_m2_medio=('precio_m2', 'mean'),
+        precio_m2_mediana=('precio_m2', 'median'),
+    )
+
+    con_precio = distinto.index[distinto['precio'].to_numpy()]
+    diferencia = actual.loc[con_precio, 'precio'] - previo.loc[con_precio, 'precio']
+    recuentos = {
+        'altas': actual.loc[altas, grupo],
+        'bajas': previo.loc[bajas, grupo],
+        'bajadas': actual.loc[diferencia.index[(diferencia < 0).to_numpy()], grupo],
+        'subidas': actual.loc[diferencia.index[(diferencia > 0).to_numpy()], grupo],
+    }
+    for nombre, filas in recuentos.items():
+        if filas.empty:
+            estadisticas[nombre] = 0
+        else:
+            estadisticas = estadisticas.join(filas.groupby(grupo).size().rename(nombre), how='outer')
+    estadisticas = estadisticas.fillna({nombre: 0 for nombre in ['anuncios', *recuentos]})
+    return estadisticas.reset_index().assign(fecha=fecha)[COLUMNAS_ESTADISTICAS]
+
+
+# Añade un crawl al histórico. Las fechas solo pueden avanzar: el histórico no se reescribe.
+# `vistos` son los enlaces vistos en los listados de un crawl completo (ver _cambios).
+def registrar_crawl(df, directorio=DIRECTORIO_POR_DEFECTO, fecha=None, vistos=None):
+    fecha = fecha or fecha_crawl(df)
+    registradas = crawls(directorio)
+    if registradas and fecha <= registradas[-1]:
+        raise ValueError(f"El crawl del {fecha} no es posterior al último registrado ({registradas[-1]})")
+
+    actual = _preparar_crawl(df)
+    if vistos is not None:
+        # Los datos limpios guardan también los anuncios retirados: solo siguen los vistos
+        actual = actual[actual.index.isin(pd.Index(vistos))]
+    previo = _leer_estado(directorio)
+    if previo is None:
+        previo = actual.iloc[:0].assign(primera_fecha=pd.Series(dtype='string'),
+                                        ultima_fecha=pd.Series(dtype='string'))
+    else:
+        previo = _tipar(previo).set_index('enlace')
+    cambios, altas, bajas, distinto = _cambios(actual, previo, vistos)
+    # Anuncios publicados tras el crawl: los leídos y los anteriores que no se han dado de baja
+    conservados = previo.index.difference(actual.index).difference(bajas)
+    vigentes = pd.concat([actual, previo.loc[conservados, actual.columns]])
+    estadisticas = _estadisticas(fecha, vigentes, previo, altas, bajas, distinto)
+
+    # Partición y estado nuevos se escriben aparte y se colocan al final
+    os.makedirs(directorio, exist_ok=True)
+    temporal = Path(directorio, f'.{PREFIJO}{fecha}.tmp')
+    shutil.rmtree(temporal, ignore_errors=True)
+    temporal.mkdir()
+    _escribir_parquet(cambios, temporal / CAMBIOS)
+    _escribir_parquet(estadisticas, temporal / ESTADISTICAS)
+
+    estado = vigentes.assign(
+        primera_fecha=previo['primera_fecha'].reindex(vigentes.index).fillna(fecha),
+        ultima_fecha=pd.Series(fecha, index=actual.index, dtype='string').reindex(vigentes.index)
+                       .fillna(previo['ultima_fecha'].reindex(vigentes.index)),
+    ).reset_index()
+    estado_temporal = Path(directorio, f'{ESTADO}.tmp')
+    feather.write_feather(pa.Table.from_pandas(estado, preserve_index=False), estado_temporal)
+
+    os.replace(temporal, Path(directorio, f'{PREFIJO}{fecha}'))
+    os.replace(estado_temporal, Path(directorio, ESTADO))
+    return {'fecha': fecha, 'anuncios': len(vigentes), 'altas': len(altas), 'bajas': len(bajas),
+            'cambios': int(len(distinto))}
+
+
+# Ficheros `nombre` de las fechas dadas, con la columna fecha, filtrando al leer
+def _leer_particiones(directorio, fechas, nombre, filtros=None, columnas=None):
+    partes = [
+        pq.read_table(Path(directorio, f'{PREFIJO}{fecha}', nombre), columns=columnas, filters=filtros)
+          .to_pandas().assign(fecha=fecha)
+        for fecha in fechas
+    ]
+    return pd.concat(partes, ignore_index=True) if partes else None
+
+
+def _filtros(provincia=None, tipo=None):
+    filtros = []
+    if provincia:
+        filtros.append(('provincia', '=', str(provincia).title()))
+    if tipo:
+        filtros.append(('venta/alquiler', '=', str(tipo).capitalize()))
+    return filtros
+
+
+# Estadísticas de una provincia y tipo en los últimos `ultimos` crawls, una fila por crawl
+def tendencia(provincia, tipo, ultimos=12, directorio=DIRECTORIO_POR_DEFECTO):
+    fechas = crawls(directorio)[-ultimos:]
+    estadisticas = _leer_particiones(directorio, fechas, ESTADISTICAS, _filtros(provincia, tipo))
+    if estadisticas is None:
+        return pd.DataFrame(columns=COLUMNAS_ESTADISTICAS)
+    return estadisticas[COLUMNAS_ESTADISTICAS]
+
+
+# Anuncios cuyo precio ha bajado entre `desde` y `hasta` (fechas AAAA-MM-DD): precio antes
+# del primer cambio del periodo frente al precio tras el último, ordenados por la bajada en %
+def bajadas_precio(desde=None, hasta=None, provincia=None, tipo=None, minimo_pct=0.0, limite=None,
+                   directorio=DIRECTORIO_POR_DEFECTO):
+    fechas = [fecha for fecha in crawls(directorio)
+              if (desde is None or fecha >= str(desde)) and (hasta is None or fecha <= str(hasta))]
+    filtros = [('evento', '=', 'cambio'), *_filtros(provincia, tipo)]
+    cambios = _leer_particiones(directorio, fechas, CAMBIOS, filtros,
+                                columnas=[*CLAVES, 'precio', 'precio_anterior'])
+    if cambios is None:
+        return pd.DataFrame(columns=COLUMNAS_BAJADAS)
+    cambios = cambios[cambios['precio_anterior'].notna()]
+
+    por_anuncio = cambios.groupby('enlace', sort=False).agg(**{
+        'provincia': ('provincia', 'last'),
+        'venta/alquiler': ('venta/alquiler', 'last'),
+        'precio_inicial': ('precio_anterior', 'first'),
+        'precio_final': ('precio', 'last'),
+        'primer_cambio': ('fecha', 'first'),
+        'ultimo_cambio': ('fecha', 'last'),
+        'cambios_precio': ('precio', 'size'),
+    })
+    por_anuncio['bajada'] = por_anuncio['precio_inicial'] - por_anuncio['precio_final']
+    por_anuncio['bajada_pct'] = por_anuncio['bajada'] / por_anuncio['precio_inicial'] * 100
+    bajadas = por_anuncio[por_anuncio['bajada_pct'] > minimo_pct].sort_values('bajada_pct', ascending=False)
+    if limite is not None:
+        bajadas = bajadas.head(limite)
+
+    # Título actual de los anuncios que siguen publicados
+    estado = _leer_estado(directorio, columnas=['enlace', 'título'])
+    titulos = estado.set_index('enlace')['título'] if estado is not None else pd.Series(dtype='string')
+    bajadas = bajadas.assign(título=titulos.reindex(bajadas.index).to_numpy())
+    return bajadas.reset_index()[COLUMNAS_BAJADAS]
+
+
+# Historial de un anuncio: un registro por crawl en el que cambió, con los campos completos
+def historial_anuncio(enlace, directorio=DIRECTORIO_POR_DEFECTO):
+    registros = _leer_particiones(directorio, crawls(directorio), CAMBIOS, [('enlace', '=', enlace)])
+    if registros is None or registros.empty:
+        return pd.DataFrame(columns=['fecha', *COLUMNAS_CAMBIOS])
+    registros = registros[['fecha', *COLUMNAS_CAMBIOS]].copy()
+    # Cada cambio guarda solo lo que cambia: el resto es lo del registro anterior
+    publicado = registros['evento'] != 'baja'
+    registros.loc[publicado, [*FIJOS, *CAMPOS]] = registros.loc[publicado, [*FIJOS, *CAMPOS]].ffill()
+    return registros
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Histórico de crawls de pisos.com.")
+    parser.add_argument('--directorio', default=DIRECTORIO_POR_DEFECTO)
+    ordenes = parser.add_subparsers(dest='orden', required=True)
+
+    registrar = ordenes.add_parser('registrar', help="Añade un crawl limpio al histórico")
+    registrar.add_argument('datos', help="Parquet de utils.limpieza, snapshot .arrow o CSV limpio")
+    registrar.add_argument('--fecha', help="Fecha del crawl (por defecto, la del último Timestamp)")
+    registrar.add_argument('--estado-crawl', help="SQLite de utils.estado_crawl: da de baja los anuncios "
+                                                   "que no se vieron en las ejecuciones indicadas")
+    registrar.add_argument('--ejecuciones', nargs='+', default=[],
+                           help="Ejecuciones completas del crawl (p. ej. 2024-10-25-venta 2024-10-25-alquiler)")
+
+    ver_tendencia = ordenes.add_parser('tendencia', help="Estadísticas de una provincia en los últimos crawls")
+    ver_tendencia.add_argument('provincia')
+    ver_tendencia.add_argument('tipo', help="Venta o Alquiler")
+    ver_tendencia.add_argument('--ultimos', type=int, default=12)
+
+    ver_bajadas = ordenes.add_parser('bajadas', help="Anuncios cuyo precio ha bajado")
+    ver_bajadas.add_argument('--desde')
+    ver_bajadas.add_argument('--hasta')
+    ver_bajadas.add_argument('--provincia')
+    ver_bajadas.add_argument('--tipo')
+    ver_bajadas.add_argument('--minimo-pct', type=float, default=0.0)
+    ver_bajadas.add_argument('--limite', type=int, default=50)
+
+    ver_anuncio = ordenes.add_parser('anuncio', help="Historial de un anuncio")
+    ver_anuncio.add_argument('enlace')
+    args = parser.parse_args()
+
+    if args.orden == 'registrar':
+        vistos = None
+        if args.estado_crawl:
+            if not args.ejecuciones:
+                parser.error("--estado-crawl necesita --ejecuciones")
+            estado = EstadoCrawl(args.estado_crawl)
+            try:
+                vistos = estado.enlaces_vistos(*args.ejecuciones)
+            finally:
+                estado.cerrar()
+        resumen = registrar_crawl(leer_datos(args.datos), args.directorio, args.fecha, vistos)
+        print(f"Crawl del {resumen['fecha']}: {resumen['anuncios']} anuncios, {resumen['altas']} altas, "
+              f"{resumen['bajas']} bajas y {resumen['cambios']} con cambios")
+    else:
+        if args.orden == 'tendencia':
+            resultado = tendencia(args.provincia, args.tipo, args.ultimos, args.directorio)
+        elif args.orden == 'bajadas':
+            resultado = bajadas_precio(args.desde, args.hasta, args.provincia, args.tipo, args.minimo_pct,
+                                       args.limite, args.directorio)
+        else:
+            resultado = historial_anuncio(args.enlace, args.directorio)
+        with pd.option_context('display.max_rows', None, 'display.width', 160):
+            print(resultado.to_string(index=False))
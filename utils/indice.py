@@ -0,0 +1,128 @@
+"""Índice de filas por (provincia, venta/alquiler), ordenadas por precio.
+
+Cada partición guarda las posiciones de sus filas ordenadas por precio, de modo
+que buscar una provincia es una consulta a un diccionario y los filtros de
+precio (suelo de 300 € del alquiler, slider de rango) son búsquedas binarias.
+Las filas sin precio quedan fuera: ningún filtro de precio las deja pasar.
+
+Cuando los datos nuevos son los anteriores con filas añadidas al final, el
+índice se amplía: solo se ordenan las filas nuevas y se intercalan en las
+particiones afectadas; el resto se comparten con el índice anterior.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+# Los alquileres por debajo de este precio no se tienen en cuenta en la app
+SUELO_ALQUILER = 300
+
+
+# Precio mínimo que se aplica a un tipo de transacción (None si no hay suelo)
+def suelo_precio(tipo):
+    return SUELO_ALQUILER if tipo == 'Alquiler' else None
+
+
+@dataclass(frozen=True, eq=False)
+class Particion:
+    """Filas de una provincia y tipo de transacción, ordenadas por precio."""
+    posiciones: np.ndarray
+    precios: np.ndarray
+
+    def __len__(self):
+        return len(self.posiciones)
+
+    # Rango [inicio, fin) de la partición con minimo <= precio <= maximo
+    def cortes(self, minimo=None, maximo=None):
+        inicio = 0 if minimo is None else np.searchsorted(self.precios, minimo, side='left')
+        fin = len(self.precios) if maximo is None else np.searchsorted(self.precios, maximo, side='right')
+        return inicio, max(inicio, fin)
+
+    # Posiciones de las filas con minimo <= precio <= maximo
+    def rango(self, minimo=None, maximo=None):
+        inicio, fin = self.cortes(minimo, maximo)
+        return self.posiciones[inicio:fin]
+
+    # Precios ordenados con minimo <= precio <= maximo
+    def precios_rango(self, minimo=None, maximo=None):
+        inicio, fin = self.cortes(minimo, maximo)
+        return self.precios[inicio:fin]
+
+    # Precio mínimo y máximo a partir de un suelo (None si no queda ninguna fila)
+    def limites(self, minimo=None):
+        inicio, fin = self.cortes(minimo)
+        if inicio == fin:
+            return None
+        return self.precios[inicio], self.precios[fin - 1]
+
+    # Nueva partición con las filas de `otra` (posteriores a todas las de esta) intercaladas
+    # por precio. Con precios iguales van detrás, como en el orden de una construcción completa.
+    def combinar(self, otra):
+        destino = np.searchsorted(self.precios, otra.precios, side='right')
+        return Particion(np.insert(self.posiciones, destino, otra.posiciones),
+                         np.insert(self.precios, destino, otra.precios))
+
+
+_VACIA = Particion(np.empty(0, dtype=np.intp), np.empty(0))
+
+
+# Particiones de las filas del dataset a partir de la posición `desde`
+def _particionar(dataset, desde=0):
+    provincias = dataset.df['provincia'].cat
+    tipos = dataset.df['venta/alquiler'].cat
+    precios = dataset.array('precio').astype('float64', copy=False)
+
+    codigo_provincia = provincias.codes.to_numpy()[desde:].astype(np.int64)
+    codigo_tipo = tipos.codes.to_numpy()[desde:].astype(np.int64)
+    validas = desde + np.flatnonzero((codigo_provincia >= 0) & (codigo_tipo >= 0) & ~np.isnan(precios[desde:]))
+
+    # Una única ordenación por (clave de partición, precio) para todas las filas
+    clave = codigo_provincia[validas - desde] * len(tipos.categories) + codigo_tipo[validas - desde]
+    orden = np.lexsort((precios[validas], clave))
+    posiciones = validas[orden]
+    clave = clave[orden]
+    cortes = np.flatnonzero(np.diff(clave)) + 1
+
+    particiones = {}
+    inicios = np.concatenate(([0], cortes))
+    fines = np.concatenate((cortes, [len(posiciones)]))
+    for inicio, fin in zip(inicios, fines):
+        if inicio == fin:
+            continue
+        codigo = clave[inicio]
+        provincia = provincias.categories[codigo // len(tipos.categories)]
+        tipo = tipos.categories[codigo % len(tipos.categories)]
+        bloque = posiciones[inicio:fin]
+        particiones[(provincia, tipo)] = Particion(bloque, precios[bloque])
+    return particiones
+
+
+class IndiceParticiones:
+    """Particiones de un DatasetPreparado por (provincia, venta/alquiler)."""
+
+    def __init__(self, dataset, particiones=None):
+        self._particiones = _particionar(dataset) if particiones is None else particiones
+        # Provincias en orden de aparición, como en los selectores de la app
+        self._provincias = dataset.valores_unicos('provincia')
+
+    # Índice de `dataset`, que tiene las mismas filas que el de este índice y otras añadidas a
+    # partir de `desde`. Las particiones sin filas nuevas son los mismos objetos que en este.
+    def ampliar(self, dataset, desde):
+        particiones = dict(self._particiones)
+        for clave, nueva in _particionar(dataset, desde).items():
+            anterior = particiones.get(clave)
+            particiones[clave] = nueva if anterior is None else anterior.combinar(nueva)
+        return IndiceParticiones(dataset, particiones)
+
+    def particion(self, provincia, tipo):
+        return self._particiones.get((provincia, tipo), _VACIA)
+
+    # Pares ((provincia, tipo), partición) de las particiones no vacías
+    def particiones(self):
+        return self._particiones.items()
+
+    # Provincias con alguna fila del tipo dado por encima del suelo de precio
+    def provincias(self, tipo, minimo=None):
+        return [
+            provincia for provincia in self._provincias
+            if self.particion(provincia, tipo).limites(minimo) is not None
+        ]
@@ -0,0 +1,248 @@
+"""Pipeline de limpieza por bloques de los CSV del scraper.
+
+Reúne en una sola pasada lo que antes se hacía en varias celdas del notebook
+(`sustituir_nulos`, `limpiar_certificado_energetico`, `limpiar_provincia`, la
+unión de alquiler y venta) y en las sentencias UPDATE/ALTER del script SQL (quitar
+'€', ' m²' y 'ª' y convertir las cifras a números). Los CSV se leen por bloques
+y cada bloque se limpia con operaciones vectorizadas y se escribe enseguida,
+así que la memoria no depende del tamaño de la entrada.
+
+El scraper incremental añade al CSV una fila nueva cada vez que cambia un
+anuncio, así que de cada `Enlace` solo se conserva la fila de `Timestamp` más
+reciente. Para eso una primera pasada, con el mismo lector que la segunda (así
+ambas descartan las mismas líneas mal formadas), guarda de cada anuncio el hash
+de 64 bits del enlace, su fecha y su fila: 28 bytes por anuncio distinto,
+más una máscara de un byte por fila. La segunda limpia y escribe solo las filas
+vigentes.
+
+Uso:
+    python -m utils.limpieza --alquiler pisos_alquiler_data.csv --venta pisos_venta.csv \\
+        --salida propiedades_limpio.parquet --csv propiedades_limpio.csv
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .provincias import provincia_centroides
+
+# Esquema de la salida tipada (mismas columnas que propiedades_limpio)
+ESQUEMA = pa.schema([
+    ('ID', pa.string()),
+    ('Timestamp', pa.timestamp('s')),
+    ('Provincia', pa.string()),
+    ('Título', pa.string()),
+    ('Precio', pa.int32()),
+    ('Latitud', pa.float64()),
+    ('Longitud', pa.float64()),
+    ('Superficie Construida', pa.int32()),
+    ('Superficie Útil', pa.int32()),
+    ('Habitaciones', pa.int16()),
+    ('Baños', pa.int16()),
+    ('Planta', pa.int16()),
+    ('Certificado Energético', pa.string()),
+    ('Número de Fotos', pa.int16()),
+    ('Enlace', pa.string()),
+    ('venta/alquiler', pa.string()),
+])
+
+COLUMNAS_TEXTO = ['Provincia', 'Título', 'Certificado Energético']
+
+# Columnas numéricas y tipo entero (con nulos) de cada una
+COLUMNAS_ENTERAS = {
+    'Precio': 'Int32',
+    'Superficie Construida': 'Int32',
+    'Superficie Útil': 'Int32',
+    'Habitaciones': 'Int16',
+    'Baños': 'Int16',
+    'Planta': 'Int16',
+    'Número de Fotos': 'Int16',
+}
+
+# Separador de miles: un punto seguido de exactamente tres cifras ('1.600 €', '338.800 €')
+_MILES = r'(?<=\d)\.(?=\d{3}(?:\D|$))'
+
+
+# Separador del CSV: el scraper escribe ',' pero los CSV guardados desde Excel usan ';'
+def detectar_separador(ruta):
+    with open(ruta, encoding='utf-8') as fichero:
+        cabecera = fichero.readline()
+    return ';' if cabecera.count(';') > cabecera.count(',') else ','
+
+
+# Texto con unidades ('1.600 €', '140 m²', '5ª') a número; lo que no es número queda nulo
+def _a_numero(serie):
+    texto = (serie.str.replace(_MILES, '', regex=True)
+                  .str.replace(r'[€ªº\s]|m²', '', regex=True)
+                  .str.replace(',', '.', regex=False))
+    return pd.to_numeric(texto, errors='coerce')
+
+
+def _a_entero(serie, tipo):
+    valores = _a_numero(serie)
+    # Los valores con decimales no son enteros válidos (como el REGEXP '^[0-9]+$' del SQL)
+    return valores.where(valores.round() == valores).astype(tipo)
+
+
+# Coordenadas: los CSV pasados por Excel pierden el punto decimal ('433.650.629' -> 43.3650629).
+# Se juntan las cifras y se coloca la coma en la posición más cercana al centroide de la provincia.
+def reparar_coordenada(serie, referencia):
+    texto = serie.str.strip()
+    negativo = texto.str.startswith('-').fillna(False).to_numpy(dtype=bool)
+    cifras = texto.str.replace(r'\D', '', regex=True)
+    mantisa = pd.to_numeric(cifras, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    longitud = cifras.str.len().to_numpy(dtype='float64', na_value=np.nan)
+    mantisa = np.where(negativo, -mantisa, mantisa)
+
+    candidatos = np.stack([mantisa / 10 ** (longitud - enteras) for enteras in (1, 2, 3)])
+    sin_referencia = np.isnan(referencia)
+    distancia = np.abs(candidatos - np.where(sin_referencia, 0, referencia))
+    distancia = np.where(np.isnan(distancia), np.inf, distancia)
+    elegida = candidatos[np.argmin(distancia, axis=0), np.arange(len(mantisa))]
+
+    # Sin centroide conocido se usa el texto tal cual
+    directa = pd.to_numeric(texto, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    return np.where(sin_referencia, directa, elegida)
+
+
+# Fechas del scraper ("2024-10-18 12:00:00") o de un CSV guardado desde Excel
+def convertir_fecha(serie):
+    fecha = pd.to_datetime(serie, format='%Y-%m-%d %H:%M:%S', errors='coerce')
+    # Los CSV guardados desde Excel llevan el formato día/mes/año
+    excel = pd.to_datetime(serie, format='%d/%m/%Y %H:%M', errors='coerce')
+    return fecha.fillna(excel)
+
+
+# Limpia un bloque del CSV en bruto del scraper
+def limpiar_bloque(bloque, tipo):
+    df = pd.DataFrame(index=bloque.index)
+    df['ID'] = bloque['ID']
+    df['Timestamp'] = convertir_fecha(bloque['Timestamp'])
+
+    # Provincia: guiones bajos por espacios y 'coruna' por 'coruña'
+    df['Provincia'] = (bloque['Provincia'].str.replace('_', ' ', regex=False)
+                                          .str.replace('coruna', 'coruña', regex=False))
+    df['Título'] = bloque['Título']
+
+    # Latitud y longitud, reparadas con el centroide de la provincia
+    centroides = df['Provincia'].map(provincia_centroides)
+    lat_ref = centroides.str[0].to_numpy(dtype='float64', na_value=np.nan)
+    lon_ref = centroides.str[1].to_numpy(dtype='float64', na_value=np.nan)
+    df['Latitud'] = reparar_coordenada(bloque['Latitud'], lat_ref)
+    df['Longitud'] = reparar_coordenada(bloque['Longitud'], lon_ref)
+
+    for columna, tipo_entero in COLUMNAS_ENTERAS.items():
+        df[columna] = _a_entero(bloque[columna], tipo_entero)
+
+    df['Certificado Energético'] = bloque['Certificado Energético'].str.replace('Clasificación: ', '', regex=False)
+    df['Enlace'] = bloque['Enlace']
+    df['venta/alquiler'] = tipo
+
+    # Reemplazar los textos nulos por 'sin especificar' (las cifras nulas quedan como NULL)
+    df[COLUMNAS_TEXTO] = df[COLUMNAS_TEXTO].fillna('sin especificar')
+    return df[ESQUEMA.names]
+
+
+# Bloques del CSV en bruto como texto; las líneas mal formadas se descartan
+def _leer_bloques(ruta, filas_por_bloque):
+    return pd.read_csv(ruta, sep=detectar_separador(ruta), dtype=str,
+                       chunksize=filas_por_bloque, on_bad_lines='skip')
+
+
+# Fila vigente de cada hash de enlace entre las acumuladas: la de fecha más reciente y, si
+# empatan, la última leída (las fechas nulas son el mínimo de int64 y quedan las primeras)
+def _reducir(partes):
+    claves, fechas, entradas, filas = (np.concatenate(columna) for columna in zip(*partes))
+    orden = np.lexsort((filas, entradas, fechas, claves))
+    claves = claves[orden]
+    ultima = np.append(claves[1:] != claves[:-1], True)
+    elegidas = orden[ultima]
+    return [(claves[ultima], fechas[elegidas], entradas[elegidas], filas[elegidas])]
+
+
+# Máscara por entrada de las filas que se conservan: la de Timestamp más reciente de cada
+# Enlace (si empatan, la última leída). Las filas sin enlace se conservan todas.
+# Los enlaces se comparan por su hash de 64 bits: ancho fijo, sin guardar los textos.
+def filas_vigentes(entradas, filas_por_bloque=100_000):
+    partes, pendientes, vigentes = [], 0, 0
+    mascaras = []
+    for numero, (ruta, _) in enumerate(entradas):
+        leidas = 0
+        sin_enlace = []
+        # Mismo lector que la segunda pasada: las posiciones de las filas coinciden
+        for bloque in _leer_bloques(ruta, filas_por_bloque):
+            con_enlace = bloque['Enlace'].notna().to_numpy()
+            sin_enlace.append(leidas + np.flatnonzero(~con_enlace))
+            partes.append((
+                pd.util.hash_array(bloque['Enlace'].to_numpy(dtype=object)[con_enlace]).view(np.int64),
+                convertir_fecha(bloque['Timestamp'][con_enlace]).to_numpy(dtype='datetime64[ns]').view(np.int64),
+                np.full(con_enlace.sum(), numero, dtype=np.int32),
+                leidas + np.flatnonzero(con_enlace),
+            ))
+            leidas += len(bloque)
+            # Se reduce cuando lo pendiente supera a lo ya reducido: coste amortizado y
+            # memoria proporcional a los anuncios distintos, no a las filas
+            pendientes += int(con_enlace.sum())
+            if pendientes > max(vigentes, filas_por_bloque):
+                partes = _reducir(partes)
+                vigentes, pendientes = len(partes[0][0]), 0
+        mascara = np.zeros(leidas, dtype=bool)
+        if sin_enlace:
+            mascara[np.concatenate(sin_enlace)] = True
+        mascaras.append(mascara)
+
+    if partes:
+        _, _, numeros, filas = _reducir(partes)[0]
+        for numero, mascara in enumerate(mascaras):
+            mascara[filas[numeros == numero]] = True
+    return mascaras
+
+
+# Limpia y une los CSV de entrada [(ruta, tipo), ...] escribiendo la salida bloque a bloque
+def limpiar(entradas, salida_parquet=None, salida_csv=None, filas_por_bloque=100_000):
+    vigentes = filas_vigentes(entradas, filas_por_bloque)
+    escritor = None
+    filas = 0
+    primera = True
+    try:
+        for (ruta, tipo), mascara in zip(entradas, vigentes):
+            leidas = 0
+            for bloque in _leer_bloques(ruta, filas_por_bloque):
+                conservar = mascara[leidas:leidas + len(bloque)]
+                leidas += len(bloque)
+                limpio = limpiar_bloque(bloque[conservar], tipo)
+                if salida_parquet:
+                    tabla = pa.Table.from_pandas(limpio, schema=ESQUEMA, preserve_index=False)
+                    if escritor is None:
+                        escritor = pq.ParquetWriter(salida_parquet, ESQUEMA)
+                    escritor.write_table(tabla)
+                if salida_csv:
+                    limpio.to_csv(salida_csv, sep=';', index=False,
+                                  mode='w' if primera else 'a', header=primera)
+                primera = False
+                filas += len(limpio)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return filas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Limpia y une los CSV del scraper.")
+    parser.add_argument('--alquiler', nargs='*', default=[], help="CSV en bruto de alquiler")
+    parser.add_argument('--venta', nargs='*', default=[], help="CSV en bruto de venta")
+    parser.add_argument('--salida', help="Parquet tipado de salida")
+    parser.add_argument('--csv', help="CSV de salida (separado por ';', como propiedades_limpio.csv)")
+    parser.add_argument('--filas-por-bloque', type=int, default=100_000)
+    args = parser.parse_args()
+
+    if not (args.salida or args.csv):
+        parser.error("indica --salida y/o --csv")
+    entradas = [(ruta, 'alquiler') for ruta in args.alquiler] + [(ruta, 'venta') for ruta in args.venta]
+    inicio = time.perf_counter()
+    filas = limpiar(entradas, args.salida, args.csv, args.filas_por_bloque)
+    duracion = time.perf_counter() - inicio
+    print(f"{filas} filas limpias en {duracion:.1f} s ({filas / duracion:,.0f} filas/s)")
@@ -0,0 +1,127 @@
+"""Tramos de tiempo de la app de Streamlit y resumen de rendimiento.
+
+Cada ejecución de la app crea un `Metricas`. Los tramos (`with metricas.tramo(...)`)
+miden la carga de datos, cada filtro, la construcción de cada gráfico y su envío,
+y los registros anotan además aciertos o fallos de caché y el tamaño de lo que
+se envía al navegador. Al final de la ejecución se etiquetan con la sesión y la
+página, se guardan en un historial del proceso (para los percentiles del panel)
+y se añaden a un fichero JSONL.
+
+Desactivadas, `tramo` devuelve siempre el mismo contexto vacío y el resto de
+métodos retornan en la primera línea, así que pueden quedarse en la app.
+
+Uso (resumen de un fichero de métricas):
+    python -m utils.metricas metricas_app.jsonl
+"""
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+import pandas as pd
+
+# Últimos registros de todas las sesiones del proceso. Cada sesión corre en su propio
+# hilo: el historial y el fichero JSONL solo se tocan con el cerrojo tomado.
+HISTORIAL = deque(maxlen=20_000)
+_CERROJO = threading.Lock()
+
+COLUMNAS_RESUMEN = ['pagina', 'tramo', 'n', 'p50_ms', 'p95_ms']
+
+_NULO = nullcontext()
+
+
+class Metricas:
+    """Registros de tiempo de una ejecución de la app."""
+
+    def __init__(self, activo=False, ruta=None, sesion=''):
+        self.activo = activo
+        self.ruta = ruta
+        self.sesion = sesion
+        self.registros = []
+        self._abiertos = []
+
+    def tramo(self, nombre, **etiquetas):
+        if not self.activo:
+            return _NULO
+        return self._tramo(nombre, etiquetas)
+
+    @contextmanager
+    def _tramo(self, nombre, etiquetas):
+        registro = {'tramo': nombre, **etiquetas}
+        self._abiertos.append(registro)
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        finally:
+            registro['ms'] = (time.perf_counter() - inicio) * 1000
+            self._abiertos.pop()
+            self.registros.append(registro)
+
+    # Añade etiquetas al tramo abierto más interno (p. ej. cache='fallo' desde una función cacheada)
+    def marcar(self, **etiquetas):
+        if self.activo and self._abiertos:
+            self._abiertos[-1].update(etiquetas)
+
+    # Registro sin tiempo (tamaño de un envío, recuento de filas...)
+    def anotar(self, nombre, **valores):
+        if self.activo:
+            self.registros.append({'tramo': nombre, **valores})
+
+    # Etiqueta los registros de la ejecución, los pasa al historial y los añade al JSONL
+    def volcar(self, pagina):
+        if not self.activo or not self.registros:
+            return
+        momento = time.time()
+        self.registros = [
+            {'ts': momento, 'sesion': self.sesion, 'pagina': pagina, **registro} for registro in self.registros
+        ]
+        lineas = [json.dumps(registro, ensure_ascii=False, default=float) + '\n' for registro in self.registros]
+        with _CERROJO:
+            HISTORIAL.extend(self.registros)
+            if self.ruta:
+                with open(self.ruta, 'a', encoding='utf-8') as fichero:
+                    fichero.writelines(lineas)
+
+
+# Bytes de la figura de Plotly serializada (lo que recibe el navegador)
+def tamano_figura(fig):
+    return len(fig.to_json())
+
+
+# Bytes en memoria de una tabla (aproximación de lo que se envía)
+def tamano_tabla(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+# Copia del historial (otras sesiones pueden estar añadiendo registros)
+def historial():
+    with _CERROJO:
+        return list(HISTORIAL)
+
+
+# Percentiles 50 y 95 de cada tramo por página (por defecto, del historial del proceso)
+def resumen(registros=None):
+    if registros is None:
+        registros = historial()
+    tiempos = pd.DataFrame([registro for registro in registros if 'ms' in registro])
+    if tiempos.empty:
+        return pd.DataFrame(columns=COLUMNAS_RESUMEN)
+    return (tiempos.groupby(['pagina', 'tramo'], sort=False)['ms']
+                   .agg(n='count', p50_ms=lambda ms: ms.quantile(0.5), p95_ms=lambda ms: ms.quantile(0.95))
+                   .reset_index()[COLUMNAS_RESUMEN])
+
+
+def leer_jsonl(ruta):
+    with open(ruta, encoding='utf-8') as fichero:
+        return [json.loads(linea) for linea in fichero if linea.strip()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Resumen p50/p95 de un fichero de métricas de la app.")
+    parser.add_argument('jsonl', help="Fichero JSONL escrito por la app (METRICAS_RUTA)")
+    args = parser.parse_args()
+
+    with pd.option_context('display.max_rows', None, 'display.width', 120):
+        print(resumen(leer_jsonl(args.jsonl)).round(1).to_string(index=False))
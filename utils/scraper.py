@@ -0,0 +1,321 @@
+"""Motor de scraping concurrente para pisos.com.
+
+Sustituye al crawler de Selenium del notebook, que recorría las provincias con un
+único Chrome y esperas fijas. Aquí los listados y las fichas se descargan en
+paralelo con asyncio/aiohttp: el pool de conexiones está acotado y cada host
+tiene un límite de peticiones por segundo. Los campos se extraen del HTML
+estático con lxml, usando los mismos selectores que el notebook, y el CSV de
+salida tiene las mismas columnas. Las filas se escriben por páginas en un hilo
+aparte (asyncio.to_thread), de modo que el disco no detiene las descargas.
+
+Con `--estado` el crawl es incremental y reanudable (ver utils.estado_crawl): las
+filas se añaden al CSV y solo se piden las fichas nuevas o con otro precio.
+
+Uso:
+    python -m utils.scraper --tipo alquiler --salida pisos_alquiler_data.csv
+    python -m utils.scraper --tipo alquiler --estado crawl.sqlite  # incremental
+    python -m utils.scraper --base-url http://127.0.0.1:8080 --provincias madrid  # fixtures
+"""
+import argparse
+import asyncio
+import csv
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+from lxml import html
+
+from .estado_crawl import EstadoCrawl, ejecucion_del_dia, id_estable
+from .provincias import provincias
+
+BASE_URL = 'https://www.pisos.com'
+
+CABECERAS_CSV = [
+    "ID", "Timestamp", "Provincia", "Título", "Precio", "Latitud", "Longitud",
+    "Superficie Construida", "Superficie Útil", "Habitaciones", "Baños",
+    "Planta", "Certificado Energético", "Número de Fotos", "Enlace"
+]
+
+CABECERAS_HTTP = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0 Safari/537.36',
+    'Accept-Language': 'es-ES,es;q=0.9',
+}
+
+# Respuestas que merece la pena reintentar
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+# Ruta del listado de una provincia (la primera página no lleva número)
+def ruta_listado(tipo, provincia, page_number):
+    if page_number == 1:
+        return f"/{tipo}/pisos-{provincia}/"
+    return f"/{tipo}/pisos-{provincia}/{page_number}/"
+
+
+# Fichero donde se guarda (o se sirve) una página para reproducirla sin conexión
+def ruta_fixture(directorio, url):
+    ruta = urlsplit(url).path.strip('/')
+    return Path(directorio, ruta, 'index.html')
+
+
+# Condición XPath equivalente al selector CSS de una clase
+def _clase(nombre):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {nombre} ')"
+
+
+# Texto visible del primer nodo encontrado o 'N/A'
+def _texto(nodos):
+    if not nodos:
+        return "N/A"
+    return ' '.join(nodos[0].text_content().split())
+
+
+# Valor del span que sigue a la etiqueta indicada (Superficie construida, Habitaciones...)
+def _campo(arbol, etiqueta):
+    return _texto(arbol.xpath(f"//span[contains(text(), '{etiqueta}')]/following-sibling::span"))
+
+
+# Enlaces a las fichas de una página de resultados (texto ya decodificado), con el precio que muestra el listado
+def extraer_anuncios(contenido):
+    arbol = html.fromstring(contenido)
+    anuncios = []
+    for propiedad in arbol.xpath(f"//*[{_clase('ad-preview')}]"):
+        enlace = propiedad.xpath(f".//*[{_clase('ad-preview__title')}]/@href")
+        if not enlace:
+            continue
+        precio = propiedad.xpath(f".//*[{_clase('ad-preview__price')}]")
+        anuncios.append((enlace[0], _texto(precio) if precio else None))
+    return anuncios
+
+
+# Campos de la ficha de un inmueble (texto ya decodificado)
+def extraer_ficha(contenido):
+    arbol = html.fromstring(contenido)
+
+    # El precio va seguido de un <span> adicional: se toma el valor antes de él
+    precio = arbol.xpath(f"//*[{_clase('price__value')} and {_clase('jsPriceValue')}]")
+    precio = f"{_texto(precio).split()[0]} €" if precio else None
+
+    # Latitud y longitud vienen en la URL de la imagen del mapa
+    mapa = arbol.xpath("//img[@alt='mapa']/@src")
+    if not mapa:
+        raise ValueError("la ficha no tiene mapa")
+    latitud_longitud = mapa[0].split("@")
+
+    return {
+        "Título": _texto(arbol.xpath("//h1")),
+        "Precio": precio,
+        "Latitud": latitud_longitud[0].split("_")[-1],
+        "Longitud": latitud_longitud[1].split("_")[0],
+        "Superficie Construida": _campo(arbol, 'Superficie construida'),
+        "Superficie Útil": _campo(arbol, 'Superficie útil'),
+        "Habitaciones": _campo(arbol, 'Habitaciones'),
+        "Baños": _campo(arbol, 'Baños'),
+        "Planta": _campo(arbol, 'Planta'),
+        "Certificado Energético": _texto(arbol.xpath(f"//*[{_clase('energy-certificate')}]//p")),
+        "Número de Fotos": _texto(arbol.xpath(f"//*[{_clase('media-types-menu__number')}]")),
+    }
+
+
+class LimitadorHost:
+    """Reparte las peticiones a cada host para no superar `por_segundo` por segundo."""
+
+    def __init__(self, por_segundo):
+        self._intervalo = 1 / por_segundo if por_segundo else 0
+        self._siguiente = {}
+        self._candado = asyncio.Lock()
+
+    async def esperar(self, host):
+        if not self._intervalo:
+            return
+        async with self._candado:
+            ahora = asyncio.get_running_loop().time()
+            turno = max(ahora, self._siguiente.get(host, ahora))
+            self._siguiente[host] = turno + self._intervalo
+        await asyncio.sleep(turno - ahora)
+
+
+class Scraper:
+    """Crawler asíncrono de listados y fichas de pisos.com."""
+
+    def __init__(self, tipo='alquiler', base_url=BASE_URL, concurrencia=16,
+                 peticiones_por_segundo=8, reintentos=3, timeout=30, guardar_en=None,
+                 estado=None, ejecucion=None):
+        self.tipo = tipo
+        self.base_url = base_url
+        self.concurrencia = concurrencia
+        self.peticiones_por_segundo = peticiones_por_segundo
+        self.reintentos = reintentos
+        self.timeout = timeout
+        self.guardar_en = guardar_en
+        self.estado = estado
+        self.ejecucion = ejecucion or ejecucion_del_dia(tipo)
+        self.paginas = 0
+        self.fichas = 0
+        self.sin_cambios = 0
+
+    # Descarga una URL con reintentos y devuelve su texto; None si no existe. Los listados
+    # no siguen redirecciones: pedir una página posterior a la última redirige a otra.
+    # El texto se decodifica con el charset de la respuesta (Content-Type o detectado):
+    # lxml no ve las cabeceras y con bytes sin <meta charset> supondría Latin-1.
+    async def _descargar(self, url, redirecciones=True):
+        host = urlsplit(url).netloc
+        error = None
+        for intento in range(self.reintentos):
+            await self._limitador.esperar(host)
+            try:
+                async with self._semaforo:
+                    async with self._sesion.get(url, allow_redirects=redirecciones) as respuesta:
+                        if respuesta.status in ESTADOS_REINTENTABLES:
+                            error = aiohttp.ClientResponseError(
+                                respuesta.request_info, respuesta.history, status=respuesta.status)
+                        elif respuesta.status == 404 or 300 <= respuesta.status < 400:
+                            return None
+                        else:
+                            respuesta.raise_for_status()
+                            contenido = await respuesta.text(errors='replace')
+                            if self.guardar_en:
+                                # En UTF-8, que es como las sirve utils.servidor_fixtures
+                                ruta = ruta_fixture(self.guardar_en, url)
+                                ruta.parent.mkdir(parents=True, exist_ok=True)
+                                ruta.write_text(contenido, encoding='utf-8')
+                            return contenido
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+            if intento < self.reintentos - 1:
+                await asyncio.sleep(2 ** intento)
+        raise error
+
+    # Fila del CSV para la ficha de un inmueble (None si no se pudo extraer)
+    async def _ficha(self, provincia, ruta):
+        # El enlace guardado es siempre el de pisos.com, aunque se descargue de otro host (fixtures)
+        enlace = urljoin(BASE_URL, ruta)
+        try:
+            contenido = await self._descargar(urljoin(self.base_url, ruta))
+            if contenido is None:
+                return None
+            datos = extraer_ficha(contenido)
+        except Exception as e:
+            print(f"Error al extraer propiedad en {provincia} ({self.tipo}): {e}")
+            return None
+
+        self.fichas += 1
+        return {
+            "ID": id_estable(enlace),
+            "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "Provincia": provincia,
+            **datos,
+            "Enlace": enlace,
+        }
+
+    # Recorre las páginas de una provincia; las fichas de cada página se piden en paralelo.
+    # Cada página terminada queda anotada en el estado antes de pasar a la siguiente.
+    async def _provincia(self, provincia):
+        page_number, terminada = (0, False)
+        if self.estado is not None:
+            page_number, terminada = self.estado.progreso(self.ejecucion, self.tipo, provincia)
+        if terminada:
+            return
+        page_number += 1
+
+        vistos = set()
+        while True:
+            url = urljoin(self.base_url, ruta_listado(self.tipo, provincia, page_number))
+            try:
+                contenido = await self._descargar(url, redirecciones=False)
+            except Exception as e:
+                # Sin marcar la provincia como terminada: la próxima ejecución la reanuda aquí
+                print(f"Error al navegar en {provincia} ({self.tipo}): {e}")
+                return
+            if contenido is None:
+                break
+            self.paginas += 1
+
+            # Si no hay propiedades nuevas, hemos llegado al final
+            anuncios = [(urlsplit(enlace).path, precio) for enlace, precio in extraer_anuncios(contenido)]
+            nuevos = [(ruta, precio) for ruta, precio in anuncios if ruta not in vistos]
+            if not nuevos:
+                break
+            vistos.update(ruta for ruta, _ in nuevos)
+
+            # Solo se descargan las fichas de anuncios nuevos o con cambio de precio
+            pendientes = [
+                ruta for ruta, precio in nuevos
+                if self.estado is None or self.estado.necesita_ficha(urljoin(BASE_URL, ruta), precio)
+            ]
+            self.sin_cambios += len(nuevos) - len(pendientes)
+            filas = await asyncio.gather(*(self._ficha(provincia, ruta) for ruta in pendientes))
+            filas = [fila for fila in filas if fila is not None]
+            if filas:
+                async with self._escritura:
+                    await asyncio.to_thread(self._escribir, filas)
+
+            if self.estado is not None:
+                sin_cambios = [urljoin(BASE_URL, ruta) for ruta, _ in nuevos if ruta not in pendientes]
+                self.estado.guardar_pagina(self.ejecucion, self.tipo, provincia, page_number, filas, sin_cambios)
+            page_number += 1
+
+        if self.estado is not None:
+            self.estado.terminar_provincia(self.ejecucion, self.tipo, provincia)
+
+    # Escribe las filas de una página en el CSV. Se llama en un hilo, de una en una.
+    def _escribir(self, filas):
+        self._writer.writerows(filas)
+        if self.estado is not None:
+            # Las filas tienen que estar en el fichero antes de anotar la página en el estado
+            self._fichero.flush()
+
+    # Extrae todas las provincias indicadas y escribe las filas en `salida`
+    async def ejecutar(self, provincias_a_extraer, salida):
+        self._semaforo = asyncio.Semaphore(self.concurrencia)
+        self._limitador = LimitadorHost(self.peticiones_por_segundo)
+        conector = aiohttp.TCPConnector(limit=self.concurrencia, limit_per_host=self.concurrencia)
+        tiempo = aiohttp.ClientTimeout(total=self.timeout)
+
+        # Con estado se añade al CSV existente; sin él se reescribe como en el notebook
+        incremental = self.estado is not None
+        nuevo = not incremental or not os.path.exists(salida) or os.path.getsize(salida) == 0
+        self._escritura = asyncio.Lock()
+        self._fichero = await asyncio.to_thread(
+            open, salida, 'a' if incremental else 'w', newline='', encoding='utf-8')
+        try:
+            self._writer = csv.DictWriter(self._fichero, fieldnames=CABECERAS_CSV)
+            if nuevo:
+                await asyncio.to_thread(self._writer.writeheader)
+            async with aiohttp.ClientSession(connector=conector, timeout=tiempo, headers=CABECERAS_HTTP) as sesion:
+                self._sesion = sesion
+                await asyncio.gather(*(self._provincia(p) for p in provincias_a_extraer))
+        finally:
+            await asyncio.to_thread(self._fichero.close)
+        return self.fichas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scraping concurrente de pisos.com.")
+    parser.add_argument('--tipo', choices=['alquiler', 'venta'], default='alquiler')
+    parser.add_argument('--salida', default='pisos_alquiler_data.csv')
+    parser.add_argument('--provincias', nargs='*', default=provincias)
+    parser.add_argument('--base-url', default=BASE_URL, help="Host a usar (p. ej. el servidor de fixtures)")
+    parser.add_argument('--concurrencia', type=int, default=16, help="Conexiones simultáneas")
+    parser.add_argument('--peticiones-por-segundo', type=float, default=8, help="Límite por host (0 = sin límite)")
+    parser.add_argument('--guardar-en', help="Directorio donde guardar las páginas descargadas como fixtures")
+    parser.add_argument('--estado', help="SQLite con el estado del crawl (activa el modo incremental)")
+    parser.add_argument('--ejecucion', help="Identificador de la ejecución a reanudar (por defecto, fecha y tipo)")
+    args = parser.parse_args()
+
+    estado = EstadoCrawl(args.estado) if args.estado else None
+    scraper = Scraper(args.tipo, args.base_url, args.concurrencia, args.peticiones_por_segundo,
+                      guardar_en=args.guardar_en, estado=estado, ejecucion=args.ejecucion)
+    inicio = time.perf_counter()
+    try:
+        fichas = asyncio.run(scraper.ejecutar(args.provincias, args.salida))
+    finally:
+        if estado is not None:
+            estado.cerrar()
+    duracion = time.perf_counter() - inicio
+    print(f"Scraping finalizado. {fichas} inmuebles ({scraper.paginas} páginas, "
+          f"{scraper.sin_cambios} anuncios sin cambios) en {duracion:.1f} s "
+          f"({fichas / duracion:.1f} inmuebles/s). Datos guardados en {args.salida} ({args.tipo}).")
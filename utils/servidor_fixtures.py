@@ -0,0 +1,81 @@
+"""Servidor local que reproduce páginas guardadas de pisos.com.
+
+Sirve los ficheros grabados con `python -m utils.scraper --guardar-en DIR`
+(DIR/<ruta de la URL>/index.html), con una latencia opcional, para medir el
+rendimiento del scraper sin conexión y sin cargar la web real.
+
+Uso:
+    python -m utils.servidor_fixtures fixtures/ --puerto 8080
+    python -m utils.servidor_fixtures fixtures/ --benchmark --tipo alquiler
+"""
+import argparse
+import asyncio
+import os
+import time
+from pathlib import Path
+
+from aiohttp import web
+
+from .scraper import Scraper, ruta_fixture
+
+
+def crear_app(directorio, latencia=0.0):
+    raiz = Path(directorio).resolve()
+
+    async def servir(request):
+        if latencia:
+            await asyncio.sleep(latencia)
+        ruta = ruta_fixture(raiz, request.path).resolve()
+        if raiz not in ruta.parents or not ruta.is_file():
+            raise web.HTTPNotFound()
+        return web.Response(body=ruta.read_bytes(), content_type='text/html', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/{ruta:.*}', servir)
+    return app
+
+
+# Provincias con listados grabados para un tipo de transacción
+def provincias_grabadas(directorio, tipo):
+    return sorted(
+        ruta.name.removeprefix('pisos-')
+        for ruta in Path(directorio, tipo).glob('pisos-*') if ruta.is_dir()
+    )
+
+
+# Levanta el servidor en un puerto libre, ejecuta el scraper contra él y mide el rendimiento
+async def benchmark(directorio, tipo, concurrencia, latencia):
+    runner = web.AppRunner(crear_app(directorio, latencia))
+    await runner.setup()
+    sitio = web.TCPSite(runner, '127.0.0.1', 0)
+    await sitio.start()
+    host, puerto = runner.addresses[0][:2]
+
+    try:
+        scraper = Scraper(tipo, f"http://{host}:{puerto}", concurrencia, peticiones_por_segundo=0)
+        inicio = time.perf_counter()
+        fichas = await scraper.ejecutar(provincias_grabadas(directorio, tipo), os.devnull)
+        duracion = time.perf_counter() - inicio
+    finally:
+        await runner.cleanup()
+
+    peticiones = fichas + scraper.paginas
+    print(f"{fichas} inmuebles y {scraper.paginas} páginas de listado en {duracion:.2f} s: "
+          f"{fichas / duracion:.1f} inmuebles/s, {peticiones / duracion:.1f} peticiones/s "
+          f"(concurrencia {concurrencia}, latencia simulada {latencia * 1000:.0f} ms)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Servidor de fixtures de pisos.com.")
+    parser.add_argument('directorio', help="Directorio con las páginas grabadas")
+    parser.add_argument('--puerto', type=int, default=8080)
+    parser.add_argument('--latencia', type=float, default=0.0, help="Segundos de espera por respuesta")
+    parser.add_argument('--benchmark', action='store_true', help="Medir el scraper contra las fixtures y salir")
+    parser.add_argument('--tipo', choices=['alquiler', 'venta'], default='alquiler')
+    parser.add_argument('--concurrencia', type=int, default=16)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        asyncio.run(benchmark(args.directorio, args.tipo, args.concurrencia, args.latencia))
+    else:
+        web.run_app(crear_app(args.directorio, args.latencia), host='127.0.0.1', port=args.puerto)
@@ -0,0 +1,142 @@
+"""Snapshot columnar (Arrow IPC) del dataset limpio de propiedades.
+
+El CSV limpio se convierte una sola vez en un fichero Arrow sin comprimir, con
+columnas categóricas para los textos repetidos y enteros estrechos para las
+cifras. La app lo abre con memory-map en lugar de parsear texto en cada arranque.
+
+Las cifras con huecos se guardan como enteros Arrow con máscara de validez y se
+leen como enteros de pandas con nulos (Int8, Int16...), nunca como float32:
+un precio de varios millones no cabe exacto en la mantisa de un float32.
+
+Uso:
+    python -m utils.snapshot propiedades_limpio.csv propiedades_limpio.arrow
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from .limpieza import detectar_separador
+
+# Textos con pocos valores distintos: se guardan como categorías (diccionario Arrow)
+COLUMNAS_CATEGORICAS = ['provincia', 'venta/alquiler', 'certificado energético']
+
+# Cifras enteras: se guardan con el tipo entero más estrecho que admitan
+COLUMNAS_ENTERAS = [
+    'precio', 'superficie construida', 'superficie útil', 'habitaciones',
+    'baños', 'planta', 'número de fotos'
+]
+
+# Los textos libres (título, enlace...) se leen como cadenas Arrow, no como objetos Python
+_TIPOS_TEXTO = {
+    pa.string(): pd.StringDtype('pyarrow'),
+    pa.large_string(): pd.StringDtype('pyarrow'),
+}
+
+
+# Enteros de pandas con nulos para los enteros Arrow que traen máscara de validez
+_ENTEROS_CON_NULOS = {
+    pa.int8(): pd.Int8Dtype(),
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(),
+}
+
+
+# Función para reducir una columna numérica al entero más estrecho que admita
+def _entero_estrecho(serie):
+    valores = pd.to_numeric(serie, errors='coerce')
+    if not np.array_equal(valores.dropna(), np.round(valores.dropna())):
+        # Con decimales no es una cifra entera: se deja en float64, sin perder precisión
+        return valores.astype('float64')
+    if not valores.isna().any():
+        return pd.to_numeric(valores, downcast='integer')
+    # Con nulos se usa el entero con nulos más estrecho que abarque el rango
+    minimo, maximo = valores.min(), valores.max()
+    for tipo in ('int8', 'int16', 'int32'):
+        limites = np.iinfo(tipo)
+        if limites.min <= minimo and maximo <= limites.max:
+            return valores.astype(tipo.capitalize())
+    return valores.astype('Int64')
+
+
+# Función para tipar el DataFrame limpio antes de escribirlo
+def tipar_dataset(df):
+    df = df.copy()
+    df.columns = df.columns.str.strip().str.lower()
+    for columna in COLUMNAS_CATEGORICAS:
+        if columna in df.columns:
+            df[columna] = df[columna].astype('category')
+    for columna in COLUMNAS_ENTERAS:
+        if columna in df.columns:
+            df[columna] = _entero_estrecho(df[columna])
+    return df
+
+
+# Función para escribir el snapshot de forma atómica (la app puede estar leyéndolo)
+def escribir_snapshot(df, ruta_snapshot):
+    temporal = f"{ruta_snapshot}.tmp"
+    # Sin compresión: es lo que permite abrirlo con memory-map sin copiar
+    feather.write_feather(tipar_dataset(df), temporal, compression='uncompressed')
+    os.replace(temporal, ruta_snapshot)
+
+
+# Función para construir el snapshot a partir del CSV limpio (o del Parquet de utils.limpieza)
+def construir_snapshot(ruta_csv, ruta_snapshot, sep=';'):
+    escribir_snapshot(leer_datos(ruta_csv, sep), ruta_snapshot)
+    return ruta_snapshot
+
+
+# Función para leer el snapshot con memory-map
+def leer_snapshot(ruta_snapshot):
+    tabla = feather.read_table(ruta_snapshot, memory_map=True)
+    # Los enteros con nulos pasan a enteros de pandas con máscara; el resto sigue sin copia
+    con_nulos = [
+        campo.name for campo, columna in zip(tabla.schema, tabla.columns)
+        if pa.types.is_integer(campo.type) and columna.null_count
+    ]
+    df = tabla.drop_columns(con_nulos).to_pandas(types_mapper=_TIPOS_TEXTO.get, split_blocks=True)
+    for nombre in con_nulos:
+        serie = tabla.column(nombre).to_pandas(types_mapper=_ENTEROS_CON_NULOS.get)
+        df.insert(tabla.column_names.index(nombre), nombre, serie)
+    return df
+
+
+# Función para leer los datos limpios de un snapshot .arrow, un Parquet o un CSV
+# (con el separador indicado o, si no se indica, el que aparece en la cabecera)
+def leer_datos(ruta, sep=None):
+    ruta = str(ruta)
+    if ruta.endswith('.arrow'):
+        return leer_snapshot(ruta)
+    if ruta.endswith('.parquet'):
+        return pd.read_parquet(ruta)
+    return pd.read_csv(ruta, sep=sep or detectar_separador(ruta))
+
+
+# Versión de un fichero de datos: cambia cada vez que se regenera
+def version_fichero(ruta):
+    estado = os.stat(ruta)
+    return f"{os.path.abspath(ruta)}:{estado.st_mtime_ns}:{estado.st_size}"
+
+
+# El snapshot solo vale si existe y no es más antiguo que el CSV del que sale
+def snapshot_vigente(ruta_snapshot, ruta_csv):
+    if not os.path.exists(ruta_snapshot):
+        return False
+    if not os.path.exists(ruta_csv):
+        return True
+    return os.path.getmtime(ruta_snapshot) >= os.path.getmtime(ruta_csv)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Construye el snapshot Arrow del CSV limpio.")
+    parser.add_argument('csv', help="CSV limpio de entrada (separado por ';') o Parquet de utils.limpieza")
+    parser.add_argument('snapshot', help="Fichero .arrow de salida")
+    parser.add_argument('--sep', default=';', help="Separador del CSV")
+    args = parser.parse_args()
+
+    construir_snapshot(args.csv, args.snapshot, sep=args.sep)
+    print(f"Snapshot guardado en {args.snapshot}")